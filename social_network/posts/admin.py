@@ -1,8 +1,60 @@
 from django.contrib import admin
-from .models import Comment, Like, Post, PostImage
+from django.db import models
+from .models import Comment, GeocodeCacheEntry, GeocodeJob, Like, Post, PostImage, PurgeJob, StoredFile, TimelineEntry
+from .purge import delete_posts
 
 
-admin.site.register(Post)
+class PurgeOnDeleteMixin:
+    """
+    Удаление из админки через очередь `posts.purge` вместо каскада в одной транзакции.
+    Страница подтверждения не собирает связанные объекты: их может быть сотни тысяч.
+    Права проверяются как в `ModelAdmin.get_deleted_objects`: на сами объекты и на модели
+    из админки, строки которых удалит каскад (одним запросом `exists()` на модель).
+    """
+    def get_deleted_objects(self, objs, request):
+        perms_needed = set()
+        if not all(self.has_delete_permission(request, obj) for obj in objs):
+            perms_needed.add(self.opts.verbose_name)
+        for relation in self.opts.related_objects:
+            model_admin = self.admin_site._registry.get(relation.related_model)
+            if relation.on_delete is not models.CASCADE or model_admin is None:
+                continue
+            if model_admin.has_delete_permission(request):
+                continue
+            if relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': objs}).exists():
+                perms_needed.add(relation.related_model._meta.verbose_name)
+        return [str(obj) for obj in objs], {self.opts.verbose_name_plural: len(objs)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, [obj])
+
+
+class PostAdmin(PurgeOnDeleteMixin, admin.ModelAdmin):
+    list_display = ['__str__', 'author', 'created_at', 'deleted_at']
+
+    def get_queryset(self, request):
+        # скрытые посты, ожидающие очистки, тоже видны
+        queryset = Post.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def delete_queryset(self, request, queryset):
+        delete_posts([post.pk for post in queryset])
+
+
+class PurgeJobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'object_id', 'status', 'stage', 'deleted_rows', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+
+
+admin.site.register(Post, PostAdmin)
 admin.site.register(Comment)
 admin.site.register(Like)
-admin.site.register(PostImage)
\ No newline at end of file
+admin.site.register(PostImage)
+admin.site.register(GeocodeCacheEntry)
+admin.site.register(GeocodeJob)
+admin.site.register(TimelineEntry)
+admin.site.register(StoredFile)
+admin.site.register(PurgeJob, PurgeJobAdmin)
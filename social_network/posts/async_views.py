@@ -0,0 +1,241 @@
+"""
+Асинхронные версии горячих эндпоинтов постов для запуска под ASGI (uvicorn, daphne).
+
+Включаются настройкой `POST_ASYNC_VIEWS`: маршруты `async_urlpatterns` подключаются
+перед маршрутами `PostViewSet` и обрабатывают:
+
+- `GET /posts/`, `GET /posts/{id}/` — чтение асинхронным ORM, сериализация
+  `FastPostSerializer.build`; ответы, ETag и кеш те же, что у `PostViewSet` (см. `posts.cache`);
+- `POST /posts/{id}/like/`, `POST /posts/{id}/comment/`.
+
+Остальные методы тех же URL (создание, изменение, удаление поста) передаются
+`PostViewSet` через `sync_to_async`.
+
+Ограничения: `transaction.atomic` в асинхронном коде недоступен, поэтому записи
+(переключение лайка, создание комментария) выполняются одной синхронной функцией
+за один переход в поток. Пока драйвер БД синхронный (psycopg2), Django выполняет
+и запросы асинхронного ORM в потоке `sync_to_async`; выигрыш — в меньшем числе
+переходов между потоками и циклом событий на запрос. Геокодер на этих путях
+не вызывается: координаты определяет воркер очереди (`posts.geocoding_queue`).
+Чтения идут в основную базу; после записи пользователь прилепляется к ней
+так же, как в `PostViewSet` (см. `social_network.db_router`).
+Под WSGI включать не нужно: там каждое асинхронное представление запускает свой цикл событий.
+"""
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.urls import path, re_path
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from social_network.db_router import pin_to_primary
+from users.authentication import CachedTokenAuthentication
+
+from .cache import (
+    LIST_SCOPE,
+    abuild_key,
+    ais_fresh,
+    apaginate_with_versions,
+    build_entry,
+    etag_matches,
+    from_entry,
+    get_cache,
+    get_setting,
+    invalidate_post,
+    not_modified,
+    post_scope,
+)
+from .fast_serializers import FastPostSerializer
+from .fieldsets import parse_field_selection
+from .likes import toggle_like
+from .models import Post
+from .pagination import KeysetPagination
+from .serializers import CommentSerializer, PostSerializer
+from .views import PostViewSet
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def render(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type=JSON_MEDIA_TYPE, headers=headers)
+
+
+def error_response(exc):
+    """
+    Ответ на исключение в формате DRF (`exception_handler`).
+    """
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound()
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        exc.auth_header = CachedTokenAuthentication().authenticate_header(None)
+    response = exception_handler(exc, {})
+    headers = {name: response[name] for name in ('WWW-Authenticate', 'Retry-After') if response.has_header(name)}
+    return render(response.data, response.status_code, headers)
+
+
+def _toggle_like(author_id, post_id):
+    result = toggle_like(author_id, post_id)
+    invalidate_post(result.post_id)
+    pin_to_primary(author_id)
+    return result
+
+
+def _create_comment(serializer, author, post_id):
+    with transaction.atomic():
+        serializer.save(author=author, post_id=post_id)
+        Post.objects.filter(pk=post_id).update(comments_count=F('comments_count') + 1)
+    pin_to_primary(author.pk)
+
+
+class AsyncAPIView(View):
+    """
+    Асинхронное представление с аутентификацией по токену и ответами как у DRF.
+    Методы без асинхронного обработчика передаются синхронному `sync_view` (DRF) через `sync_to_async`.
+    """
+    sync_view = None
+    authentication = CachedTokenAuthentication()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or not iscoroutinefunction(handler):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+        request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+        try:
+            result = await self.authentication.aauthenticate(request)
+            request.user, request.auth = result or (api_settings.UNAUTHENTICATED_USER(), None)
+            return await handler(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            return error_response(exc)
+
+    @staticmethod
+    def require_user(request):
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated
+
+
+class CachedReadMixin:
+    """
+    Кеширование ответа с ETag так же, как `CachedResponseMixin`, и с теми же ключами:
+    JSON-ответы синхронного и асинхронного путей совпадают байт в байт.
+    """
+    async def cached_response(self, request, scope, build):
+        """
+        `build()` возвращает `(данные, версии постов страницы списка или None)`.
+        """
+        key = await abuild_key(request, scope, JSON_MEDIA_TYPE)
+        entry = await get_cache().aget(key)
+        if entry is None or not await ais_fresh(entry):
+            data, versions = await build()
+            entry = build_entry(JSONRenderer().render(data), JSON_MEDIA_TYPE, {'Vary': 'Accept'}, versions)
+            await get_cache().aset(key, entry, get_setting('TIMEOUT'))
+        response = not_modified(entry) if etag_matches(request, entry['etag']) else from_entry(entry)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def get_fast_serializer(self, request):
+        selection = parse_field_selection(request.query_params, PostSerializer)
+        return FastPostSerializer({'request': request, 'field_selection': selection})
+
+
+class PostListView(CachedReadMixin, AsyncAPIView):
+    """
+    ## Эндпоинты:
+    - `GET /posts/` — список постов (курсорная пагинация, сначала новые)
+    - `POST /posts/` — через `PostViewSet.create`
+    """
+    sync_view = staticmethod(PostViewSet.as_view({'get': 'list', 'post': 'create'}, basename='post', detail=False))
+
+    async def get(self, request):
+        async def build():
+            serializer = self.get_fast_serializer(request)
+            paginator = KeysetPagination()
+            rows, versions = await apaginate_with_versions(
+                paginator, Post.objects.values(*serializer.columns()), request,
+            )
+            data = paginator.get_paginated_response(await serializer.aserialize(rows)).data
+            return data, versions
+
+        return await self.cached_response(request, LIST_SCOPE, build)
+
+
+class PostDetailView(CachedReadMixin, AsyncAPIView):
+    """
+    ## Эндпоинты:
+    - `GET /posts/{id}/` — детали поста
+    - `PUT/PATCH/DELETE /posts/{id}/` — через `PostViewSet`
+    """
+    sync_view = staticmethod(PostViewSet.as_view(
+        {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+        basename='post',
+        detail=True,
+    ))
+
+    async def get(self, request, pk):
+        async def build():
+            serializer = self.get_fast_serializer(request)
+            try:
+                row = await Post.objects.values(*serializer.columns()).aget(pk=pk)
+            except (Post.DoesNotExist, ValueError, TypeError):
+                raise Http404
+            return (await serializer.aserialize([row]))[0], None
+
+        return await self.cached_response(request, post_scope(pk), build)
+
+
+class PostLikeView(AsyncAPIView):
+    """
+    ## Эндпоинты:
+    - `POST /posts/{id}/like/` — поставить или убрать лайк (только авторизованный)
+    """
+    sync_view = staticmethod(PostViewSet.as_view({'post': 'like'}, basename='post', detail=True, **PostViewSet.like.kwargs))
+
+    async def post(self, request, pk):
+        self.require_user(request)
+        try:
+            result = await sync_to_async(_toggle_like)(request.user.pk, int(pk))
+        except (ValueError, Post.DoesNotExist):
+            raise exceptions.NotFound
+        return render({'status': 'liked' if result.liked else 'unliked', 'likes_count': result.likes_count})
+
+
+class PostCommentView(AsyncAPIView):
+    """
+    ## Эндпоинты:
+    - `POST /posts/{id}/comment/` — оставить комментарий (только авторизованный)
+    """
+    sync_view = staticmethod(
+        PostViewSet.as_view({'post': 'comment'}, basename='post', detail=True, **PostViewSet.comment.kwargs)
+    )
+
+    async def post(self, request, pk):
+        self.require_user(request)
+        try:
+            exists = await Post.objects.filter(pk=pk).aexists()
+        except (ValueError, TypeError):
+            exists = False
+        if not exists:
+            raise Http404
+        serializer = CommentSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        await sync_to_async(_create_comment)(serializer, request.user, int(pk))
+        return render(serializer.data, status.HTTP_201_CREATED)
+
+
+# Подключаются под `api/` перед маршрутами `PostViewSet`, если включена настройка `POST_ASYNC_VIEWS`
+async_urlpatterns = [
+    path('posts/', PostListView.as_view(), name='post-list-async'),
+    re_path(r'^posts/(?P<pk>[^/.]+)/$', PostDetailView.as_view(), name='post-detail-async'),
+    re_path(r'^posts/(?P<pk>[^/.]+)/like/$', PostLikeView.as_view(), name='post-like-async'),
+    re_path(r'^posts/(?P<pk>[^/.]+)/comment/$', PostCommentView.as_view(), name='post-comment-async'),
+]
@@ -0,0 +1,304 @@
+"""
+Кеш ответов `PostViewSet` (список и детали поста) с ETag и условными GET.
+
+В кеше хранится уже отрендеренный ответ, поэтому при попадании ни сериализатор,
+ни рендерер не вызываются, а запрос с совпадающим `If-None-Match` получает 304.
+
+Ключ записи включает «версию»: общую для всех страниц списка и отдельную для каждого поста.
+Инвалидация — смена версии: `invalidate_posts` меняет версии постов, её вызывают сигналы
+`post_save`/`post_delete` моделей `Post`, `Comment`, `Like`, `PostImage` (см. `posts.signals`),
+а также код, изменяющий данные в обход сигналов (`update()`, `bulk_create()`, сырой SQL).
+Версия списка (`invalidate_post_list`) меняется только при появлении и удалении постов.
+Страница списка запоминает версии постов, которые на ней есть, и при попадании сверяет их
+одним `get_many`: лайк или комментарий сбрасывает только страницы со своим постом.
+Заголовки `Vary` и `Allow` сохраняются вместе с ответом.
+
+Версии меняются после фиксации транзакции (`transaction.on_commit`), а страница списка
+читает версии своих постов до строк страницы. Поэтому запрос, прочитавший данные до фиксации,
+сохраняет ответ под уже устаревшей версией, и старые данные не попадают под новую версию.
+
+Бэкенд задаётся алиасом из `CACHES` (`POSTS_CACHE['ALIAS']`). Версии хранятся в том же кеше,
+поэтому при общем бэкенде (Redis, Memcached, файловый кеш) инвалидация видна всем процессам.
+
+Ответы, прочитанные из реплики (см. `social_network.db_router`), хранятся под отдельными
+ключами и не дольше `DATABASE_ROUTING['REPLICA_LAG']`: реплика могла ещё не получить
+изменение, сменившее версию, и устаревший ответ не должен жить весь `TIMEOUT`
+и доставаться пользователям, читающим из основной базы.
+"""
+import hashlib
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import quote_etag
+from rest_framework.exceptions import NotFound
+
+from social_network.db_router import current_read_database
+from social_network.db_router import get_setting as get_routing_setting
+from social_network.profiling import section
+
+from .pagination import KeysetPagination
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'posts',
+}
+
+LIST_SCOPE = 'list'
+# Заголовки ответа, которые хранятся в кеше вместе с содержимым
+STORED_HEADERS = ('Vary', 'Allow')
+
+
+def get_setting(name):
+    return getattr(settings, 'POSTS_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting('ALIAS')]
+
+
+def _version_key(scope):
+    return f'{get_setting("KEY_PREFIX")}:version:{scope}'
+
+
+def get_version(scope):
+    cache = get_cache()
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(scope):
+    """
+    Асинхронный `get_version`.
+    """
+    cache = get_cache()
+    key = _version_key(scope)
+    version = await cache.aget(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def post_scope(post_id):
+    """
+    Область кеша поста. Идентификатор приводится к числу, чтобы `/posts/01/`
+    и `/posts/1/` сбрасывались вместе; нечисловой идентификатор — 404.
+    """
+    try:
+        return f'post:{int(post_id)}'
+    except (TypeError, ValueError):
+        raise NotFound
+
+
+def _bump_versions(scopes):
+    get_cache().set_many({_version_key(scope): uuid.uuid4().hex for scope in scopes}, None)
+
+
+def invalidate_posts(post_ids):
+    """
+    Сбрасывает закешированные ответы для деталей указанных постов и страницы списка с ними.
+    Внутри транзакции версии меняются после её фиксации, при откате — не меняются.
+    """
+    scopes = {post_scope(post_id) for post_id in post_ids}
+    if scopes:
+        transaction.on_commit(partial(_bump_versions, scopes))
+
+
+def invalidate_post(post_id):
+    invalidate_posts([post_id])
+
+
+def invalidate_post_list():
+    """
+    Сбрасывает все страницы списка (пост создан или удалён) после фиксации транзакции.
+    """
+    transaction.on_commit(partial(_bump_versions, [LIST_SCOPE]))
+
+
+def post_versions(post_ids):
+    """
+    Текущие версии постов `{ключ версии: версия}` для записи страницы списка.
+    """
+    keys = [_version_key(post_scope(post_id)) for post_id in post_ids]
+    versions = get_cache().get_many(keys)
+    for post_id, key in zip(post_ids, keys):
+        if key not in versions:
+            versions[key] = get_version(post_scope(post_id))
+    return versions
+
+
+async def apost_versions(post_ids):
+    """
+    Асинхронный `post_versions`.
+    """
+    keys = [_version_key(post_scope(post_id)) for post_id in post_ids]
+    versions = await get_cache().aget_many(keys)
+    for post_id, key in zip(post_ids, keys):
+        if key not in versions:
+            versions[key] = await aget_version(post_scope(post_id))
+    return versions
+
+
+def paginate_with_versions(paginator, queryset, request):
+    """
+    Страница `KeysetPagination` и версии её постов, прочитанные до строк страницы
+    (отдельным запросом идентификаторов).
+    """
+    page_queryset, cursor = paginator.prepare(queryset, request)
+    post_ids = list(page_queryset.values_list('pk', flat=True))[:paginator.page_size]
+    versions = post_versions(post_ids)
+    return paginator.finish(list(page_queryset), cursor), versions
+
+
+async def apaginate_with_versions(paginator, queryset, request):
+    """
+    Асинхронный `paginate_with_versions`.
+    """
+    page_queryset, cursor = paginator.prepare(queryset, request)
+    post_ids = [pk async for pk in page_queryset.values_list('pk', flat=True)][:paginator.page_size]
+    versions = await apost_versions(post_ids)
+    return paginator.finish([row async for row in page_queryset], cursor), versions
+
+
+def is_fresh(entry):
+    """
+    Не изменился ли ни один пост, попавший в запись (для деталей — всегда да).
+    """
+    versions = entry.get('versions')
+    return not versions or get_cache().get_many(list(versions)) == versions
+
+
+async def ais_fresh(entry):
+    versions = entry.get('versions')
+    return not versions or await get_cache().aget_many(list(versions)) == versions
+
+
+def _response_key(request, scope, version, media_type, database=None):
+    raw = f'{request.build_absolute_uri()}|{media_type}'
+    if database:
+        raw += f'|{database}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'{get_setting("KEY_PREFIX")}:response:{scope}:{version}:{digest}'
+
+
+def build_key(request, scope):
+    """
+    Ключ записи: версия области + полный URL (с хостом и параметрами) + тип ответа
+    (+ реплика, если запрос читает из неё).
+    """
+    return _response_key(request, scope, get_version(scope), request.accepted_media_type, current_read_database())
+
+
+async def abuild_key(request, scope, media_type):
+    """
+    Асинхронный `build_key` для ответов, отрендеренных без согласования содержимого DRF.
+    """
+    return _response_key(request, scope, await aget_version(scope), media_type)
+
+
+def entry_timeout():
+    if current_read_database():
+        return min(get_setting('TIMEOUT'), get_routing_setting('REPLICA_LAG'))
+    return get_setting('TIMEOUT')
+
+
+def build_entry(content, content_type, headers=None, versions=None):
+    """
+    Запись кеша: содержимое, ETag, сохраняемые заголовки и версии постов страницы списка.
+    `Last-Modified` не отдаётся: время сборки записи не говорит, когда менялись посты,
+    а отдельной даты изменения у поста нет; условные запросы идут по ETag.
+    """
+    return {
+        'content': content,
+        'content_type': content_type,
+        'etag': quote_etag(hashlib.md5(content).hexdigest()),
+        'headers': {name: headers[name] for name in STORED_HEADERS if headers and name in headers},
+        'versions': versions or {},
+    }
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def not_modified(entry):
+    response = HttpResponse(status=304)
+    response['ETag'] = entry['etag']
+    vary = entry.get('headers', {}).get('Vary')
+    if vary:
+        response['Vary'] = vary
+    return response
+
+
+def from_entry(entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'], headers=entry.get('headers'))
+    response['ETag'] = entry['etag']
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Примесь к ViewSet: кеширует отрендеренные ответы `list` и `retrieve`
+    и отвечает 304 на `If-None-Match`, не выполняя сериализацию.
+    """
+    cached_actions = ('list', 'retrieve')
+
+    def get_cache_scope(self):
+        if self.action == 'retrieve':
+            return post_scope(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return LIST_SCOPE
+
+    def _cached_response(self, request, handler, *args, **kwargs):
+        key = build_key(request, self.get_cache_scope())
+        entry = get_cache().get(key)
+        if entry is not None and is_fresh(entry):
+            if etag_matches(request, entry['etag']):
+                return not_modified(entry)
+            return from_entry(entry)
+        response = handler(request, *args, **kwargs)
+        response._posts_cache_key = key
+        return response
+
+    def paginate_queryset(self, queryset):
+        if self.action != 'list' or not isinstance(self.paginator, KeysetPagination):
+            return super().paginate_queryset(queryset)
+        # версии постов страницы: запись списка устаревает при изменении любого из них
+        page, self._cached_versions = paginate_with_versions(self.paginator, queryset, self.request)
+        return page
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, super().retrieve, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(response, '_posts_cache_key', None)
+        if key is None or response.status_code != 200:
+            return response
+
+        with section('render'):
+            response.render()
+        versions = getattr(self, '_cached_versions', None)
+        entry = build_entry(response.content, response['Content-Type'], response, versions)
+        get_cache().set(key, entry, entry_timeout())
+        if etag_matches(request, entry['etag']):
+            return not_modified(entry)
+        response['ETag'] = entry['etag']
+        return response
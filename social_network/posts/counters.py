@@ -0,0 +1,44 @@
+"""
+Денормализованные счётчики `Post.likes_count` и `Post.comments_count`.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate_posts
+
+
+def count_of(model):
+    """
+    Выражение с количеством строк `model`, ссылающихся на пост (`post_id`).
+    """
+    counts = (
+        model.objects
+        .filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def reconcile_counters(queryset):
+    """
+    Пересчитывает `likes_count` и `comments_count` для постов из `queryset`.
+    Обновляются только расходящиеся строки. Возвращает количество исправленных постов.
+    """
+    from .models import Comment, Like
+
+    drifted = list(
+        queryset
+        .annotate(actual_likes=count_of(Like), actual_comments=count_of(Comment))
+        .exclude(likes_count=F('actual_likes'), comments_count=F('actual_comments'))
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        queryset.model.objects.filter(pk__in=drifted).update(
+            likes_count=count_of(Like),
+            comments_count=count_of(Comment),
+        )
+        invalidate_posts(drifted)
+    return len(drifted)
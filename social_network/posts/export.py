@@ -0,0 +1,125 @@
+"""
+Потоковая выгрузка постов, комментариев и лайков в NDJSON (одна JSON-запись на строку).
+
+Таблицы читаются через `values().iterator(chunk_size=...)` — на PostgreSQL это серверный
+курсор, — и записи сразу кодируются и отдаются блоками, поэтому потребление памяти
+не зависит от размера таблиц. Каждая запись содержит поле `type` (`post`, `comment`, `like`).
+Удалённые посты и их комментарии и лайки не выгружаются.
+
+Фильтры: авторы (`author` — автор самой записи) и полуинтервал времени
+`since <= created_at < until`. Для инкрементальной выгрузки следующий запуск
+начинается с `until` предыдущего. `created_at` присваивается до фиксации транзакции,
+поэтому строка может стать видимой уже после того, как выгрузка прошла её время.
+Чтобы такие строки не терялись между запусками, `until` отстаёт от текущего
+времени не меньше чем на `EXPORT['SAFETY_MARGIN']` секунд (`export_until`):
+транзакции, вставляющие записи, должны быть короче этого запаса.
+
+Используется в `GET /api/export/` (`ExportView`) и в команде `export_ndjson`.
+"""
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Comment, Like, Post
+
+DEFAULTS = {
+    'SAFETY_MARGIN': 60,
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+# Колонки и модели выгружаемых записей в порядке выгрузки
+EXPORT_TYPES = {
+    'post': (Post, [
+        'id', 'author_id', 'text', 'image', 'location', 'address', 'latitude', 'longitude',
+        'likes_count', 'comments_count', 'created_at',
+    ]),
+    'comment': (Comment, ['id', 'post_id', 'author_id', 'text', 'created_at']),
+    'like': (Like, ['id', 'post_id', 'author_id', 'created_at']),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'EXPORT', {}).get(name, DEFAULTS[name])
+
+
+def export_until(until=None):
+    """
+    Верхняя граница выгрузки: `until` (по умолчанию — сейчас), но не позже,
+    чем `EXPORT['SAFETY_MARGIN']` секунд назад.
+    """
+    limit = timezone.now() - timedelta(seconds=get_setting('SAFETY_MARGIN'))
+    return limit if until is None else min(until, limit)
+
+
+def export_records(types=tuple(EXPORT_TYPES), authors=None, since=None, until=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Генератор записей для выгрузки, по таблицам в порядке `EXPORT_TYPES`, внутри таблицы — по `id`.
+    """
+    for name, (model, columns) in EXPORT_TYPES.items():
+        if name not in types:
+            continue
+        queryset = model.objects.order_by('id')
+        if model is not Post:
+            # комментарии и лайки удалённых постов, ещё не убранные воркером `posts.purge`
+            queryset = queryset.filter(post__deleted_at__isnull=True)
+        if authors:
+            queryset = queryset.filter(author_id__in=authors)
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        if until is not None:
+            queryset = queryset.filter(created_at__lt=until)
+        for row in queryset.values(*columns).iterator(chunk_size=chunk_size):
+            yield {'type': name, **row}
+
+
+def ndjson_chunks(records, buffer_size=BUFFER_SIZE):
+    """
+    Кодирует записи в строки NDJSON и отдаёт их блоками примерно по `buffer_size` байт.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    buffer, size = [], 0
+    for record in records:
+        line = (encoder.encode(record) + '\n').encode()
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Сжимает поток блоков в формат gzip (`wbits=31` — заголовок и контрольная сумма gzip).
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Позволяет запросить выгрузку с `Accept: application/x-ndjson`;
+    сами данные выгрузки отдаются `StreamingHttpResponse` без рендерера,
+    а ошибки рендерятся одной строкой JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def export_stream(gzip=False, **filters):
+    """
+    Блоки байтов NDJSON (или gzip) для `StreamingHttpResponse` или записи в файл.
+    """
+    chunks = ndjson_chunks(export_records(**filters))
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,231 @@
+"""
+Быстрая сериализация постов для чтения (список и детали).
+
+`PostSerializer(many=True)` для каждого поста и каждого вложенного комментария
+и изображения проходит по всем полям DRF (`get_attribute`, `to_representation`,
+`OrderedDict`). `FastPostSerializer` строит те же словари напрямую из строк `values()`,
+выбранных несколькими пакетными запросами:
+
+1. посты — `values()` только нужных колонок;
+2. превью комментариев всех постов — один запрос с ROW_NUMBER() по `post_id`;
+3. изображения всех постов — один запрос.
+
+Результат совпадает с `PostSerializer` байт в байт (тот же порядок ключей, форматы дат,
+десятичных чисел и ссылок на файлы), поэтому схема OpenAPI остаётся прежней.
+Построение словарей (`build`) не обращается к БД и может вызываться из асинхронного кода.
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404
+from rest_framework.response import Response
+
+from social_network.profiling import section
+
+from .fieldsets import ALL_FIELDS, POST_FIELD_COLUMNS
+from .models import Comment, Post, PostImage
+from .serializers import CommentSerializer, PostSerializer
+
+
+def post_columns(selection=ALL_FIELDS, required=('id', 'created_at')):
+    """
+    Колонки `values()` для выбранных полей поста.
+    """
+    names = POST_FIELD_COLUMNS if selection.fields is None else selection.fields | selection.expand
+    columns = set(required) | {'id'}
+    for name in names:
+        if name != 'author' or name in selection.expand:
+            columns.update(POST_FIELD_COLUMNS.get(name, []))
+    columns.discard('author')
+    return sorted(columns)
+
+
+def comment_previews_queryset(post_ids, size=None):
+    """
+    Последние `size` комментариев каждого поста одним запросом.
+    """
+    size = settings.POST_COMMENTS_PREVIEW_SIZE if size is None else size
+    return (
+        Comment.objects
+        .filter(post_id__in=post_ids)
+        .annotate(row_number=Window(
+            RowNumber(), partition_by=[F('post_id')], order_by=[F('created_at').desc(), F('id').desc()]
+        ))
+        .filter(row_number__lte=size)
+        .order_by('post_id', '-created_at', '-id')
+        .values('post_id', 'author_id', 'text', 'created_at')
+    )
+
+
+def images_queryset(post_ids):
+    """
+    Изображения постов одним запросом в порядке `id`.
+    """
+    return PostImage.objects.filter(post_id__in=post_ids).order_by('id').values('post_id', 'image', 'variants')
+
+
+def group_by_post(post_ids, rows):
+    grouped = {post_id: [] for post_id in post_ids}
+    for row in rows:
+        grouped[row['post_id']].append(row)
+    return grouped
+
+
+def fetch_comment_previews(post_ids, size=None):
+    """
+    Последние `size` комментариев каждого поста: {post_id: [row, ...]}.
+    """
+    return group_by_post(post_ids, comment_previews_queryset(post_ids, size))
+
+
+def fetch_images(post_ids):
+    """
+    Изображения постов: {post_id: [row, ...]} в порядке `id`.
+    """
+    return group_by_post(post_ids, images_queryset(post_ids))
+
+
+class FastPostSerializer:
+    """
+    Сериализатор постов только для чтения, эквивалентный `serializer_class` (по умолчанию `PostSerializer`).
+
+    Порядок и набор полей берутся из экземпляра `serializer_class` с тем же контекстом
+    (с учётом `?fields=`/`?expand=`), форматирование дат и десятичных чисел —
+    из его полей, поэтому настройки DRF (`DATETIME_FORMAT`, `COERCE_DECIMAL_TO_STRING`)
+    применяются так же.
+    """
+    def __init__(self, context, serializer_class=PostSerializer):
+        self.context = context
+        self.request = context.get('request')
+        self.selection = context.get('field_selection') or ALL_FIELDS
+        self.fields = serializer_class(context=context).fields
+        self.comment_fields = CommentSerializer(context=context).fields
+        self.storage = Post._meta.get_field('image').storage
+        self.image_storage = PostImage._meta.get_field('image').storage
+        self.builders = {name: getattr(self, f'_build_{name}', None) for name in self.fields}
+
+    def columns(self, required=('id', 'created_at')):
+        return post_columns(self.selection, required)
+
+    def fetch_related(self, post_ids):
+        """
+        Пакетно загружает комментарии и изображения, если эти поля выбраны.
+        """
+        related = {}
+        if 'comments' in self.fields:
+            related['comments'] = fetch_comment_previews(post_ids)
+        if 'images' in self.fields:
+            related['images'] = fetch_images(post_ids)
+        return related
+
+    async def afetch_related(self, post_ids):
+        """
+        Асинхронный `fetch_related` (асинхронный ORM).
+        """
+        related = {}
+        if 'comments' in self.fields:
+            rows = [row async for row in comment_previews_queryset(post_ids)]
+            related['comments'] = group_by_post(post_ids, rows)
+        if 'images' in self.fields:
+            related['images'] = group_by_post(post_ids, [row async for row in images_queryset(post_ids)])
+        return related
+
+    def serialize(self, rows):
+        """
+        Загружает связанные данные для строк `rows` (словари из `values()`) и строит ответ.
+        """
+        rows = list(rows)
+        return self.build(rows, self.fetch_related([row['id'] for row in rows]))
+
+    async def aserialize(self, rows):
+        """
+        Асинхронный `serialize`: `rows` — уже загруженный список строк.
+        """
+        return self.build(rows, await self.afetch_related([row['id'] for row in rows]))
+
+    def build(self, rows, related):
+        """
+        Строит список словарей без обращений к БД.
+        """
+        with section('serialize'):
+            return [self.build_one(row, related) for row in rows]
+
+    def build_one(self, row, related):
+        data = {}
+        for name, field in self.fields.items():
+            builder = self.builders[name]
+            if builder is not None:
+                data[name] = builder(row, related)
+                continue
+            value = row[field.source]
+            data[name] = None if value is None else field.to_representation(value)
+        return data
+
+    def _url(self, storage, name):
+        url = storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+    def _variants(self, storage, variants):
+        return {name: self._url(storage, path) for name, path in (variants or {}).items()}
+
+    def _build_image(self, row, related):
+        return self._url(self.storage, row['image']) if row['image'] else None
+
+    def _build_image_variants(self, row, related):
+        return self._variants(self.storage, row['variants'])
+
+    def _build_location(self, row, related):
+        return row['address'] or row['location']
+
+    def _build_comments(self, row, related):
+        created_at = self.comment_fields['created_at']
+        return [
+            {
+                'author': comment['author_id'],
+                'text': comment['text'],
+                'created_at': created_at.to_representation(comment['created_at']),
+            }
+            for comment in related['comments'][row['id']]
+        ]
+
+    def _build_images(self, row, related):
+        return [
+            {
+                'image': self._url(self.image_storage, image['image']) if image['image'] else None,
+                'variants': self._variants(self.image_storage, image['variants']),
+            }
+            for image in related['images'][row['id']]
+        ]
+
+    def _build_author(self, row, related):
+        return {'id': row['author__id'], 'username': row['author__username']}
+
+
+class FastReadMixin:
+    """
+    Примесь к `PostViewSet`: `list` и `retrieve` через `FastPostSerializer`,
+    если включена настройка `POST_FAST_SERIALIZATION`.
+    """
+    def get_fast_serializer(self):
+        return FastPostSerializer(self.get_serializer_context(), self.get_serializer_class())
+
+    def list(self, request, *args, **kwargs):
+        if not settings.POST_FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_fast_serializer()
+        queryset = self.filter_queryset(Post.objects.values(*serializer.columns()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serializer.serialize(queryset))
+        return self.get_paginated_response(serializer.serialize(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.POST_FAST_SERIALIZATION:
+            return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_fast_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = Post.objects.values(*serializer.columns()).get(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (Post.DoesNotExist, ValueError, TypeError):
+            raise Http404
+        return Response(serializer.serialize([row])[0])
@@ -0,0 +1,132 @@
+"""
+Выбор полей ответа (`?fields=`) и раскрытие связанных объектов (`?expand=`) для постов.
+
+`?fields=id,image` оставляет в ответе только перечисленные поля,
+`?expand=author` добавляет вложенный объект автора. Набор полей определяет
+и запрос к БД (`post_queryset`): загружаются только нужные колонки, превью комментариев
+и изображения предзагружаются, только если запрошены, а JOIN с автором выполняется
+только при `expand=author`.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils.translation import gettext as _
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework.exceptions import ValidationError
+
+from .models import Comment, PostImage
+
+FieldSelection = namedtuple('FieldSelection', ['fields', 'expand'])
+
+ALL_FIELDS = FieldSelection(None, frozenset())
+
+# Колонки `Post`, которые читает каждое поле `PostSerializer`
+POST_FIELD_COLUMNS = {
+    'id': ['id'],
+    'text': ['text'],
+    'image': ['image'],
+    'image_variants': ['variants'],
+    'created_at': ['created_at'],
+    'comments': [],
+    'comments_count': ['comments_count'],
+    'likes_count': ['likes_count'],
+    'images': [],
+    'location': ['address', 'location'],
+    'latitude': ['latitude'],
+    'longitude': ['longitude'],
+    'geocoding_status': ['geocoding_status'],
+    'author': ['author', 'author__id', 'author__username'],
+}
+
+FIELD_SELECTION_PARAMETERS = [
+    OpenApiParameter('fields', str, description='Поля поста в ответе через запятую, например `id,image`'),
+    OpenApiParameter('expand', str, description='Раскрываемые связи через запятую: `author`'),
+]
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_field_selection(query_params, serializer_class):
+    """
+    Разбирает `?fields=` и `?expand=` для сериализатора с `SparseFieldsMixin`.
+    Неизвестные имена полей — ошибка 400.
+    """
+    fields = _split(query_params.get('fields', ''))
+    expand = _split(query_params.get('expand', ''))
+    errors = {}
+    unknown = set(fields) - set(serializer_class.Meta.fields) - set(serializer_class.expandable_fields)
+    if unknown:
+        errors['fields'] = _('Неизвестные поля: %(names)s') % {'names': ', '.join(sorted(unknown))}
+    unknown = set(expand) - set(serializer_class.expandable_fields)
+    if unknown:
+        errors['expand'] = _('Нельзя раскрыть: %(names)s') % {'names': ', '.join(sorted(unknown))}
+    if errors:
+        raise ValidationError(errors)
+    # раскрываемое поле в ?fields= означает то же, что и в ?expand=
+    expand = set(expand) | set(fields) & set(serializer_class.expandable_fields)
+    return FieldSelection(frozenset(fields) if fields else None, frozenset(expand))
+
+
+def selected(selection, name):
+    return selection.fields is None or name in selection.fields or name in selection.expand
+
+
+def post_prefetches(prefix='', selection=ALL_FIELDS):
+    """
+    Предзагрузки для `PostSerializer`: изображения (в порядке `id`) и превью комментариев (если запрошены).
+    Последние `POST_COMMENTS_PREVIEW_SIZE` комментариев всех постов страницы
+    выбираются одним запросом с оконной функцией ROW_NUMBER() по `post_id`.
+    """
+    prefetches = []
+    if selected(selection, 'comments'):
+        preview = Comment.objects.order_by('-created_at', '-id')[:settings.POST_COMMENTS_PREVIEW_SIZE]
+        prefetches.append(Prefetch(f'{prefix}comments', queryset=preview, to_attr='comments_preview'))
+    if selected(selection, 'images'):
+        prefetches.append(Prefetch(f'{prefix}images', queryset=PostImage.objects.order_by('id')))
+    return prefetches
+
+
+def post_queryset(queryset, selection=ALL_FIELDS, prefix='', required=('id', 'created_at')):
+    """
+    Ограничивает `queryset` колонками, предзагрузками и JOIN, нужными для `selection`.
+    `prefix` — путь к посту (например, `post__` для `TimelineEntry`),
+    `required` — колонки, нужные вызывающему коду (ключ пагинации и т. п.);
+    с непустым `prefix` они относятся к модели `queryset`, а не к посту.
+    Поисковый вектор не загружается никогда.
+    """
+    if 'author' in selection.expand:
+        queryset = queryset.select_related(f'{prefix}author')
+    queryset = queryset.prefetch_related(*post_prefetches(prefix, selection))
+    if selection.fields is None:
+        return queryset.defer(f'{prefix}search_vector')
+
+    columns = {'id'}
+    for name in selection.fields | selection.expand:
+        columns.update(POST_FIELD_COLUMNS.get(name, []))
+    if prefix:
+        return queryset.only(*required, prefix.rstrip('_'), *(f'{prefix}{column}' for column in columns))
+    return queryset.only(*required, *columns)
+
+
+class FieldSelectionMixin:
+    """
+    Примесь к представлению: разбирает `?fields=`/`?expand=` для GET-запросов
+    и передаёт выбор в контекст сериализатора (`field_selection`).
+    """
+    def get_field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            serializer_class = self.get_serializer_class()
+            request = getattr(self, 'request', None)
+            if request is not None and request.method == 'GET' and hasattr(serializer_class, 'expandable_fields'):
+                self._field_selection = parse_field_selection(request.query_params, serializer_class)
+            else:
+                self._field_selection = ALL_FIELDS
+        return self._field_selection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['field_selection'] = self.get_field_selection()
+        return context
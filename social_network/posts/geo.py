@@ -0,0 +1,105 @@
+"""
+Геохеш и поиск постов в радиусе без PostGIS.
+
+Геохеш кодирует точку строкой: каждый следующий символ делит ячейку на 32 части,
+поэтому точки одной ячейки имеют общий префикс. `Post.geohash` хранится с точностью
+`PRECISION` символов и индексируется B-деревом; поиск в радиусе сводится к запросу
+по префиксам 3×3 ячеек вокруг точки (`cells_for_radius`), после чего точное
+расстояние считается по формуле гаверсинуса в SQL (`distance_expression`).
+"""
+import math
+
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+EARTH_RADIUS = 6371008.8  # средний радиус Земли, м
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """
+    Возвращает геохеш точки длиной `precision` символов.
+    """
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """
+    Размер ячейки геохеша в градусах: `(широта, долгота)`.
+    """
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def precision_for_radius(latitude, radius):
+    """
+    Наибольшая точность, при которой ячейка не меньше `radius` метров
+    по широте и по долготе (на самой дальней от экватора широте круга).
+    """
+    meters_per_degree = math.pi * EARTH_RADIUS / 180
+    radius_degrees = radius / meters_per_degree
+    max_latitude = min(abs(float(latitude)) + radius_degrees, 89.9)
+    lon_meters_per_degree = meters_per_degree * math.cos(math.radians(max_latitude))
+    for precision in range(PRECISION, 0, -1):
+        lat_size, lon_size = cell_size(precision)
+        if lat_size * meters_per_degree >= radius and lon_size * lon_meters_per_degree >= radius:
+            return precision
+    return 0
+
+
+def cells_for_radius(latitude, longitude, radius):
+    """
+    Префиксы геохешей (ячейка точки и восемь соседних), покрывающие круг радиусом `radius` метров.
+    Пустой список означает, что круг больше самой крупной ячейки и отсечь ничего нельзя.
+    """
+    precision = precision_for_radius(latitude, radius)
+    if not precision:
+        return []
+    lat_size, lon_size = cell_size(precision)
+    latitude, longitude = float(latitude), float(longitude)
+    # центр ячейки точки, от него шагаем на размер ячейки в каждую сторону
+    center_lat = (math.floor((latitude + 90) / lat_size) + 0.5) * lat_size - 90
+    center_lon = (math.floor((longitude + 180) / lon_size) + 0.5) * lon_size - 180
+    cells = set()
+    for dlat in (-1, 0, 1):
+        cell_lat = center_lat + dlat * lat_size
+        if not -90 < cell_lat < 90:
+            continue
+        for dlon in (-1, 0, 1):
+            cell_lon = (center_lon + dlon * lon_size + 180) % 360 - 180
+            cells.add(encode(cell_lat, cell_lon, precision))
+    return sorted(cells)
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """
+    SQL-выражение расстояния (м) от точки до координат записи по формуле гаверсинуса.
+    """
+    lat = Value(math.radians(float(latitude)), output_field=FloatField())
+    lon = Value(math.radians(float(longitude)), output_field=FloatField())
+    row_lat = Radians(F(lat_field), output_field=FloatField())
+    row_lon = Radians(F(lon_field), output_field=FloatField())
+    a = (
+        Power(Sin((row_lat - lat) / 2), 2)
+        + Cos(lat) * Cos(row_lat) * Power(Sin((row_lon - lon) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS * ASin(Sqrt(a), output_field=FloatField())
@@ -0,0 +1,296 @@
+"""
+Геокодирование адресов с двухуровневым кешем.
+
+Первый уровень — LRU-кеш в памяти процесса, второй — таблица `GeocodeCacheEntry`.
+Сетевой запрос к геокодеру выполняется только при промахе на обоих уровнях.
+Ненайденные адреса тоже кешируются (с более коротким TTL), а временные ошибки
+геокодера — нет. Вместе с координатами кешируется полный адрес, который
+сохраняется в `Post.address`, поэтому при чтении постов геокодер не вызывается.
+Ключи кеша разделены по пространствам имён: `forward:<нормализованный адрес>`
+для прямого геокодирования и `reverse:<lat>,<lon>` для обратного (координаты -> адрес),
+поэтому введённый пользователем адрес не может совпасть с ключом обратного геокодирования.
+
+Бэкенд геокодера задаётся настройкой `GEOCODING['BACKEND']`, поэтому в тестах
+Nominatim можно заменить локальной заглушкой через `override_settings`.
+"""
+import logging
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from social_network.lru import MISSING, LRUCache
+
+from .models import GeocodeCacheEntry
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'posts.geocoding.NominatimGeocoder',
+    'USER_AGENT': 'post-geocoder',
+    'TIMEOUT': 5,
+    'CACHE_SIZE': 1024,
+    'CACHE_TTL': 60 * 60 * 24 * 30,
+    'NEGATIVE_CACHE_TTL': 60 * 60 * 24,
+    'RATE_LIMIT': 1.0,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 30,
+    'RETRY_BACKOFF_MAX': 60 * 60,
+    'VISIBILITY_TIMEOUT': 5 * 60,
+}
+
+COORDINATE_QUANT = Decimal('0.000001')
+
+ADDRESS_MAX_LENGTH = GeocodeCacheEntry._meta.get_field('address').max_length
+
+GeocodeResult = namedtuple('GeocodeResult', ['latitude', 'longitude', 'address'])
+
+EMPTY_RESULT = GeocodeResult(None, None, None)
+
+
+class GeocodingError(Exception):
+    """
+    Временная ошибка геокодера (сеть, таймаут, превышение квоты).
+    Такие ответы не кешируются.
+    """
+
+
+def get_setting(name):
+    return getattr(settings, 'GEOCODING', {}).get(name, DEFAULTS[name])
+
+
+def normalize_address(address):
+    """
+    Приводит адрес к каноническому виду для ключа кеша:
+    Unicode NFKC, нижний регистр, одиночные пробелы, без пробелов перед запятыми.
+    """
+    if not address:
+        return ''
+    key = unicodedata.normalize('NFKC', address).casefold()
+    key = re.sub(r'\s+', ' ', key).strip()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    return key.strip(' ,')
+
+
+def _quantize(value):
+    return Decimal(str(value)).quantize(COORDINATE_QUANT)
+
+
+def forward_key(address):
+    """
+    Ключ кеша прямого геокодирования или пустая строка для пустого адреса.
+    """
+    address = normalize_address(address)
+    return f'forward:{address}' if address else ''
+
+
+def reverse_key(latitude, longitude):
+    """
+    Ключ кеша обратного геокодирования для пары координат.
+    """
+    return f'reverse:{_quantize(latitude)},{_quantize(longitude)}'
+
+
+class NominatimGeocoder:
+    """
+    Бэкенд геокодирования через Nominatim (geopy).
+    Клиент создаётся один раз на процесс.
+    """
+    def __init__(self):
+        from geopy.geocoders import Nominatim
+
+        self.client = Nominatim(user_agent=get_setting('USER_AGENT'), timeout=get_setting('TIMEOUT'))
+
+    def geocode(self, address):
+        """
+        Возвращает `GeocodeResult` или `None`, если адрес не найден.
+        """
+        from geopy.exc import GeopyError
+
+        try:
+            location = self.client.geocode(address)
+        except GeopyError as e:
+            raise GeocodingError(str(e)) from e
+        if location is None:
+            return None
+        return GeocodeResult(location.latitude, location.longitude, location.address)
+
+    def reverse(self, latitude, longitude):
+        """
+        Возвращает `GeocodeResult` для координат или `None`, если адрес не найден.
+        """
+        from geopy.exc import GeopyError
+
+        try:
+            location = self.client.reverse(f'{latitude}, {longitude}')
+        except GeopyError as e:
+            raise GeocodingError(str(e)) from e
+        if location is None:
+            return None
+        return GeocodeResult(latitude, longitude, location.address)
+
+
+class CachedGeocoder:
+    """
+    Кеширующая обёртка над бэкендом геокодирования.
+
+    ## Счётчики:
+    - `memory_hits`: Ответ из кеша процесса
+    - `db_hits`: Ответ из таблицы `GeocodeCacheEntry`
+    - `misses`: Запрос к геокодеру
+    - `negative`: Адрес не найден геокодером
+    - `errors`: Временная ошибка геокодера
+    """
+    def __init__(self, backend, cache_size, ttl, negative_ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(['memory_hits', 'db_hits', 'misses', 'negative', 'errors'], 0)
+
+    def _incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        return {**self.counters, 'memory': self.memory.stats()}
+
+    def _lookup(self, key):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._incr('memory_hits')
+            return value
+        entry = GeocodeCacheEntry.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+        if entry is None:
+            return MISSING
+        self._incr('db_hits')
+        value = GeocodeResult(entry.latitude, entry.longitude, entry.address)
+        remaining = (entry.expires_at - timezone.now()).total_seconds()
+        self.memory.set(key, value, ttl=max(remaining, 0))
+        return value
+
+    def _resolve(self, key, query, *args, raise_errors=False):
+        value = self._lookup(key)
+        if value is not MISSING:
+            return value
+
+        self._incr('misses')
+        try:
+            result = query(*args)
+        except GeocodingError as e:
+            self._incr('errors')
+            if raise_errors:
+                raise
+            logger.warning('Ошибка при геокодировании %r: %s', args, e)
+            return EMPTY_RESULT
+
+        if result is None:
+            self._incr('negative')
+            value, ttl = EMPTY_RESULT, self.negative_ttl
+        else:
+            address = result.address[:ADDRESS_MAX_LENGTH] if result.address else None
+            value = GeocodeResult(_quantize(result.latitude), _quantize(result.longitude), address)
+            ttl = self.ttl
+        self._store(key, value, ttl)
+        return value
+
+    def _store(self, key, value, ttl):
+        GeocodeCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'latitude': value.latitude,
+                'longitude': value.longitude,
+                'address': value.address,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+            },
+        )
+        self.memory.set(key, value, ttl=ttl)
+
+    def lookup(self, address):
+        """
+        Ищет адрес только в кеше, без обращения к геокодеру.
+        Возвращает `GeocodeResult` или `MISSING`.
+        """
+        key = forward_key(address)
+        if not key:
+            return EMPTY_RESULT
+        return self._lookup(key)
+
+    def geocode(self, address, raise_errors=False):
+        """
+        Возвращает `GeocodeResult`; все поля равны `None`,
+        если адрес пустой, не найден или геокодер недоступен.
+        С `raise_errors=True` временные ошибки геокодера пробрасываются как `GeocodingError`.
+        """
+        key = forward_key(address)
+        if not key:
+            return EMPTY_RESULT
+        return self._resolve(key, self.backend.geocode, address, raise_errors=raise_errors)
+
+    def reverse(self, latitude, longitude):
+        """
+        Возвращает адрес для координат или `None`.
+        """
+        if latitude is None or longitude is None:
+            return None
+        return self._resolve(reverse_key(latitude, longitude), self.backend.reverse, latitude, longitude).address
+
+
+def build_geocoder(backend=None):
+    """
+    Создаёт `CachedGeocoder` по настройкам `GEOCODING`.
+    По умолчанию используется бэкенд из `GEOCODING['BACKEND']`.
+    """
+    return CachedGeocoder(
+        backend=backend or import_string(get_setting('BACKEND'))(),
+        cache_size=get_setting('CACHE_SIZE'),
+        ttl=get_setting('CACHE_TTL'),
+        negative_ttl=get_setting('NEGATIVE_CACHE_TTL'),
+    )
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    """
+    Возвращает общий для процесса экземпляр `CachedGeocoder`.
+    """
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = build_geocoder()
+    return _geocoder
+
+
+def geocode(address):
+    return get_geocoder().geocode(address)
+
+
+def lookup(address):
+    return get_geocoder().lookup(address)
+
+
+def reverse(latitude, longitude):
+    return get_geocoder().reverse(latitude, longitude)
+
+
+@receiver(setting_changed)
+def reset_geocoder(*, setting, **kwargs):
+    """
+    Сбрасывает экземпляр геокодера при изменении настроек (например, в `override_settings`).
+    """
+    global _geocoder
+    if setting == 'GEOCODING':
+        _geocoder = None
@@ -0,0 +1,198 @@
+"""
+Фоновая обработка очереди геокодирования (`GeocodeJob`).
+
+Воркер забирает готовые к выполнению задачи пачками через
+`SELECT ... FOR UPDATE SKIP LOCKED`, поэтому несколько процессов
+`python manage.py geocode_worker` могут работать параллельно.
+Задачи, воркер которых завис дольше `VISIBILITY_TIMEOUT`, снова становятся доступными.
+При временной ошибке геокодера задача откладывается с экспоненциальной задержкой,
+после `MAX_ATTEMPTS` попыток переводится в статус `dead`.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cache import invalidate_post
+from .geocoding import GeocodingError, build_geocoder, get_setting
+from .models import GeocodeJob, Post
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов («token bucket») в пределах процесса.
+    При нескольких воркерах квоту геокодера нужно делить между ними.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+class RateLimitedBackend:
+    """
+    Обёртка над бэкендом геокодирования, ограничивающая частоту запросов.
+    Попадания в кеш квоту не расходуют.
+    """
+    def __init__(self, backend, limiter):
+        self.backend = backend
+        self.limiter = limiter
+
+    def geocode(self, address):
+        self.limiter.acquire()
+        return self.backend.geocode(address)
+
+    def reverse(self, latitude, longitude):
+        self.limiter.acquire()
+        return self.backend.reverse(latitude, longitude)
+
+
+def retry_delay(attempts):
+    """
+    Задержка перед следующей попыткой: экспоненциальная, с ограничением сверху и случайным разбросом.
+    """
+    delay = min(get_setting('RETRY_BACKOFF') * 2 ** (attempts - 1), get_setting('RETRY_BACKOFF_MAX'))
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claimable_jobs(now=None):
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=get_setting('VISIBILITY_TIMEOUT'))
+    return GeocodeJob.objects.filter(
+        Q(status=GeocodeJob.Status.PENDING, run_after__lte=now)
+        | Q(status=GeocodeJob.Status.PROCESSING, locked_at__lt=stale)
+    )
+
+
+def claim_jobs(worker_id, limit):
+    """
+    Забирает до `limit` задач в работу и возвращает их.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            claimable_jobs(now)
+            .select_for_update(skip_locked=True)
+            .order_by('run_after')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        claimable_jobs(now).filter(id__in=ids).update(
+            status=GeocodeJob.Status.PROCESSING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(GeocodeJob.objects.filter(id__in=ids, locked_by=worker_id, locked_at=now))
+
+
+def release_jobs(jobs):
+    """
+    Возвращает в очередь задачи, взятые воркером, но не выполненные (при остановке).
+    """
+    for job in jobs:
+        GeocodeJob.objects.filter(pk=job.pk, locked_by=job.locked_by, status=GeocodeJob.Status.PROCESSING).update(
+            status=GeocodeJob.Status.PENDING,
+            attempts=F('attempts') - 1,
+            locked_by='',
+            locked_at=None,
+        )
+
+
+def process_job(job, geocoder):
+    """
+    Выполняет одну задачу и записывает результат в пост.
+    Если адрес поста изменился, пока задача выполнялась, результат отбрасывается:
+    `GeocodeJob.enqueue` уже перезапустил задачу с новым адресом.
+    """
+    own_job = GeocodeJob.objects.filter(pk=job.pk, locked_by=job.locked_by, location=job.location)
+    try:
+        result = geocoder.geocode(job.location, raise_errors=True)
+    except Exception as e:
+        if not isinstance(e, GeocodingError):
+            logger.exception('Ошибка задачи геокодирования %s', job.pk)
+        dead = job.attempts >= get_setting('MAX_ATTEMPTS')
+        with transaction.atomic():
+            updated = own_job.update(
+                status=GeocodeJob.Status.DEAD if dead else GeocodeJob.Status.PENDING,
+                run_after=timezone.now() + retry_delay(job.attempts),
+                locked_by='',
+                locked_at=None,
+                last_error=str(e),
+            )
+            if updated and dead:
+                Post.objects.filter(pk=job.post_id, location=job.location).update(
+                    geocoding_status=Post.GeocodingStatus.FAILED
+                )
+                invalidate_post(job.post_id)
+        return GeocodeJob.Status.DEAD if dead else GeocodeJob.Status.PENDING
+
+    status = Post.GeocodingStatus.DONE if result.latitude is not None else Post.GeocodingStatus.FAILED
+    with transaction.atomic():
+        if own_job.update(status=GeocodeJob.Status.DONE, locked_by='', locked_at=None, last_error=''):
+            Post.objects.filter(pk=job.post_id, location=job.location).update(
+                latitude=result.latitude,
+                longitude=result.longitude,
+                address=result.address,
+                geohash=Post.geohash_of(result.latitude, result.longitude),
+                geocoding_status=status,
+            )
+            invalidate_post(job.post_id)
+    return GeocodeJob.Status.DONE
+
+
+def run_worker(worker_id=None, batch_size=10, rate=None, poll_interval=1.0, once=False, backend=None, stop=None):
+    """
+    Основной цикл воркера. С `once=True` завершается, когда очередь пуста.
+    `stop` — `threading.Event` для корректной остановки.
+    Возвращает словарь с количеством задач по итоговым статусам.
+    """
+    worker_id = worker_id or default_worker_id()
+    rate = get_setting('RATE_LIMIT') if rate is None else rate
+    geocoder = build_geocoder(backend)
+    geocoder.backend = RateLimitedBackend(geocoder.backend, RateLimiter(rate))
+    stop = stop or threading.Event()
+    totals = dict.fromkeys(GeocodeJob.Status.values, 0)
+
+    while not stop.is_set():
+        jobs = claim_jobs(worker_id, batch_size)
+        if not jobs:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        for index, job in enumerate(jobs):
+            if stop.is_set():
+                release_jobs(jobs[index:])
+                break
+            totals[process_job(job, geocoder)] += 1
+    return totals
@@ -0,0 +1,37 @@
+"""
+Построение уменьшенных копий изображений (Pillow).
+
+Модуль не зависит от Django: функции выполняются в дочерних процессах
+пула (`posts.images`) и принимают/возвращают только байты.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def render_variants(data, sizes, image_format, quality):
+    """
+    Возвращает словарь {имя варианта: байты} для исходного изображения `data`.
+
+    - `sizes`: {имя: максимальная сторона в пикселях}; изображение не увеличивается
+    - `image_format`: `WEBP` или `JPEG`
+    - `quality`: {имя: качество кодирования}
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = {}
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, format=image_format, quality=quality.get(name, 80), optimize=True)
+            variants[name] = buffer.getvalue()
+        return variants
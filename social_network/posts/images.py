@@ -0,0 +1,261 @@
+"""
+Производные изображения (варианты разных размеров) для `Post.image` и `PostImage.image`.
+
+Перекодирование выполняется в пуле процессов (`IMAGE_VARIANTS['WORKERS']`),
+результаты сохраняются в хранилище под именем
+`<каталог оригинала>/variants/<имя>_<вариант>.<расширение>` (контентно-адресуемое
+хранилище `posts.storage` заменяет его хешем содержимого).
+Пути вариантов записываются в поле `variants` модели.
+
+`ingest_images` — пакетная загрузка изображений поста: проверка в пуле потоков,
+запись файлов, затем один `bulk_create` в транзакции. Загруженные файлы не читаются
+в память целиком: Pillow проверяет их, читая из файла, а хранилище пишет и хеширует
+их блоками (`UploadedFile.chunks()`).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils.translation import gettext as _
+from PIL import Image
+
+from .cache import invalidate_post, invalidate_posts
+from .image_processing import EXTENSIONS, render_variants
+from .models import PostImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SIZES': {'thumb': 160, 'medium': 640, 'large': 1280},
+    'FORMAT': 'WEBP',
+    'QUALITY': {'thumb': 70, 'medium': 80, 'large': 85},
+    'WORKERS': 2,
+    'ON_UPLOAD': True,
+    'IO_THREADS': 8,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_setting(name):
+    return getattr(settings, 'IMAGE_VARIANTS', {}).get(name, DEFAULTS[name])
+
+
+def get_pool():
+    """
+    Возвращает общий пул процессов или `None`, если `WORKERS` равно 0
+    (тогда изображения обрабатываются в текущем процессе).
+    """
+    global _pool
+    workers = get_setting('WORKERS')
+    if not workers:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def variant_name(name, variant):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{variant}.{EXTENSIONS[get_setting("FORMAT")]}')
+
+
+def generate_variants(instances, field_name='image'):
+    """
+    Строит варианты для изображений `instances` (объекты `Post` или `PostImage`)
+    параллельно в пуле процессов, сохраняет файлы и заполняет `instance.variants`.
+    Поле `variants` в БД не обновляется — это делает вызывающий код.
+    Возвращает список объектов, для которых варианты построены.
+    """
+    options = (get_setting('SIZES'), get_setting('FORMAT'), get_setting('QUALITY'))
+    pool = get_pool()
+    pending = []
+    for instance in instances:
+        file = getattr(instance, field_name)
+        if not file:
+            continue
+        with file.open('rb'):
+            data = file.read()
+        if pool is None:
+            pending.append((instance, file.name, data, None))
+        else:
+            pending.append((instance, file.name, None, pool.submit(render_variants, data, *options)))
+
+    processed = []
+    for instance, name, data, future in pending:
+        try:
+            rendered = render_variants(data, *options) if future is None else future.result()
+        except Exception:
+            logger.exception('Не удалось построить варианты изображения %s', name)
+            continue
+        processed.append((instance, name, rendered))
+
+    if not processed:
+        return []
+    # файлы всех вариантов сохраняются одним пакетом
+    storage = getattr(processed[0][0], field_name).storage
+    files = [
+        (variant_name(name, variant), ContentFile(content))
+        for instance, name, rendered in processed for variant, content in rendered.items()
+    ]
+    saved = iter(save_files(storage, files))
+    for instance, name, rendered in processed:
+        instance.variants = {variant: next(saved) for variant in rendered}
+    return [instance for instance, name, rendered in processed]
+
+
+def save_variants(instances, field_name='image'):
+    """
+    Строит варианты и сохраняет поле `variants` одним `bulk_update` на модель.
+    Ссылки на файлы прежних вариантов освобождаются после сохранения новых.
+    """
+    previous = {id(instance): list((instance.variants or {}).values()) for instance in instances}
+    processed = generate_variants(instances, field_name)
+    if processed:
+        with transaction.atomic():
+            type(processed[0]).objects.bulk_update(processed, ['variants'])
+            stale = [name for instance in processed for name in previous[id(instance)]]
+            if stale:
+                delete_names(getattr(processed[0], field_name).storage, stale)
+        invalidate_posts(getattr(instance, 'post_id', instance.pk) for instance in processed)
+    return processed
+
+
+def variants_on_upload():
+    return get_setting('ON_UPLOAD')
+
+
+def _validate_image(file):
+    """
+    Проверяет загруженный файл, читая его Pillow прямо из файла, и возвращает
+    позицию чтения в начало.
+    """
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            image.verify()
+    except Exception:
+        raise ValidationError(
+            _('Файл %(name)s не является корректным изображением.') % {'name': file.name},
+            code='invalid_image',
+        )
+    finally:
+        file.seek(0)
+    return file
+
+
+def validate_images(files):
+    """
+    Проверяет изображения параллельно в пуле потоков.
+    Возвращает список файлов в исходном порядке или бросает `ValidationError`.
+    """
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=min(get_setting('IO_THREADS'), len(files))) as executor:
+        futures = [executor.submit(_validate_image, file) for file in files]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise ValidationError([message for error in errors for message in error.messages])
+    return [future.result() for future in futures]
+
+
+def delete_files(instances, field_name='image'):
+    names, storage = [], None
+    for instance in instances:
+        file = getattr(instance, field_name)
+        if file:
+            storage = file.storage
+            names += [file.name, *(instance.variants or {}).values()]
+    if names:
+        delete_names(storage, names)
+
+
+def save_files(storage, files):
+    """
+    Сохраняет файлы `[(имя, содержимое)]`, возвращает имена в хранилище.
+    Контентно-адресуемое хранилище (`posts.storage`) учитывает ссылки одним пакетом.
+    """
+    if hasattr(storage, 'save_many'):
+        return storage.save_many(files)
+    return [storage.save(name, content) for name, content in files]
+
+
+def delete_names(storage, names):
+    if hasattr(storage, 'delete_many'):
+        storage.delete_many(names)
+        return
+    for name in names:
+        storage.delete(name)
+
+
+def _write_files(field, instances, files):
+    """
+    Записывает файлы изображений в хранилище параллельно в пуле потоков.
+    Контентно-адресуемому хранилищу (`posts.storage`) потоки только пишут и хешируют
+    содержимое (`stage`), ссылки в БД учитываются в вызывающем потоке одним пакетом (`save_staged`).
+    """
+    storage = field.storage
+    staged = hasattr(storage, 'stage')
+
+    def write(instance, file):
+        if staged:
+            return storage.stage(file)
+        name = field.generate_filename(instance, file.name)
+        setattr(instance, field.attname, storage.save(name, file, max_length=field.max_length))
+
+    with ThreadPoolExecutor(max_workers=min(get_setting('IO_THREADS'), len(files))) as executor:
+        futures = [executor.submit(write, *args) for args in zip(instances, files)]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if staged:
+        results = [future.result() for future in futures if future.exception() is None]
+        if errors:
+            for result in results:
+                storage.discard(result)
+        else:
+            names = [field.generate_filename(instance, file.name) for instance, file in zip(instances, files)]
+            for instance, name in zip(instances, storage.save_staged(list(zip(names, results)))):
+                setattr(instance, field.attname, name)
+    if errors:
+        raise errors[0]
+
+
+def ingest_images(post, files, build_variants=None):
+    """
+    Загружает изображения поста пакетом:
+    1. проверка всех файлов параллельно в пуле потоков;
+    2. запись файлов в хранилище (тоже параллельно) и построение вариантов;
+    3. вставка всех строк `PostImage` одним `bulk_create` в транзакции.
+
+    При любой ошибке уже записанные файлы удаляются, строки не создаются.
+    Количество запросов не зависит от числа изображений: хранилище `posts.storage`
+    учитывает ссылки на все файлы пакета вместе (`retain` — несколько запросов на пакет).
+    """
+    build_variants = variants_on_upload() if build_variants is None else build_variants
+    files = validate_images(files)
+    if not files:
+        return []
+
+    field = PostImage._meta.get_field('image')
+    instances = [PostImage(post=post) for file in files]
+
+    try:
+        _write_files(field, instances, files)
+        if build_variants:
+            generate_variants(instances)
+        with transaction.atomic():
+            created = PostImage.objects.bulk_create(instances)
+    except Exception:
+        delete_files([instance for instance in instances if instance.image])
+        raise
+    invalidate_post(post.pk)
+    return created
@@ -0,0 +1,149 @@
+"""
+Атомарные операции с лайками.
+
+`toggle_like` на PostgreSQL выполняется одним SQL-запросом: удаление лайка
+(DELETE ... RETURNING), вставка при его отсутствии (INSERT ... ON CONFLICT DO NOTHING)
+и обновление `Post.likes_count` объединены в CTE. Параллельные переключения
+одного пользователя сериализуются блокировкой строки лайка и не приводят к IntegrityError.
+На других СУБД используется эквивалентная последовательность запросов в транзакции.
+Удалённые посты (`Post.deleted_at`) считаются несуществующими.
+
+`apply_likes` меняет счётчики только для постов, лайки которых действительно удалены
+или вставлены (`DELETE ... RETURNING post_id`, `INSERT ... ON CONFLICT DO NOTHING
+RETURNING post_id`), поэтому параллельные пачки и `toggle_like` не сдвигают счётчики.
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import Like, Post
+
+LikeResult = namedtuple('LikeResult', ['post_id', 'liked', 'likes_count'])
+
+UNLIKE_SQL = """
+DELETE FROM {like} WHERE author_id = %s AND post_id IN ({placeholders})
+RETURNING post_id
+"""
+
+LIKE_SQL = """
+INSERT INTO {like} (author_id, post_id) VALUES {values}
+ON CONFLICT (author_id, post_id) DO NOTHING
+RETURNING post_id
+"""
+
+TOGGLE_SQL = """
+WITH target AS (
+    SELECT id FROM {post} WHERE id = %(post_id)s AND deleted_at IS NULL
+), deleted AS (
+    DELETE FROM {like}
+    WHERE author_id = %(author_id)s AND post_id IN (SELECT id FROM target)
+    RETURNING 1
+), inserted AS (
+    INSERT INTO {like} (author_id, post_id)
+    SELECT %(author_id)s, id FROM target
+    WHERE NOT EXISTS (SELECT 1 FROM deleted)
+    ON CONFLICT ON CONSTRAINT unique_like DO NOTHING
+    RETURNING 1
+), counter AS (
+    UPDATE {post}
+    SET likes_count = likes_count + (SELECT count(*) FROM inserted) - (SELECT count(*) FROM deleted)
+    WHERE id IN (SELECT id FROM target)
+    RETURNING likes_count
+)
+SELECT (SELECT count(*) FROM deleted), likes_count FROM counter
+"""
+
+
+def toggle_like(author_id, post_id):
+    """
+    Ставит лайк, если его нет, иначе убирает; обновляет счётчик поста.
+    Возвращает `LikeResult` или бросает `Post.DoesNotExist`.
+    """
+    if connection.vendor == 'postgresql':
+        sql = TOGGLE_SQL.format(post=Post._meta.db_table, like=Like._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'author_id': author_id, 'post_id': post_id})
+            row = cursor.fetchone()
+        if row is None:
+            raise Post.DoesNotExist
+        deleted, likes_count = row
+        return LikeResult(post_id, not deleted, likes_count)
+
+    with transaction.atomic():
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Post.DoesNotExist
+        liked, delta = False, -1
+        if not Like.objects.filter(author_id=author_id, post_id=post_id).delete()[0]:
+            liked, delta = True, 1
+            try:
+                with transaction.atomic():
+                    Like.objects.create(author_id=author_id, post_id=post_id)
+            except IntegrityError:
+                delta = 0
+        Post.objects.filter(pk=post_id).update(likes_count=F('likes_count') + delta)
+        likes_count = Post.objects.values_list('likes_count', flat=True).get(pk=post_id)
+    return LikeResult(post_id, liked, likes_count)
+
+
+def _unlike_many(author_id, post_ids):
+    """
+    Удаляет лайки пользователя к `post_ids`. Возвращает id постов, лайки которых удалены.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        sql = UNLIKE_SQL.format(like=Like._meta.db_table, placeholders=', '.join(['%s'] * len(post_ids)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [author_id, *post_ids])
+            return [post_id for post_id, in cursor.fetchall()]
+    return [
+        post_id for post_id in post_ids
+        if Like.objects.filter(author_id=author_id, post_id=post_id).delete()[0]
+    ]
+
+
+def _like_many(author_id, post_ids):
+    """
+    Ставит лайки пользователя к `post_ids`. Возвращает id постов, лайки которых вставлены.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        sql = LIKE_SQL.format(like=Like._meta.db_table, values=', '.join(['(%s, %s)'] * len(post_ids)))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for post_id in post_ids for value in (author_id, post_id)])
+            return [post_id for post_id, in cursor.fetchall()]
+    inserted = []
+    for post_id in post_ids:
+        try:
+            with transaction.atomic():
+                Like.objects.create(author_id=author_id, post_id=post_id)
+        except IntegrityError:
+            continue
+        inserted.append(post_id)
+    return inserted
+
+
+def apply_likes(author_id, actions):
+    """
+    Применяет пачку операций `[(post_id, liked), ...]` одного пользователя.
+    Операции идемпотентны (поставить/убрать, а не переключить); при повторе
+    поста учитывается последняя. Несуществующие посты пропускаются.
+    Выполняется фиксированным числом запросов в одной транзакции; счётчики
+    меняются только для постов, лайки которых действительно удалены или вставлены.
+    Возвращает список `LikeResult` для существующих постов.
+    """
+    final = dict(actions)
+    with transaction.atomic():
+        existing = sorted(Post.objects.filter(pk__in=final).values_list('pk', flat=True))
+        if not existing:
+            return []
+        to_like = [post_id for post_id in existing if final[post_id]]
+        to_unlike = [post_id for post_id in existing if not final[post_id]]
+        if to_unlike:
+            unliked = _unlike_many(author_id, to_unlike)
+            if unliked:
+                Post.objects.filter(pk__in=unliked).update(likes_count=F('likes_count') - 1)
+        if to_like:
+            liked = _like_many(author_id, to_like)
+            if liked:
+                Post.objects.filter(pk__in=liked).update(likes_count=F('likes_count') + 1)
+        counts = dict(Post.objects.filter(pk__in=existing).values_list('pk', 'likes_count'))
+    return [LikeResult(post_id, final[post_id], counts[post_id]) for post_id in final if post_id in counts]
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.cache import invalidate_posts
+from posts.geocoding import build_geocoder, get_setting
+from posts.geocoding_queue import RateLimitedBackend, RateLimiter
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Заполняет `Post.address` для существующих постов с координатами.
+
+    Посты обрабатываются пачками по возрастанию `id`, адрес определяется
+    обратным геокодированием (через кеш), каждая пачка сохраняется одним `bulk_update`.
+    Запросы к геокодеру ограничены по частоте так же, как у воркера геокодирования
+    (`GEOCODING['RATE_LIMIT']`); попадания в кеш квоту не расходуют.
+    """
+    help = 'Заполняет полный адрес у постов с координатами, но без адреса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Размер пачки постов')
+        parser.add_argument('--limit', type=int, default=None, help='Обработать не более N постов')
+        parser.add_argument('--sleep', type=float, default=0, help='Пауза между пачками, секунды')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Запросов к геокодеру в секунду (по умолчанию GEOCODING["RATE_LIMIT"])')
+
+    def handle(self, *args, batch_size, limit, sleep, rate, **options):
+        geocoder = build_geocoder()
+        rate = get_setting('RATE_LIMIT') if rate is None else rate
+        geocoder.backend = RateLimitedBackend(geocoder.backend, RateLimiter(rate))
+        queryset = (
+            Post.objects
+            .filter(latitude__isnull=False, longitude__isnull=False, address__isnull=True)
+            .only('id', 'latitude', 'longitude', 'address')
+            .order_by('id')
+        )
+        last_id = 0
+        processed = updated = 0
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            batch = list(queryset.filter(id__gt=last_id)[:size])
+            if not batch:
+                break
+            changed = []
+            for post in batch:
+                post.address = geocoder.reverse(post.latitude, post.longitude)
+                if post.address:
+                    changed.append(post)
+            Post.objects.bulk_update(changed, ['address'])
+            invalidate_posts(post.pk for post in changed)
+            processed += len(batch)
+            updated += len(changed)
+            last_id = batch[-1].id
+            self.stdout.write(f'Обработано постов: {processed}, адрес заполнен: {updated}')
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(f'Готово. Обработано постов: {processed}, адрес заполнен: {updated}'))
@@ -0,0 +1,186 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.routers import SimpleRouter
+
+from posts.async_views import async_urlpatterns
+from posts.management.commands.generate_dataset import USERNAME_PREFIX
+from posts.models import Comment, Post
+from posts.views import PostViewSet
+
+ENDPOINTS = {
+    'list': ('GET', 'posts/', b''),
+    'detail': ('GET', 'posts/{post}/', b''),
+    'like': ('POST', 'posts/{post}/like/', b''),
+    'comment': ('POST', 'posts/{post}/comment/', b'{"text": "benchmark"}'),
+}
+
+
+class BenchmarkURLConf:
+    """
+    Синхронные (`PostViewSet`) и асинхронные представления в одном URLconf: `/sync/…` и `/async/…`.
+    """
+    router = SimpleRouter()
+    router.register('posts', PostViewSet, basename='post')
+    urlpatterns = [
+        path('sync/', include(router.urls)),
+        path('async/', include(async_urlpatterns)),
+    ]
+
+
+class SlowQueries:
+    """
+    Добавляет `latency` секунд к каждому SQL-запросу (блокирующее ожидание, как у сетевой БД).
+    """
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает синхронные представления `PostViewSet` и асинхронные (`posts.async_views`)
+    под ASGI: запросы подаются в `get_asgi_application()` из одного цикла событий
+    с заданной параллельностью, к каждому SQL-запросу добавляется задержка `--latency`,
+    имитирующая сетевую БД. Выводятся пропускная способность и p50/p95 времени ответа.
+
+    Нужен набор данных `generate_dataset`. Кеш ответов по умолчанию отключается (`--cache` —
+    оставить). Лайки переключаются чётное число раз, созданные комментарии удаляются.
+    На SQLite параллельные записи упираются в блокировку файла БД — для `like`/`comment`
+    используйте PostgreSQL.
+    """
+    help = 'Сравнивает синхронные и асинхронные представления постов под ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS), help='Эндпоинт (можно несколько)')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на эндпоинт и режим')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременных запросов')
+        parser.add_argument('--latency', type=float, default=10, help='Задержка каждого SQL-запроса, мс')
+        parser.add_argument('--cache', action='store_true', help='Не отключать кеш ответов')
+
+    def handle(self, *args, endpoint, requests, concurrency, latency, cache, **options):
+        endpoints = endpoint or ['list', 'detail']
+        requests += requests % 2
+        try:
+            token = Token.objects.get(user__username=f'{USERNAME_PREFIX}0')
+        except Token.DoesNotExist:
+            raise CommandError('Набор данных не найден, выполните generate_dataset')
+        post = Post.objects.filter(author_id=token.user_id).order_by('-id').first()
+        last_comment_id = Comment.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        overrides = {'ROOT_URLCONF': BenchmarkURLConf, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'localhost']}
+        if not cache:
+            overrides['CACHES'] = {
+                **settings.CACHES,
+                'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            }
+            overrides['POSTS_CACHE'] = {**getattr(settings, 'POSTS_CACHE', {}), 'ALIAS': 'benchmark'}
+
+        slow = SlowQueries(latency / 1000)
+        connection_created.connect(slow.install)
+        try:
+            with override_settings(**overrides):
+                application = get_asgi_application()
+                for name in endpoints:
+                    method, url, body = ENDPOINTS[name]
+                    url = url.format(post=post.pk)
+                    results = {}
+                    for mode in ('sync', 'async'):
+                        results[mode] = asyncio.run(self.load(
+                            application, method, f'/{mode}/{url}', body, token.key, requests, concurrency
+                        ))
+                        self.stdout.write(self.format_row(name, mode, results[mode]))
+                    speedup = results['async']['rps'] / results['sync']['rps']
+                    self.stdout.write(self.style.SUCCESS(f'{name}: async/sync = {speedup:.2f}x'))
+        finally:
+            connection_created.disconnect(slow.install)
+            if slow in connection.execute_wrappers:
+                connection.execute_wrappers.remove(slow)
+            created = Comment.objects.filter(id__gt=last_comment_id, post=post)
+            count = created.count()
+            if count:
+                created.delete()
+                Post.objects.filter(pk=post.pk).update(comments_count=F('comments_count') - count)
+
+    async def load(self, application, method, path, body, token, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        timings, errors = [], 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                status_code = await self.call(application, method, path, body, token)
+                timings.append(time.perf_counter() - started)
+                errors += status_code >= 400
+
+        await one()  # прогрев
+        timings, errors = [], 0
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        return {
+            'rps': total / elapsed,
+            'p50': statistics.median(timings),
+            'p95': statistics.quantiles(timings, n=20)[18],
+            'errors': errors,
+        }
+
+    async def call(self, application, method, path, body, token):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'authorization', f'Token {token}'.encode()),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status_code = None
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Future()  # ответ отправлен раньше, чем клиент «отключится»
+
+        async def send(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+
+        await application(scope, receive, send)
+        return status_code
+
+    def format_row(self, name, mode, result):
+        return (
+            f'{name:<8} {mode:<5} {result["rps"]:8.1f} запр/с  p50 {result["p50"] * 1000:8.1f} мс  '
+            f'p95 {result["p95"] * 1000:8.1f} мс  ошибок {result["errors"]}'
+        )
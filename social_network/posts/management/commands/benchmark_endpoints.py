@@ -0,0 +1,302 @@
+import json
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import Resolver404, resolve
+from django.utils.encoding import iri_to_uri
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAdminUser
+
+from posts.management.commands.generate_dataset import USERNAME_PREFIX, jpeg
+from posts.models import Post
+from users.models import Follow
+
+VARIABLE_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+POST_ID_RE = re.compile(r'(/posts/|"post":\s*)(\d+)')
+USER_ID_RE = re.compile(r'(/users/)(\d+)')
+STAFF_USERNAME = f'{USERNAME_PREFIX}staff'
+
+
+def parse_http_file(path):
+    """
+    Разбирает файл формата REST Client / JetBrains HTTP Client.
+    Возвращает список словарей `name`, `method`, `url`, `headers`, `body` (bytes или None).
+    Строки тела вида `< ./file` заменяются содержимым файла относительно `path`;
+    если файла нет, подставляется сгенерированный JPEG.
+    """
+    path = Path(path)
+    variables, requests = {}, []
+    rng = random.Random(0)
+    for block in re.split(r'^###.*$', path.read_text(encoding='utf-8'), flags=re.MULTILINE):
+        lines = block.splitlines()
+        request_line = None
+        while lines:
+            line = lines.pop(0).strip()
+            if line.startswith('@') and '=' in line:
+                name, value = line[1:].split('=', 1)
+                variables[name.strip()] = value.strip()
+            elif line and not line.startswith('#'):
+                request_line = line
+                break
+        if request_line is None:
+            continue
+        method, url = request_line.split()[:2]
+        headers = {}
+        while lines and lines[0].strip():
+            name, value = lines.pop(0).split(':', 1)
+            headers[name.strip()] = value.strip()
+        while lines and not lines[-1].strip():
+            lines.pop()
+        body = None
+        if lines:
+            parts = []
+            for line in lines[1:]:
+                if line.startswith('< '):
+                    included = path.parent / line[2:].strip()
+                    parts.append(included.read_bytes() if included.exists() else jpeg(rng))
+                else:
+                    parts.append(line.encode())
+            body = b'\r\n'.join(parts)
+        url = VARIABLE_RE.sub(lambda match: variables.get(match[1], match[0]), url)
+        split = urlsplit(url)
+        path_and_query = split.path + (f'?{split.query}' if split.query else '')
+        requests.append({
+            'name': f'{len(requests) + 1:02d} {method} {path_and_query}',
+            'method': method,
+            'url': path_and_query,
+            'headers': headers,
+            'body': body,
+        })
+    return requests
+
+
+def requires_staff(url):
+    """
+    Требует ли представление по `url` прав администратора (`IsAdminUser`).
+    """
+    try:
+        match = resolve(urlsplit(url).path)
+    except Resolver404:
+        return False
+    view_class = getattr(match.func, 'cls', None)
+    return any(issubclass(permission, IsAdminUser) for permission in getattr(view_class, 'permission_classes', []))
+
+
+def percentile(values, percent):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class Command(BaseCommand):
+    """
+    Замер всех эндпоинтов из `requests-examples.http` через тестовый клиент Django
+    на наборе данных `generate_dataset`.
+
+    Идентификаторы постов и пользователей из примеров заменяются объектами набора
+    (посты — принадлежащие `bench_user_0`, чтобы изменение и удаление были разрешены),
+    токен — токеном `bench_user_0`, а для эндпоинтов с `IsAdminUser` (выгрузка) — токеном
+    администратора `bench_user_staff` (создаётся при первом запуске, удаляется вместе
+    с набором `generate_dataset --clear`). Каждый запрос выполняется в транзакции,
+    которая откатывается, поэтому набор данных не меняется; файлы пишутся во временный `MEDIA_ROOT`. Колбэки `transaction.on_commit`, зарегистрированные
+    запросом (рассылка в ленты, поисковый индекс, освобождение файлов), выполняются
+    внутри той же транзакции перед откатом и замеряются отдельно (`commit_p50_ms`);
+    их SQL-запросы входят в общее число.
+    По умолчанию кеши Django очищаются перед каждым запросом (`--warm` — не очищать).
+
+    Для каждого эндпоинта выводятся p50/p95 времени ответа, p50 времени колбэков on_commit,
+    число SQL-запросов и пиковое потребление памяти (tracemalloc, отдельным прогоном). С `--baseline`
+    результаты сравниваются с сохранённым файлом: команда завершается ошибкой,
+    если выросло число запросов, изменился код ответа или время/память превысили
+    базовые значения больше чем на `--tolerance`.
+    """
+    help = 'Замеряет эндпоинты из requests-examples.http и сравнивает с базовой линией'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=str(Path(settings.BASE_DIR) / 'requests-examples.http'), help='Файл с примерами запросов'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Замеров времени на эндпоинт')
+        parser.add_argument('--warm', action='store_true', help='Не очищать кеши между запросами')
+        parser.add_argument('--match', help='Замерять только эндпоинты, имя которых содержит строку')
+        parser.add_argument('--baseline', help='JSON с базовой линией для сравнения')
+        parser.add_argument('--save-baseline', help='Сохранить результаты в JSON')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимый рост времени и памяти (доля)')
+        parser.add_argument(
+            '--min-delta-ms', type=float, default=1.0, help='Рост времени меньше этого значения не считается регрессией'
+        )
+
+    def handle(self, *args, file, repeat, warm, match, baseline, save_baseline, tolerance, min_delta_ms, **options):
+        requests = [self.rewrite(request) for request in parse_http_file(file) if not match or match in request['name']]
+        if not requests:
+            raise CommandError('Нет запросов для замера')
+        self.warm = warm
+        client = Client(SERVER_NAME='localhost')
+
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost']
+        ):
+            for request in requests:
+                results[request['name']] = self.measure(client, request, repeat)
+                self.stdout.write(self.format_row(request['name'], results[request['name']]))
+
+        if save_baseline:
+            Path(save_baseline).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(f'Базовая линия сохранена в {save_baseline}')
+
+        failures = [f'{name}: код ответа {result["status"]}' for name, result in results.items() if result['status'] >= 500]
+        if baseline:
+            expected = json.loads(Path(baseline).read_text(encoding='utf-8'))
+            failures += self.compare(results, expected, tolerance, min_delta_ms)
+        if failures:
+            raise CommandError('Регрессии:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет' if baseline else 'Готово'))
+
+    def rewrite(self, request):
+        """
+        Подставляет в запрос объекты набора данных.
+        """
+        if not hasattr(self, 'dataset'):
+            self.dataset = self.load_dataset()
+        post_ids, user_id, token, staff_token = self.dataset
+
+        def post_id(match):
+            original = int(match[2])
+            if original not in self.post_map:
+                if len(self.post_map) == len(post_ids):
+                    raise CommandError(f'У {USERNAME_PREFIX}0 недостаточно постов')
+                self.post_map[original] = post_ids[len(self.post_map)]
+            return f'{match[1]}{self.post_map[original]}'
+
+        url = USER_ID_RE.sub(lambda match: f'{match[1]}{user_id}', POST_ID_RE.sub(post_id, request['url']))
+        body = request['body']
+        if body is not None and 'json' in request['headers'].get('Content-Type', ''):
+            body = POST_ID_RE.sub(post_id, body.decode()).encode()
+        headers = dict(request['headers'])
+        if 'Authorization' in headers:
+            headers['Authorization'] = f'Token {staff_token if requires_staff(url) else token}'
+        return {**request, 'url': iri_to_uri(url), 'headers': headers, 'body': body}
+
+    def load_dataset(self):
+        """
+        Посты `bench_user_0` (новые первыми), пользователь, на которого он не подписан,
+        токен `bench_user_0` и токен администратора `bench_user_staff`.
+        """
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=f'{USERNAME_PREFIX}0')
+        except User.DoesNotExist:
+            raise CommandError('Набор данных не найден, выполните generate_dataset')
+        post_ids = list(Post.objects.filter(author=user).order_by('-created_at', '-id').values_list('id', flat=True))
+        following = Follow.objects.filter(follower=user).values('following_id')
+        other = (
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .exclude(pk=user.pk).exclude(pk__in=following).exclude(is_staff=True)
+            .order_by('id').first()
+        )
+        if other is None:
+            raise CommandError(f'{USERNAME_PREFIX}0 подписан на всех пользователей набора')
+        self.post_map = {}
+        staff, _ = User.objects.get_or_create(username=STAFF_USERNAME, defaults={'is_staff': True})
+        staff_token, _ = Token.objects.get_or_create(user=staff)
+        return post_ids, other.pk, Token.objects.get(user=user).key, staff_token.key
+
+    def run_on_commit(self):
+        """
+        Выполняет колбэки `transaction.on_commit` текущей транзакции, включая
+        зарегистрированные самими колбэками (как `TestCase.captureOnCommitCallbacks(execute=True)`).
+        """
+        while connection.run_on_commit:
+            callbacks = list(connection.run_on_commit)
+            connection.run_on_commit.clear()
+            for _, callback, _ in callbacks:
+                callback()
+
+    def call(self, client, request):
+        """
+        Выполняет запрос и его колбэки on_commit в откатываемой транзакции.
+        Возвращает (ответ, время запроса, время колбэков в секундах).
+        """
+        if not self.warm:
+            for cache in caches.all():
+                cache.clear()
+        headers = {name: value for name, value in request['headers'].items() if name.lower() != 'content-type'}
+        kwargs = {'headers': headers}
+        if request['body'] is not None:
+            kwargs.update(data=request['body'], content_type=request['headers'].get('Content-Type'))
+        with transaction.atomic():
+            started = time.perf_counter()
+            response = client.generic(request['method'], request['url'], **kwargs)
+            if response.streaming:
+                # потоковый ответ (выгрузка) формируется при чтении
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            started = time.perf_counter()
+            self.run_on_commit()
+            deferred = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response, elapsed, deferred
+
+    def measure(self, client, request, repeat):
+        self.call(client, request)  # прогрев
+        # CaptureQueriesContext не подходит: тестовый клиент очищает connection.queries в начале запроса
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response, *_ = self.call(client, request)
+        calls = [self.call(client, request)[1:] for _ in range(repeat)]
+        timings = [elapsed for elapsed, deferred in calls]
+        tracemalloc.start()
+        try:
+            self.call(client, request)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'commit_p50_ms': round(statistics.median(deferred for elapsed, deferred in calls) * 1000, 3),
+            'queries': len(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def format_row(self, name, result):
+        return (
+            f'{name[:60]:<60} {result["status"]:>3}  p50 {result["p50_ms"]:8.2f} мс  '
+            f'p95 {result["p95_ms"]:8.2f} мс  on_commit {result["commit_p50_ms"]:8.2f} мс  запросов {result["queries"]:>3}  память {result["peak_kb"]:9.1f} КБ'
+        )
+
+    def compare(self, results, expected, tolerance, min_delta_ms):
+        failures = []
+        for name, result in results.items():
+            if name not in expected:
+                continue
+            base = expected[name]
+            if result['status'] != base['status']:
+                failures.append(f'{name}: код ответа {base["status"]} → {result["status"]}')
+            if result['queries'] > base['queries']:
+                failures.append(f'{name}: запросов {base["queries"]} → {result["queries"]}')
+            for key in ('p50_ms', 'p95_ms', 'commit_p50_ms'):
+                if key in base and result[key] > base[key] * (1 + tolerance) and result[key] - base[key] >= min_delta_ms:
+                    failures.append(f'{name}: {key} {base[key]} → {result[key]}')
+            if result['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+                failures.append(f'{name}: память {base["peak_kb"]} КБ → {result["peak_kb"]} КБ')
+        return failures
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from posts.fast_serializers import FastPostSerializer
+from posts.fieldsets import ALL_FIELDS, post_queryset
+from posts.models import Comment, Post
+from posts.serializers import PostSerializer
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает сериализацию страницы постов через `PostSerializer(many=True)`
+    и через `FastPostSerializer`: проверяет, что JSON совпадает байт в байт,
+    и выводит время (загрузка из БД + сериализация + рендеринг) и число запросов.
+
+    Если постов в БД меньше `--posts`, недостающие создаются во временной
+    транзакции, которая откатывается после замеров.
+    """
+    help = 'Сравнивает скорость PostSerializer и FastPostSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100, help='Постов на странице')
+        parser.add_argument('--comments', type=int, default=5, help='Комментариев у создаваемых постов')
+        parser.add_argument('--repeat', type=int, default=20, help='Количество замеров')
+
+    def handle(self, *args, posts, comments, repeat, **options):
+        with transaction.atomic():
+            self.ensure_posts(posts, comments)
+            context = {'request': Request(APIRequestFactory().get('/api/posts/', SERVER_NAME='localhost'))}
+            context['field_selection'] = ALL_FIELDS
+            ordering = ('-created_at', '-id')
+
+            def drf():
+                queryset = post_queryset(Post.objects.order_by(*ordering), ALL_FIELDS)[:posts]
+                return JSONRenderer().render(PostSerializer(queryset, many=True, context=context).data)
+
+            def fast():
+                serializer = FastPostSerializer(context)
+                rows = Post.objects.order_by(*ordering).values(*serializer.columns())[:posts]
+                return JSONRenderer().render(serializer.serialize(rows))
+
+            if drf() != fast():
+                raise CommandError('Ответы PostSerializer и FastPostSerializer различаются')
+
+            results = {name: self.measure(func, repeat) for name, func in (('PostSerializer', drf), ('FastPostSerializer', fast))}
+            transaction.set_rollback(True)
+
+        for name, (timings, queries) in results.items():
+            self.stdout.write(
+                f'{name:<20} медиана {statistics.median(timings) * 1000:8.2f} мс, '
+                f'минимум {min(timings) * 1000:8.2f} мс, запросов {queries}'
+            )
+        speedup = statistics.median(results['PostSerializer'][0]) / statistics.median(results['FastPostSerializer'][0])
+        self.stdout.write(self.style.SUCCESS(f'Ответы совпадают. Ускорение: {speedup:.2f}x'))
+
+    def ensure_posts(self, count, comments):
+        missing = count - Post.objects.count()
+        if missing <= 0:
+            return
+        author, _ = get_user_model().objects.get_or_create(username='benchmark')
+        created = Post.objects.bulk_create(
+            [Post(author=author, text=f'Пост для замера {i}', location='Москва') for i in range(missing)]
+        )
+        Comment.objects.bulk_create([
+            Comment(author=author, post=post, text=f'Комментарий {i}') for post in created for i in range(comments)
+        ])
+
+    def measure(self, func, repeat):
+        with CaptureQueriesContext(connection) as context:
+            func()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return timings, len(context.captured_queries)
@@ -0,0 +1,27 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Сборка мусора контентно-адресуемого хранилища (см. `posts.storage`): файлы,
+    оставшиеся без ссылок после отката транзакций, и временные файлы прерванных записей.
+    Можно запускать по расписанию параллельно с работой приложения.
+    """
+    help = 'Удаляет файлы хранилища, на которые нет ссылок, и старые временные файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--storage', default='default', help='Алиас хранилища из STORAGES')
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Не трогать файлы, изменённые за последние столько секунд')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк StoredFile в одной транзакции')
+
+    def handle(self, *args, storage, grace, batch_size, **options):
+        backend = storages[storage]
+        if not hasattr(backend, 'collect_garbage'):
+            raise CommandError(f'Хранилище {storage} не считает ссылки на файлы')
+        totals = backend.collect_garbage(grace=grace, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Файлов без строки: {totals["adopted"]}, удалено файлов: {totals["deleted"]}, '
+            f'временных файлов: {totals["temporary"]}'
+        ))
@@ -0,0 +1,64 @@
+import argparse
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from posts.export import DEFAULT_CHUNK_SIZE, EXPORT_TYPES, export_stream, export_until
+
+
+def parse_time(value):
+    """
+    Дата или дата и время в ISO 8601; без часового пояса — в текущем поясе.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise argparse.ArgumentTypeError(f'неверная дата: {value}')
+        parsed = datetime.combine(date, time.min)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    """
+    Выгружает посты, комментарии и лайки в NDJSON (см. `posts.export`) в файл или stdout.
+    Память не зависит от объёма выгрузки. Для инкрементальной выгрузки передайте
+    в `--since` значение «до», выведенное предыдущим запуском.
+    """
+    help = 'Потоковая выгрузка постов, комментариев и лайков в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', default='-', help='Файл для записи, «-» — stdout')
+        parser.add_argument('--type', action='append', choices=list(EXPORT_TYPES), help='Тип записей (можно несколько)')
+        parser.add_argument('--author', action='append', type=int, help='id автора (можно несколько)')
+        parser.add_argument('--since', type=parse_time, help='Записи, созданные не раньше (ISO 8601)')
+        parser.add_argument('--until', type=parse_time, help='Записи, созданные раньше (ISO 8601), не позже чем сейчас минус EXPORT[\'SAFETY_MARGIN\']')
+        parser.add_argument('--gzip', action='store_true', help='Сжать выгрузку gzip')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Строк на одно чтение из БД')
+
+    def handle(self, *args, output, type, author, since, until, gzip, chunk_size, **options):
+        if since is not None and until is not None and since >= until:
+            raise CommandError('--since должно быть раньше --until')
+        until = export_until(until)
+        chunks = export_stream(
+            gzip=gzip,
+            types=set(type or EXPORT_TYPES),
+            authors=author,
+            since=since,
+            until=until,
+            chunk_size=chunk_size,
+        )
+        written = 0
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+        # stdout может быть занят выгрузкой, поэтому итог — в stderr
+        self.stderr.write(f'Записано байт: {written}. Выгрузка до {until.isoformat()}', style_func=self.style.SUCCESS)
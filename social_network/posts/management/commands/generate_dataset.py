@@ -0,0 +1,185 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from posts.images import ingest_images
+from posts.models import Comment, Like, Post, TimelineEntry
+from posts.search import get_engine
+from posts.timeline import get_setting as get_feed_setting
+from users.models import Follow
+
+USERNAME_PREFIX = 'bench_user_'
+WORDS = (
+    'море закат горы озеро город улица кофе утро вечер лес река мост парк '
+    'музей концерт друзья отпуск поезд небо снег солнце дождь'
+).split()
+# Центры, вокруг которых разбрасываются координаты постов
+CITIES = [(55.7558, 37.6173), (59.9343, 30.3351), (56.8389, 60.6057), (43.5855, 39.7231)]
+
+
+def skewed(rng, alpha, limit):
+    """
+    Целое из распределения Парето (много малых значений, редкие большие), не больше `limit`.
+    """
+    return min(int(rng.paretovariate(alpha)) - 1, limit)
+
+
+def jpeg(rng, size=(320, 240)):
+    buffer = BytesIO()
+    color = tuple(rng.randrange(256) for _ in range(3))
+    Image.new('RGB', size, color).save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    """
+    Создаёт воспроизводимый синтетический набор данных для замеров производительности.
+
+    При одинаковом `--seed` получаются одинаковые пользователи, посты, подписки,
+    комментарии и лайки (включая даты публикации). Число комментариев и лайков
+    у поста и подписчиков у пользователя распределено по Парето: большинство постов
+    почти без реакции, несколько — очень популярны. Денормализованные счётчики,
+    ленты, геохеши и поисковые векторы заполняются согласованно.
+
+    Пользователи набора имеют имена `bench_user_<N>`; у первого из них есть токен,
+    его использует `benchmark_endpoints`.
+    """
+    help = 'Генерирует синтетический набор данных (пользователи, посты, комментарии, лайки, изображения)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Количество пользователей')
+        parser.add_argument('--posts', type=int, default=1000, help='Количество постов')
+        parser.add_argument('--images', type=int, default=20, help='Сколько постов получат по два изображения')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора случайных чисел')
+        parser.add_argument('--clear', action='store_true', help='Удалить ранее сгенерированный набор')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Строк на один INSERT')
+
+    def handle(self, *args, users, posts, images, seed, clear, batch_size, **options):
+        User = get_user_model()
+        existing = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if existing.exists():
+            if not clear:
+                raise CommandError('Набор уже создан; используйте --clear, чтобы пересоздать его')
+            existing.delete()
+            self.stdout.write('Предыдущий набор удалён')
+        if users < 2 or posts < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 пост')
+
+        rng = random.Random(seed)
+        self.batch_size = batch_size
+        with transaction.atomic():
+            user_ids = self.create_users(users)
+            post_rows = self.create_posts(rng, user_ids, posts)
+            followers = self.create_follows(rng, user_ids)
+            self.create_timelines(post_rows, followers)
+            self.create_reactions(rng, user_ids, post_rows)
+        get_engine().rebuild(Post.objects.filter(author_id__in=user_ids))
+
+        with_images = rng.sample([post_id for post_id, _, _ in post_rows], min(images, len(post_rows)))
+        for post in Post.objects.filter(pk__in=with_images).order_by('id'):
+            files = [SimpleUploadedFile(f'bench_{post.pk}_{i}.jpg', jpeg(rng), 'image/jpeg') for i in range(2)]
+            ingest_images(post, files, build_variants=False)
+
+        token = Token.objects.get(user_id=user_ids[0])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: пользователей {users}, постов {posts}, постов с изображениями {len(with_images)}. '
+            f'Токен {USERNAME_PREFIX}0: {token.key}'
+        ))
+
+    def create_users(self, count):
+        User = get_user_model()
+        User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{i}', email=f'{USERNAME_PREFIX}{i}@example.com') for i in range(count)],
+            batch_size=self.batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id').values_list('id', flat=True)
+        )
+        Token.objects.create(user_id=user_ids[0])
+        return user_ids
+
+    def create_posts(self, rng, user_ids, count):
+        """
+        Создаёт посты с фиксированными датами публикации. Автор выбирается со смещением
+        к первым пользователям, у части постов есть координаты. Возвращает `[(id, author_id, created_at)]`.
+        """
+        start = timezone.now().replace(microsecond=0) - timedelta(minutes=count)
+        posts = []
+        for i in range(count):
+            author_id = user_ids[skewed(rng, 1.2, len(user_ids) - 1)]
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+            post = Post(author_id=author_id, text=text, geocoding_status=Post.GeocodingStatus.NOT_REQUIRED)
+            if rng.random() < 0.3:
+                latitude, longitude = rng.choice(CITIES)
+                post.latitude = round(latitude + rng.uniform(-0.2, 0.2), 6)
+                post.longitude = round(longitude + rng.uniform(-0.3, 0.3), 6)
+                post.geohash = Post.geohash_of(post.latitude, post.longitude)
+            posts.append(post)
+        created = Post.objects.bulk_create(posts, batch_size=self.batch_size)
+        # auto_now_add проставляет текущее время — задаём воспроизводимые даты отдельно
+        for i, post in enumerate(created):
+            post.created_at = start + timedelta(minutes=i)
+        Post.objects.bulk_update(created, ['created_at'], batch_size=self.batch_size)
+        return [(post.pk, post.author_id, post.created_at) for post in created]
+
+    def create_follows(self, rng, user_ids):
+        """
+        Подписки: у каждого пользователя несколько подписок, популярные авторы
+        выбираются чаще. Возвращает {author_id: [follower_id, ...]}.
+        """
+        followers = {user_id: [] for user_id in user_ids}
+        follows = []
+        for follower_id in user_ids:
+            targets = {user_ids[skewed(rng, 1.1, len(user_ids) - 1)] for _ in range(rng.randint(1, 20))}
+            for author_id in sorted(targets - {follower_id}):
+                followers[author_id].append(follower_id)
+                follows.append(Follow(follower_id=follower_id, following_id=author_id))
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size)
+        User = get_user_model()
+        User.objects.bulk_update(
+            [User(pk=author_id, followers_count=len(ids)) for author_id, ids in followers.items()],
+            ['followers_count'],
+            batch_size=self.batch_size,
+        )
+        return followers
+
+    def create_timelines(self, post_rows, followers):
+        """
+        Заполняет ленты так же, как `posts.timeline.fan_out` (без рассылки постов
+        авторов с большим числом подписчиков).
+        """
+        threshold = get_feed_setting('CELEBRITY_THRESHOLD')
+        entries = []
+        for post_id, author_id, created_at in post_rows:
+            readers = [author_id]
+            if len(followers[author_id]) < threshold:
+                readers += followers[author_id]
+            entries += [TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at) for user_id in readers]
+            if len(entries) >= self.batch_size:
+                TimelineEntry.objects.bulk_create(entries)
+                entries = []
+        TimelineEntry.objects.bulk_create(entries)
+
+    def create_reactions(self, rng, user_ids, post_rows):
+        """
+        Комментарии и лайки с распределением Парето и согласованные счётчики.
+        """
+        comments, likes, counters = [], [], []
+        for post_id, _, created_at in post_rows:
+            comments_count = skewed(rng, 1.5, 200)
+            for i in range(comments_count):
+                comments.append(Comment(author_id=rng.choice(user_ids), post_id=post_id, text=f'Комментарий {i}'))
+            likers = rng.sample(user_ids, skewed(rng, 1.3, len(user_ids)))
+            likes += [Like(author_id=user_id, post_id=post_id) for user_id in likers]
+            counters.append(Post(pk=post_id, comments_count=comments_count, likes_count=len(likers)))
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+        Like.objects.bulk_create(likes, batch_size=self.batch_size)
+        Post.objects.bulk_update(counters, ['comments_count', 'likes_count'], batch_size=self.batch_size)
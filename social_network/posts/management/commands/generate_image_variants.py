@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import save_variants
+from posts.models import Post, PostImage
+
+
+class Command(BaseCommand):
+    """
+    Строит уменьшенные копии для изображений, у которых их ещё нет.
+    Изображения обрабатываются пачками в пуле процессов.
+    """
+    help = 'Строит уменьшенные копии изображений постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Размер пачки изображений')
+        parser.add_argument('--all', action='store_true', dest='rebuild', help='Перестроить варианты для всех изображений')
+
+    def handle(self, *args, batch_size, rebuild, **options):
+        for model in (Post, PostImage):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True).order_by('id')
+            if not rebuild:
+                queryset = queryset.filter(variants={})
+            last_id = 0
+            processed = 0
+            while True:
+                batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                processed += len(save_variants(batch))
+                last_id = batch[-1].id
+                self.stdout.write(f'{model._meta.verbose_name_plural}: обработано {processed}')
+            self.stdout.write(self.style.SUCCESS(f'{model._meta.verbose_name_plural}: готово, {processed}'))
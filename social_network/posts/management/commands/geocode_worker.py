@@ -0,0 +1,39 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from posts.geocoding_queue import default_worker_id, run_worker
+
+
+class Command(BaseCommand):
+    """
+    Воркер фонового геокодирования постов.
+    Можно запускать в нескольких процессах одновременно.
+    """
+    help = 'Обрабатывает очередь геокодирования постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Сколько задач забирать за раз')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Запросов к геокодеру в секунду на процесс (по умолчанию GEOCODING["RATE_LIMIT"])')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и завершиться')
+
+    def handle(self, *args, batch_size, rate, poll_interval, once, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        worker_id = default_worker_id()
+        self.stdout.write(f'Воркер геокодирования {worker_id} запущен')
+        totals = run_worker(
+            worker_id=worker_id,
+            batch_size=batch_size,
+            rate=rate,
+            poll_interval=poll_interval,
+            once=once,
+            stop=stop,
+        )
+        summary = ', '.join(f'{status}: {count}' for status, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Воркер остановлен. {summary}'))
@@ -0,0 +1,61 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from posts.geocoding_queue import default_worker_id
+from posts.models import PurgeJob
+from posts.purge import run_worker
+
+
+class Command(BaseCommand):
+    """
+    Воркер фонового удаления постов и пользователей (см. `posts.purge`).
+    Можно запускать в нескольких процессах одновременно.
+    """
+    help = 'Удаляет пачками данные удалённых постов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Строк в одной пачке (по умолчанию PURGE["BATCH_SIZE"])')
+        parser.add_argument('--pause', type=float, default=None,
+                            help='Пауза между пачками, секунды (по умолчанию PURGE["BATCH_PAUSE"])')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--once', action='store_true', help='Обработать очередь и завершиться')
+        parser.add_argument('--status', action='store_true', help='Показать незавершённые задачи и выйти')
+
+    def handle(self, *args, batch_size, pause, poll_interval, once, status, **options):
+        if status:
+            self.show_status()
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        worker_id = default_worker_id()
+        self.stdout.write(f'Воркер удаления {worker_id} запущен')
+        totals = run_worker(
+            worker_id=worker_id,
+            batch_size=batch_size,
+            pause=pause,
+            poll_interval=poll_interval,
+            once=once,
+            stop=stop,
+            on_progress=self.report if options['verbosity'] > 1 else None,
+        )
+        summary = ', '.join(f'{status}: {count}' for status, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Воркер остановлен. {summary}'))
+
+    def report(self, job, table, count):
+        self.stdout.write(f'{job.kind} {job.object_id}: {table} −{count}, всего удалено {job.deleted_rows}')
+
+    def show_status(self):
+        jobs = PurgeJob.objects.exclude(status=PurgeJob.Status.DONE).order_by('created_at')
+        for job in jobs:
+            progress = ', '.join(f'{table}: {count}' for table, count in job.progress.items()) or '—'
+            self.stdout.write(f'{job.kind} {job.object_id} [{job.status}] {job.stage or "—"}; удалено {progress}')
+            if job.last_error:
+                self.stdout.write(self.style.ERROR(f'  {job.last_error}'))
+        if not jobs:
+            self.stdout.write('Очередь пуста')
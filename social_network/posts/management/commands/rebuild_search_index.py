@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.models import Post
+from posts.search import get_engine
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает поисковые векторы всех постов.
+    Посты обрабатываются диапазонами `id`, каждый диапазон — одним UPDATE.
+    """
+    help = 'Пересчитывает поисковый индекс постов (search_vector)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер диапазона id постов')
+
+    def handle(self, *args, batch_size, **options):
+        engine = get_engine()
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            updated += engine.rebuild(Post.objects.filter(id__gte=start, id__lt=start + batch_size))
+            self.stdout.write(f'id {start}..{start + batch_size - 1}: обновлено постов: {updated}')
+        self.stdout.write(self.style.SUCCESS(f'Готово. Обновлено постов: {updated}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.counters import reconcile_counters
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Сверяет денормализованные счётчики лайков и комментариев с фактическими данными.
+    Посты обрабатываются диапазонами `id`, каждый диапазон — отдельным запросом.
+    """
+    help = 'Пересчитывает разошедшиеся счётчики likes_count и comments_count'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Размер диапазона id постов')
+
+    def handle(self, *args, chunk_size, **options):
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        fixed = 0
+        for start in range(0, max_id + 1, chunk_size):
+            chunk = Post.objects.filter(id__gte=start, id__lt=start + chunk_size)
+            count = reconcile_counters(chunk)
+            fixed += count
+            if count:
+                self.stdout.write(f'id {start}..{start + chunk_size - 1}: исправлено {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово. Исправлено постов: {fixed}'))
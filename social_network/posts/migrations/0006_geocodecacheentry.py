@@ -0,0 +1,28 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_alter_post_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Ключ')),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Широта')),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True, verbose_name='Долгота')),
+                ('created_at', models.DateTimeField(auto_now=True, verbose_name='Дата геокодирования')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действительно до')),
+            ],
+            options={
+                'verbose_name': 'Запись кеша геокодирования',
+                'verbose_name_plural': 'Кеш геокодирования',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+def clear_geocode_cache(apps, schema_editor):
+    # Записи, созданные до появления поля address, не содержат адреса
+    apps.get_model('posts', 'GeocodeCacheEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geocodecacheentry',
+            name='address',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Полный адрес'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='address',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Полный адрес'),
+        ),
+        migrations.RunPython(clear_geocode_cache, migrations.RunPython.noop),
+    ]
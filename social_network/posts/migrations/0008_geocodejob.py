@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_geocoding_status(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(latitude__isnull=False).update(geocoding_status='done')
+    Post.objects.filter(latitude__isnull=True, location__isnull=False).exclude(location='').update(geocoding_status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_post_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='geocoding_status',
+            field=models.CharField(choices=[('not_required', 'Не требуется'), ('pending', 'В очереди'), ('done', 'Выполнено'), ('failed', 'Адрес не найден')], default='not_required', max_length=16, verbose_name='Статус геокодирования'),
+        ),
+        migrations.RunPython(set_geocoding_status, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='GeocodeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Выполняется'), ('done', 'Выполнено'), ('dead', 'Отклонено')], default='pending', max_length=16, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Выполнить после')),
+                ('locked_by', models.CharField(blank=True, max_length=255, verbose_name='Воркер')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='geocode_job', to='posts.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Задача геокодирования',
+                'verbose_name_plural': 'Задачи геокодирования',
+                'indexes': [models.Index(fields=['status', 'run_after'], name='geocodejob_status_run_after')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+from posts.geo import encode
+
+
+def fill_geohash(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    queryset = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for post in queryset.iterator(2000):
+        post.geohash = encode(post.latitude, post.longitude)
+        batch.append(post)
+        if len(batch) >= 2000:
+            Post.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Post.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12, null=True, verbose_name='Геохеш'),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:45
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='like',
+            name='created_at',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), verbose_name='Дата'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:16
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+
+def prefix_forward_keys(apps, schema_editor):
+    # записи прямого геокодирования получают префикс `forward:`, чтобы не пересекаться с `reverse:`
+    GeocodeCacheEntry = apps.get_model('posts', 'GeocodeCacheEntry')
+    GeocodeCacheEntry.objects.exclude(key__startswith='reverse:').update(key=Concat(Value('forward:'), 'key'))
+
+
+def unprefix_forward_keys(apps, schema_editor):
+    GeocodeCacheEntry = apps.get_model('posts', 'GeocodeCacheEntry')
+    for entry in GeocodeCacheEntry.objects.filter(key__startswith='forward:').only('key'):
+        GeocodeCacheEntry.objects.filter(pk=entry.pk).update(key=entry.key[len('forward:'):])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_deleted_at_purgejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='geocodecacheentry',
+            name='key',
+            field=models.CharField(max_length=300, unique=True, verbose_name='Ключ'),
+        ),
+        migrations.RunPython(prefix_forward_keys, unprefix_forward_keys),
+    ]
@@ -1,11 +1,87 @@
+import copy
+
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Now
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from . import geo
+
 User = get_user_model()
 
 
-class Post(models.Model):
+class DirtyFieldsMixin:
+    """
+    Отслеживает изменённые поля экземпляра модели без повторного запроса к БД.
+
+    Исходные значения запоминаются при загрузке из БД (`from_db`), после `save()`
+    и `refresh_from_db()`. `get_dirty_fields()` возвращает имена полей,
+    значения которых отличаются от исходных.
+    """
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    @staticmethod
+    def _comparable(value):
+        if isinstance(value, FieldFile):
+            return value.name
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def _snapshot(self, fields=None):
+        deferred = self.get_deferred_fields()
+        original = getattr(self, '_original_values', {})
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname in deferred:
+                continue
+            if fields is None or field.name in fields or field.attname in fields:
+                original[field.attname] = self._comparable(getattr(self, field.attname))
+        self._original_values = original
+
+    def get_dirty_fields(self):
+        """
+        Возвращает список имён изменённых полей.
+        Для нового объекта или объекта, созданного не из БД (например, `bulk_create`), — все поля.
+        """
+        original = getattr(self, '_original_values', None)
+        deferred = self.get_deferred_fields()
+        fields = [field for field in self._meta.concrete_fields if not field.primary_key]
+        if self._state.adding or original is None:
+            return [field.name for field in fields if field.attname not in deferred]
+        return [
+            field.name for field in fields
+            if field.attname not in deferred and (
+                field.attname not in original
+                or self._comparable(getattr(self, field.attname)) != original[field.attname]
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot(fields)
+
+
+class PostManager(models.Manager):
+    """
+    Менеджер постов без удалённых (`deleted_at` не задано).
+    Связанные объекты (`comment.post`) загружаются базовым менеджером и удалённый пост находят.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class Post(DirtyFieldsMixin, models.Model):
     """
     Модель поста пользователя.
 
@@ -17,7 +93,26 @@ class Post(models.Model):
     - `location`: Адрес, указанный пользователем
     - `latitude`: Широта
     - `longitude`: Долгота
+    - `address`: Полный адрес, определённый геокодером по `location`
+    - `geohash`: Геохеш координат (поиск постов поблизости, см. `posts.geo`)
+    - `geocoding_status`: Состояние геокодирования `location`
+    - `variants`: Пути уменьшенных копий `image` по имени варианта (thumb/medium/large)
+    - `likes_count`: Количество лайков (денормализованный счётчик)
+    - `comments_count`: Количество комментариев (денормализованный счётчик)
+    - `search_vector`: Поисковый вектор текста поста и комментариев (PostgreSQL)
+    - `deleted_at`: Когда пост удалён; удалённый пост скрыт, строку и связанные
+      записи убирает фоновый воркер (см. `posts.purge`)
+
+    ## Менеджеры:
+    - `objects`: Только не удалённые посты (менеджер по умолчанию)
+    - `all_objects`: Все посты, включая удалённые
     """
+    class GeocodingStatus(models.TextChoices):
+        NOT_REQUIRED = 'not_required', _('Не требуется')
+        PENDING = 'pending', _('В очереди')
+        DONE = 'done', _('Выполнено')
+        FAILED = 'failed', _('Адрес не найден')
+
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts', verbose_name=_('Автор'))
     text = models.TextField(verbose_name=_('Текст'))
     image = models.ImageField(upload_to='posts', verbose_name=_('Изображение'), blank=True, null=True)
@@ -25,50 +120,119 @@ class Post(models.Model):
     location = models.CharField(max_length=255, verbose_name=_('Адрес'), blank=True, null=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name=_('Широта'), blank=True, null=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name=_('Долгота'), blank=True, null=True)
+    address = models.CharField(max_length=255, verbose_name=_('Полный адрес'), blank=True, null=True)
+    geohash = models.CharField(
+        max_length=geo.PRECISION, blank=True, null=True, db_index=True, editable=False, verbose_name=_('Геохеш')
+    )
+    geocoding_status = models.CharField(
+        max_length=16,
+        choices=GeocodingStatus.choices,
+        default=GeocodingStatus.NOT_REQUIRED,
+        verbose_name=_('Статус геокодирования')
+    )
+    variants = models.JSONField(default=dict, blank=True, verbose_name=_('Варианты изображения'))
+    likes_count = models.PositiveIntegerField(default=0, verbose_name=_('Количество лайков'))
+    comments_count = models.PositiveIntegerField(default=0, verbose_name=_('Количество комментариев'))
+    # Заполняется только на PostgreSQL, GIN-индекс создаётся миграцией 0014 (см. posts.search)
+    search_vector = SearchVectorField(blank=True, null=True, editable=False, verbose_name=_('Поисковый вектор'))
+    deleted_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name=_('Дата удаления'))
+
+    objects = PostManager()
+    all_objects = models.Manager()
+
+    # Счётчики меняются только атомарными UPDATE с F-выражениями
+    COUNTER_FIELDS = ('likes_count', 'comments_count')
+    # Поля, которые заполняются по location
+    GEOCODED_FIELDS = ('latitude', 'longitude', 'address', 'geohash', 'geocoding_status')
 
     class Meta:
         verbose_name = _('Пост')
         verbose_name_plural = _('Посты')
+        indexes = [
+            # Ключ курсорной пагинации ленты (см. posts.pagination.KeysetPagination)
+            models.Index(fields=['-created_at', '-id'], name='post_created_at_id_idx'),
+            # Посты автора для ленты подписчиков (см. posts.timeline.pull_timeline)
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author} - {self.created_at}'
 
+    @staticmethod
+    def geohash_of(latitude, longitude):
+        if latitude is None or longitude is None:
+            return None
+        return geo.encode(latitude, longitude)
+
     def _geocode_location(self, location):
         """
-        Выполняет геокодирование для указанного location.
-        Возвращает кортеж (latitude, longitude) или (None, None) в случае ошибки или отсутствия данных.
+        Заполняет координаты и адрес по location.
+        Если адрес уже есть в кеше геокодирования — сразу, иначе помечает пост
+        как ожидающий геокодирования; координаты затем запишет фоновый воркер
+        (`python manage.py geocode_worker`).
+        Возвращает True, если нужно поставить задачу в очередь.
         """
         if not location:
-            return None, None
-        
-        from geopy.geocoders import Nominatim
-
-        geolocator = Nominatim(user_agent='post-geocoder')
-        try:
-            location_data = geolocator.geocode(location)
-            if location_data:
-                return location_data.latitude, location_data.longitude
-            return None, None
-        except Exception as e:
-            print(f'Ошибка при геокодировании: {e}')
-            return None, None
+            self.latitude = self.longitude = self.address = None
+            self.geocoding_status = self.GeocodingStatus.NOT_REQUIRED
+            return False
+
+        from social_network.lru import MISSING
+        from .geocoding import lookup
+
+        result = lookup(location)
+        if result is MISSING:
+            self.latitude = self.longitude = self.address = None
+            self.geocoding_status = self.GeocodingStatus.PENDING
+            return True
+        self.latitude, self.longitude, self.address = result
+        self.geocoding_status = self.GeocodingStatus.DONE if result.latitude is not None else self.GeocodingStatus.FAILED
+        return False
 
     def save(self, *args, **kwargs):
         """
-        Сохраняет пост, автоматически обновляя координаты только при изменении поля location.
-        Если location пустое или None, очищает latitude и longitude.
+        Сохраняет пост, обновляя координаты только при изменении поля location.
+        Если location пустое или None, очищает latitude, longitude и address.
+        Сетевой запрос к геокодеру в save() не выполняется.
+
+        При обновлении записываются только изменённые поля (`update_fields`),
+        изменения определяются без запроса к БД (см. `DirtyFieldsMixin`).
+        Счётчики лайков и комментариев при обновлении не перезаписываются.
+        Геохеш пересчитывается вместе с координатами.
         """
-        if self.pk:
-            current = Post.objects.get(pk=self.pk)
-            # Проверяем, изменилось ли поле location или отсутствуют координаты
-            if current.location != self.location or (self.location and (self.latitude is None or self.longitude is None)):
-                self.latitude, self.longitude = self._geocode_location(self.location)
+        enqueue = False
+        if self._state.adding:
+            enqueue = self._geocode_location(self.location)
+            self.geohash = self.geohash_of(self.latitude, self.longitude)
         else:
-            # Для нового объекта выполняем геокодирование
-            self.latitude, self.longitude = self._geocode_location(self.location)
+            dirty = self.get_dirty_fields()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [name for name in dirty if name not in self.COUNTER_FIELDS]
+            else:
+                update_fields = list(update_fields)
+            # Проверяем, изменилось ли поле location или отсутствуют координаты
+            # (отложенные поля не читаются: обращение к ним — лишний запрос к БД)
+            location_changed = 'location' in dirty and 'location' in update_fields
+            coordinates_missing = (
+                not self.get_deferred_fields() & {'location', 'latitude', 'geocoding_status'}
+                and self.location and self.latitude is None
+                and self.geocoding_status != self.GeocodingStatus.PENDING
+            )
+            if location_changed or coordinates_missing:
+                enqueue = self._geocode_location(self.location)
+                update_fields += [name for name in self.GEOCODED_FIELDS if name not in update_fields]
+            if 'latitude' in update_fields or 'longitude' in update_fields:
+                self.geohash = self.geohash_of(self.latitude, self.longitude)
+                if 'geohash' not in update_fields:
+                    update_fields.append('geohash')
+            kwargs['update_fields'] = update_fields
 
         super().save(*args, **kwargs)
 
+        if enqueue:
+            GeocodeJob.enqueue(self)
+
 
 class PostImage(models.Model):
     """
@@ -77,9 +241,11 @@ class PostImage(models.Model):
     ## Поля:
     - `post`: Пост, к которому привязано изображение
     - `image`: Изображение, загружаемое пользователем
+    - `variants`: Пути уменьшенных копий изображения по имени варианта (thumb/medium/large)
     """
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images', verbose_name=_('Пост'))
     image = models.ImageField(upload_to='posts/images', verbose_name=_('Изображение'))
+    variants = models.JSONField(default=dict, blank=True, verbose_name=_('Варианты изображения'))
 
     class Meta:
         verbose_name = _('Изображение поста')
@@ -96,12 +262,15 @@ class Like(models.Model):
     ## Поля:
     - `author`: Кто поставил лайк
     - `post`: Какой пост был оценён
+    - `created_at`: Когда поставлен лайк (значение по умолчанию задаётся в БД,
+      поэтому его получают и строки, вставленные сырым SQL в `posts.likes`)
 
     ## Ограничения:
     - Один пользователь может лайкнуть один пост только один раз
     """
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='likes', verbose_name=_('Автор'))
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes', verbose_name=_('Пост'))
+    created_at = models.DateTimeField(db_default=Now(), verbose_name=_('Дата'))
 
     class Meta:
         verbose_name = _('Лайк')
@@ -135,6 +304,210 @@ class Comment(models.Model):
     class Meta:
         verbose_name = _('Комментарий')
         verbose_name_plural = _('Комментарии')
+        indexes = [
+            # Превью и курсорная пагинация комментариев поста
+            models.Index(fields=['post', '-created_at', '-id'], name='comment_post_created_at_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.author}: {self.post}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись домашней ленты пользователя (материализованная лента, см. `posts.timeline`).
+
+    ## Поля:
+    - `user`: Владелец ленты
+    - `post`: Пост в ленте
+    - `created_at`: Дата публикации поста (копия `Post.created_at` — ключ сортировки ленты)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline', verbose_name=_('Пользователь'))
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries', verbose_name=_('Пост'))
+    created_at = models.DateTimeField(verbose_name=_('Дата публикации'))
+
+    class Meta:
+        verbose_name = _('Запись ленты')
+        verbose_name_plural = _('Записи лент')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            # Чтение ленты одним запросом с курсорной пагинацией
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_post_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.post_id}'
+
+
+class GeocodeCacheEntry(models.Model):
+    """
+    Персистентный уровень кеша геокодирования.
+
+    ## Поля:
+    - `key`: `forward:<нормализованный адрес>` или `reverse:<lat>,<lon>` (см. `posts.geocoding`)
+    - `latitude`: Широта (пусто, если адрес не найден — негативный кеш)
+    - `longitude`: Долгота (пусто, если адрес не найден — негативный кеш)
+    - `address`: Полный адрес, возвращённый геокодером
+    - `created_at`: Дата и время геокодирования
+    - `expires_at`: Момент, после которого запись считается устаревшей
+    """
+    key = models.CharField(max_length=300, unique=True, verbose_name=_('Ключ'))
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name=_('Широта'), blank=True, null=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, verbose_name=_('Долгота'), blank=True, null=True)
+    address = models.CharField(max_length=255, verbose_name=_('Полный адрес'), blank=True, null=True)
+    created_at = models.DateTimeField(auto_now=True, verbose_name=_('Дата геокодирования'))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_('Действительно до'))
+
+    class Meta:
+        verbose_name = _('Запись кеша геокодирования')
+        verbose_name_plural = _('Кеш геокодирования')
+
+    def __str__(self):
+        return self.key
+
+
+class GeocodeJob(models.Model):
+    """
+    Задача фонового геокодирования поста (очередь в БД).
+
+    ## Поля:
+    - `post`: Пост, для которого нужно определить координаты
+    - `location`: Адрес на момент постановки задачи
+    - `status`: Состояние задачи
+    - `attempts`: Количество выполненных попыток
+    - `run_after`: Время, раньше которого задачу не нужно брать в работу
+    - `locked_by`: Идентификатор воркера, взявшего задачу
+    - `locked_at`: Когда задача взята в работу
+    - `last_error`: Текст последней ошибки
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('В очереди')
+        PROCESSING = 'processing', _('Выполняется')
+        DONE = 'done', _('Выполнено')
+        DEAD = 'dead', _('Отклонено')
+
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='geocode_job', verbose_name=_('Пост'))
+    location = models.CharField(max_length=255, verbose_name=_('Адрес'))
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, verbose_name=_('Статус'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Попытки'))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_('Выполнить после'))
+    locked_by = models.CharField(max_length=255, blank=True, verbose_name=_('Воркер'))
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Взята в работу'))
+    last_error = models.TextField(blank=True, verbose_name=_('Последняя ошибка'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Дата изменения'))
+
+    class Meta:
+        verbose_name = _('Задача геокодирования')
+        verbose_name_plural = _('Задачи геокодирования')
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='geocodejob_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id}: {self.location} ({self.status})'
+
+    @classmethod
+    def enqueue(cls, post):
+        """
+        Ставит (или перезапускает) задачу геокодирования для поста.
+        """
+        return cls.objects.update_or_create(
+            post=post,
+            defaults={
+                'location': post.location,
+                'status': cls.Status.PENDING,
+                'attempts': 0,
+                'run_after': timezone.now(),
+                'locked_by': '',
+                'locked_at': None,
+                'last_error': '',
+            },
+        )[0]
+
+
+class StoredFile(models.Model):
+    """
+    Файл контентно-адресуемого хранилища и число ссылок на него (см. `posts.storage`).
+
+    ## Поля:
+    - `name`: Имя файла в хранилище (`content/ab/cd/<sha256>.<расширение>`)
+    - `size`: Размер в байтах
+    - `refcount`: Сколько сохранений ссылаются на файл; при нуле файл удаляется
+    - `created_at`: Когда файл впервые сохранён
+    """
+    name = models.CharField(max_length=255, primary_key=True, verbose_name=_('Имя файла'))
+    size = models.PositiveBigIntegerField(verbose_name=_('Размер'))
+    refcount = models.PositiveIntegerField(default=1, verbose_name=_('Число ссылок'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата сохранения'))
+
+    class Meta:
+        verbose_name = _('Файл хранилища')
+        verbose_name_plural = _('Файлы хранилища')
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class PurgeJob(models.Model):
+    """
+    Задача фонового удаления поста или пользователя со всеми связанными записями
+    (очередь в БД, см. `posts.purge`).
+
+    ## Поля:
+    - `kind`: Что удаляется — пост или пользователь
+    - `object_id`: Идентификатор поста или пользователя
+    - `status`: Состояние задачи
+    - `stage`: Таблица, из которой удалялась последняя пачка
+    - `progress`: Сколько строк удалено, по таблицам
+    - `attempts`: Количество попыток
+    - `run_after`: Время, раньше которого задачу не нужно брать в работу
+    - `locked_by`: Идентификатор воркера, взявшего задачу
+    - `locked_at`: Когда воркер последний раз удалил пачку
+    - `last_error`: Текст последней ошибки
+    - `finished_at`: Когда удаление завершено
+
+    ## Ограничения:
+    - Одна задача на пост или пользователя
+    """
+    class Kind(models.TextChoices):
+        POST = 'post', _('Пост')
+        USER = 'user', _('Пользователь')
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('В очереди')
+        PROCESSING = 'processing', _('Выполняется')
+        DONE = 'done', _('Выполнено')
+        FAILED = 'failed', _('Ошибка')
+
+    kind = models.CharField(max_length=16, choices=Kind.choices, verbose_name=_('Тип'))
+    object_id = models.PositiveBigIntegerField(verbose_name=_('Идентификатор'))
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING, verbose_name=_('Статус'))
+    stage = models.CharField(max_length=32, blank=True, verbose_name=_('Этап'))
+    progress = models.JSONField(default=dict, blank=True, verbose_name=_('Удалено строк'))
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('Попытки'))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_('Выполнить после'))
+    locked_by = models.CharField(max_length=255, blank=True, verbose_name=_('Воркер'))
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Взята в работу'))
+    last_error = models.TextField(blank=True, verbose_name=_('Последняя ошибка'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата создания'))
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Дата завершения'))
+
+    class Meta:
+        verbose_name = _('Задача удаления')
+        verbose_name_plural = _('Задачи удаления')
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_purge_job'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='purgejob_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} ({self.status})'
+
+    @property
+    def deleted_rows(self):
+        return sum(self.progress.values())
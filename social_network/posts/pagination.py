@@ -0,0 +1,195 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по составному ключу `ordering`.
+
+    Вместо OFFSET страница выбирается условием
+    `(created_at, id) < (:created_at, :id)`, которое обслуживается составным индексом,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Курсор — непрозрачная строка с ключом последней (или первой) записи страницы.
+
+    ## Параметры запроса:
+    - `cursor`: Курсор из полей `next`/`previous` предыдущего ответа
+    - `page_size`: Размер страницы (не больше `max_page_size`)
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE or 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = _('Некорректный курсор.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, cursor = self.prepare(queryset, request)
+        return self.finish(list(queryset), cursor)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Асинхронный `paginate_queryset` (асинхронный ORM).
+        """
+        queryset, cursor = self.prepare(queryset, request)
+        return self.finish([row async for row in queryset], cursor)
+
+    def prepare(self, queryset, request):
+        """
+        Возвращает запрос страницы (на одну запись больше размера страницы) и разобранный курсор.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [self._field_name(item) for item in self.ordering]
+        self.descending = [item.startswith('-') for item in self.ordering]
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['reverse'])
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(cursor['values'], reverse))
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        return queryset[:self.page_size + 1], cursor
+
+    def finish(self, rows, cursor):
+        reverse = bool(cursor and cursor['reverse'])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = bool(rows) and (cursor is not None if reverse else has_more)
+        self.has_previous = bool(rows) and (has_more if reverse else cursor is not None)
+        self.rows = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return [name if desc else f'-{name}' for name, desc in zip(self.fields, self.descending)]
+
+    def keyset_filter(self, values, reverse=False):
+        """
+        Строит условие «строго после ключа» для лексикографического порядка:
+        `a < :a OR (a = :a AND b < :b) OR ...`
+        """
+        condition = Q()
+        for index, name in enumerate(self.fields):
+            lookup = 'lt' if self.descending[index] != reverse else 'gt'
+            prefix = {field: values[i] for i, field in enumerate(self.fields[:index])}
+            condition |= Q(**prefix, **{f'{name}__{lookup}': values[index]})
+        return condition
+
+    def get_key(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name in self.fields]
+        return [getattr(row, name) for name in self.fields]
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'r': int(reverse),
+            'v': [value.isoformat() if hasattr(value, 'isoformat') else value for value in self.get_key(row)],
+        }
+        cursor = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, payload['v'], strict=True)
+            ]
+            return {'reverse': bool(payload['r']), 'values': values}
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы из полей next/previous',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Размер страницы (не больше {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    @staticmethod
+    def _field_name(item):
+        return item.lstrip('-')
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Курсорная пагинация ленты `TimelineEntry` по индексу `(user, created_at, post)`.
+    """
+    ordering = ('-created_at', '-post_id')
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Постраничная выдача результатов, отсортированных по вычисляемому ключу
+    (релевантность поиска, расстояние до точки). Курсор по такому ключу неустойчив,
+    поэтому используются номера страниц.
+
+    ## Параметры запроса:
+    - `page`: Номер страницы
+    - `page_size`: Размер страницы (не больше `max_page_size`)
+    """
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,309 @@
+"""
+Удаление постов и пользователей без длинных каскадных транзакций.
+
+`Post.delete()` с `on_delete=CASCADE` собирает и удаляет все комментарии, лайки,
+изображения и записи лент поста в одной транзакции — у популярного поста это сотни
+тысяч строк, долгие блокировки и отставание реплик. Вместо этого:
+
+1. `delete_posts` / `delete_user` только помечают пост удалённым (`Post.deleted_at`;
+   пользователь деактивируется, его посты помечаются) и ставят задачу `PurgeJob`.
+   Удалённые посты сразу пропадают из выдачи: менеджер `Post.objects` их не возвращает,
+   лента их отфильтровывает.
+2. Воркер (`python manage.py purge_worker`) удаляет связанные строки пачками
+   по `PURGE['BATCH_SIZE']`, каждую пачку — отдельной короткой транзакцией, с паузой
+   `PURGE['BATCH_PAUSE']` между ними; последней удаляется сама строка поста или пользователя.
+   Файлы изображений освобождаются пачкой после фиксации (см. `posts.storage`).
+
+Пачки удаляются без сигналов и без повторного обхода каскада (`_raw_delete`): у удалённого
+поста не нужно сбрасывать кеш и пересчитывать поиск для каждой строки. При удалении
+пользователя его лайки и комментарии к чужим постам уменьшают счётчики этих постов.
+
+Скрываются сразу только посты удалённого пользователя. Его комментарии и лайки к чужим
+постам остаются видны, а `likes_count`/`comments_count` этих постов остаются завышенными,
+пока воркер не дойдёт до соответствующей пачки.
+
+Через очередь удаляют только `delete_posts`/`delete_user`: `DELETE /api/posts/{id}/` и админка.
+Прямой `User.delete()` или `Post.delete()` (shell, сторонний код, `QuerySet.delete()`) по-прежнему
+выполняет каскад в одной транзакции.
+
+Задачи забираются через `SELECT ... FOR UPDATE SKIP LOCKED`, воркеров может быть несколько.
+После каждой пачки в задаче обновляются `stage` и `progress` (число удалённых строк
+по таблицам) — по ним видно, как идёт удаление. Зависшая дольше `VISIBILITY_TIMEOUT`
+задача снова становится доступной; повторное выполнение безопасно, так как каждая пачка
+выбирает ещё не удалённые строки.
+"""
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from users.models import Follow
+
+from .cache import invalidate_post_list, invalidate_posts
+from .geocoding_queue import default_worker_id
+from .images import delete_names
+from .models import Comment, Like, Post, PostImage, PurgeJob, TimelineEntry
+from .search import update_search_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 1000,
+    'BATCH_PAUSE': 0.05,
+    'VISIBILITY_TIMEOUT': 300,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'PURGE', {}).get(name, DEFAULTS[name])
+
+
+def enqueue(kind, object_ids):
+    PurgeJob.objects.bulk_create(
+        [PurgeJob(kind=kind, object_id=object_id) for object_id in object_ids], ignore_conflicts=True
+    )
+
+
+def delete_posts(post_ids):
+    """
+    Скрывает посты и ставит их удаление в очередь. Возвращает список скрытых постов.
+    """
+    with transaction.atomic():
+        ids = list(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+        if not ids:
+            return []
+        Post.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+        enqueue(PurgeJob.Kind.POST, ids)
+    invalidate_posts(ids)
+    invalidate_post_list()
+    return ids
+
+
+def delete_user(user):
+    """
+    Деактивирует пользователя, скрывает его посты и ставит удаление в очередь.
+    Посты и сам пользователь удаляются одной задачей. Комментарии и лайки пользователя
+    к чужим постам и их счётчики остаются до обработки задачи воркером.
+    """
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        ids = list(Post.objects.filter(author=user).values_list('pk', flat=True))
+        Post.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+        enqueue(PurgeJob.Kind.USER, [user.pk])
+    invalidate_posts(ids)
+    invalidate_post_list()
+
+
+def _take(queryset, batch_size, *fields):
+    """
+    Удаляет до `batch_size` строк `queryset` одним DELETE по первичному ключу,
+    без сигналов и каскада. Возвращает кортежи `(pk, *fields)` удалённых строк.
+    """
+    model = queryset.model
+    rows = list(queryset.order_by('pk').values_list('pk', *fields)[:batch_size])
+    if rows:
+        model._base_manager.filter(pk__in=[row[0] for row in rows])._raw_delete(router.db_for_write(model))
+    return rows
+
+
+def _decrement(model, field, counts):
+    """
+    Уменьшает счётчик `field` строк `model` на `{pk: на сколько}`, группируя строки по величине.
+    """
+    groups = {}
+    for pk, count in counts.items():
+        groups.setdefault(count, []).append(pk)
+    for count, pks in groups.items():
+        model._base_manager.filter(pk__in=pks).update(**{field: Greatest(F(field) - count, 0)})
+
+
+def purge_post_batch(post_id, batch_size):
+    """
+    Удаляет следующую пачку строк, связанных с постом; когда их не осталось — сам пост.
+    Возвращает `(таблица, количество удалённых строк)` или `(None, 0)`, если поста уже нет.
+    """
+    related = [
+        ('timeline', TimelineEntry.objects.filter(post_id=post_id)),
+        ('likes', Like.objects.filter(post_id=post_id)),
+        ('comments', Comment.objects.filter(post_id=post_id)),
+    ]
+    for table, queryset in related:
+        rows = _take(queryset, batch_size)
+        if rows:
+            return table, len(rows)
+
+    rows = _take(PostImage.objects.filter(post_id=post_id), batch_size, 'image', 'variants')
+    if rows:
+        names = [name for _, image, variants in rows for name in (image, *(variants or {}).values()) if name]
+        delete_names(PostImage._meta.get_field('image').storage, names)
+        return 'images', len(rows)
+
+    post = Post.all_objects.filter(pk=post_id).first()
+    if post is None:
+        return None, 0
+    # связанных строк не осталось, каскад ничего не удаляет; сигналы освобождают файлы поста
+    post.delete()
+    return 'posts', 1
+
+
+def purge_user_batch(user_id, batch_size):
+    """
+    Удаляет следующую пачку данных пользователя: посты (по одному, как `purge_post_batch`),
+    лайки и комментарии к чужим постам с уменьшением их счётчиков, ленту, подписки;
+    последним — самого пользователя. Возвращает `(таблица, количество)` или `(None, 0)`.
+    """
+    User = get_user_model()
+    post_id = Post.all_objects.filter(author_id=user_id).order_by('pk').values_list('pk', flat=True).first()
+    if post_id is not None:
+        return purge_post_batch(post_id, batch_size)
+
+    rows = _take(Like.objects.filter(author_id=user_id), batch_size, 'post_id')
+    if rows:
+        counts = Counter(post_id for _, post_id in rows)
+        _decrement(Post, 'likes_count', counts)
+        invalidate_posts(counts)
+        return 'likes', len(rows)
+
+    rows = _take(Comment.objects.filter(author_id=user_id), batch_size, 'post_id')
+    if rows:
+        counts = Counter(post_id for _, post_id in rows)
+        _decrement(Post, 'comments_count', counts)
+        update_search_index(list(counts))
+        invalidate_posts(counts)
+        return 'comments', len(rows)
+
+    rows = _take(TimelineEntry.objects.filter(user_id=user_id), batch_size)
+    if rows:
+        return 'timeline', len(rows)
+
+    rows = _take(Follow.objects.filter(follower_id=user_id), batch_size, 'following_id')
+    if rows:
+        _decrement(User, 'followers_count', Counter(following_id for _, following_id in rows))
+        return 'follows', len(rows)
+    rows = _take(Follow.objects.filter(following_id=user_id), batch_size)
+    if rows:
+        return 'follows', len(rows)
+
+    user = User._base_manager.filter(pk=user_id).first()
+    if user is None:
+        return None, 0
+    user.delete()
+    return 'users', 1
+
+
+PURGERS = {
+    PurgeJob.Kind.POST: purge_post_batch,
+    PurgeJob.Kind.USER: purge_user_batch,
+}
+
+
+def claimable_jobs(now=None):
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=get_setting('VISIBILITY_TIMEOUT'))
+    return PurgeJob.objects.filter(
+        Q(status=PurgeJob.Status.PENDING, run_after__lte=now)
+        | Q(status=PurgeJob.Status.PROCESSING, locked_at__lt=stale)
+    )
+
+
+def claim_job(worker_id):
+    """
+    Забирает в работу одну задачу и возвращает её или `None`.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job_id = (
+            claimable_jobs(now)
+            .select_for_update(skip_locked=True)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimable_jobs(now).filter(id=job_id).update(
+            status=PurgeJob.Status.PROCESSING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return PurgeJob.objects.filter(id=job_id, locked_by=worker_id, locked_at=now).first()
+
+
+def process_job(job, batch_size=None, pause=None, stop=None, on_progress=None):
+    """
+    Удаляет данные задачи пачками, пока они не кончатся или не будет установлен `stop`.
+    После каждой пачки вызывает `on_progress(job, таблица, количество)`.
+    Возвращает итоговый статус задачи или `None`, если задачу перехватил другой воркер.
+    """
+    batch_size = batch_size or get_setting('BATCH_SIZE')
+    pause = get_setting('BATCH_PAUSE') if pause is None else pause
+    stop = stop or threading.Event()
+    purge = PURGERS[job.kind]
+    own_job = PurgeJob.objects.filter(pk=job.pk, locked_by=job.locked_by, status=PurgeJob.Status.PROCESSING)
+
+    while not stop.is_set():
+        try:
+            with transaction.atomic():
+                table, count = purge(job.object_id, batch_size)
+                now = timezone.now()
+                if table is None:
+                    fields = {'status': PurgeJob.Status.DONE, 'locked_by': '', 'locked_at': None, 'finished_at': now}
+                else:
+                    job.progress[table] = job.progress.get(table, 0) + count
+                    fields = {'stage': table, 'progress': job.progress, 'locked_at': now}
+                if not own_job.update(**fields):
+                    transaction.set_rollback(True)
+                    return None
+        except Exception as e:
+            logger.exception('Ошибка задачи удаления %s', job.pk)
+            failed = job.attempts >= get_setting('MAX_ATTEMPTS')
+            own_job.update(
+                status=PurgeJob.Status.FAILED if failed else PurgeJob.Status.PENDING,
+                run_after=timezone.now() + timedelta(seconds=get_setting('RETRY_DELAY')),
+                locked_by='',
+                locked_at=None,
+                last_error=str(e),
+            )
+            return PurgeJob.Status.FAILED if failed else PurgeJob.Status.PENDING
+        if table is None:
+            return PurgeJob.Status.DONE
+        if on_progress is not None:
+            on_progress(job, table, count)
+        stop.wait(pause)
+
+    # остановка: задача возвращается в очередь, удалённое уже не повторяется
+    own_job.update(status=PurgeJob.Status.PENDING, attempts=F('attempts') - 1, locked_by='', locked_at=None)
+    return PurgeJob.Status.PENDING
+
+
+def run_worker(worker_id=None, batch_size=None, pause=None, poll_interval=1.0, once=False, stop=None, on_progress=None):
+    """
+    Основной цикл воркера. С `once=True` завершается, когда очередь пуста.
+    Возвращает словарь с количеством задач по итоговым статусам.
+    """
+    worker_id = worker_id or default_worker_id()
+    stop = stop or threading.Event()
+    totals = dict.fromkeys(PurgeJob.Status.values, 0)
+
+    while not stop.is_set():
+        job = claim_job(worker_id)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        status = process_job(job, batch_size=batch_size, pause=pause, stop=stop, on_progress=on_progress)
+        if status is not None:
+            totals[status] += 1
+    return totals
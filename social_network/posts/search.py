@@ -0,0 +1,178 @@
+"""
+Полнотекстовый поиск по тексту постов и комментариев к ним.
+
+Движок задаётся `SEARCH['ENGINE']` (путь к классу); по умолчанию выбирается
+по СУБД соединения:
+
+- `PostgresSearchEngine` — поиск по колонке `Post.search_vector` (tsvector с GIN-индексом),
+  текст поста имеет вес A, комментарии — B; результаты ранжируются `ts_rank`.
+  Колонка обновляется после фиксации транзакции (`transaction.on_commit` в `posts.signals`):
+  текст нового комментария дописывается к вектору (`search_vector || to_tsvector(...)`),
+  без пересчёта остальных комментариев. Вектор пересчитывается целиком, только когда
+  меняется текст поста или комментарий изменяют либо удаляют. Тексты комментариев
+  при пересчёте обрезаются до `SEARCH['MAX_DOCUMENT_LENGTH']` символов, чтобы не
+  превысить предел размера tsvector (1 МБ). Ошибки обновления вектора логируются
+  и не влияют на запрос. Целиком колонку пересчитывает команда `rebuild_search_index`.
+- `SimpleSearchEngine` — запасной вариант для SQLite (тесты, локальная разработка):
+  `LIKE` по каждому слову запроса без индекса; совпадение в тексте поста весит больше,
+  чем в комментариях. В SQLite `LIKE` не различает регистр только для латиницы.
+"""
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, TextField, Value, When
+from django.db.models.expressions import CombinedExpression
+from django.db.models.functions import Coalesce, Left
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENGINE': None,
+    'CONFIG': 'russian',
+    'MAX_TERMS': 10,
+    'MAX_DOCUMENT_LENGTH': 200000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SEARCH', {}).get(name, DEFAULTS[name])
+
+
+class PostgresSearchEngine:
+    """
+    Поиск PostgreSQL по `Post.search_vector`.
+    """
+    def __init__(self, config=None):
+        self.config = config or get_setting('CONFIG')
+
+    def vector(self):
+        """
+        Выражение tsvector для поста: текст поста (вес A) и тексты комментариев (вес B),
+        обрезанные до `MAX_DOCUMENT_LENGTH` символов.
+        """
+        comments = (
+            Comment.objects
+            .filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(document=StringAgg('text', delimiter=' '))
+            .values('document')
+        )
+        return (
+            SearchVector('text', weight='A', config=self.config)
+            + SearchVector(
+                Left(Coalesce(Subquery(comments), Value(''), output_field=TextField()), get_setting('MAX_DOCUMENT_LENGTH')),
+                weight='B',
+                config=self.config,
+            )
+        )
+
+    def update(self, post_ids):
+        return Post.objects.filter(pk__in=post_ids).update(search_vector=self.vector())
+
+    def add_comment(self, post_id, text):
+        """
+        Дописывает текст нового комментария к вектору поста (вес B).
+        Если вектор превысил предел размера, пост пересчитывается целиком с обрезанным документом.
+        """
+        current = Coalesce(F('search_vector'), SearchVector(Value(''), config=self.config))
+        comment = SearchVector(Value(text[:get_setting('MAX_DOCUMENT_LENGTH')]), weight='B', config=self.config)
+        try:
+            with transaction.atomic():
+                return Post.objects.filter(pk=post_id).update(
+                    search_vector=CombinedExpression(current, '||', comment, output_field=SearchVectorField())
+                )
+        except DatabaseError:
+            return self.update([post_id])
+
+    def rebuild(self, queryset):
+        return queryset.update(search_vector=self.vector())
+
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, config=self.config, search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', '-id')
+        )
+
+
+class SimpleSearchEngine:
+    """
+    Поиск без индекса для СУБД, отличных от PostgreSQL.
+    Каждое слово запроса должно встречаться в тексте поста или его комментариев.
+    """
+    def update(self, post_ids):
+        return 0
+
+    def add_comment(self, post_id, text):
+        return 0
+
+    def rebuild(self, queryset):
+        return 0
+
+    def search(self, queryset, query):
+        terms = query.split()[:get_setting('MAX_TERMS')]
+        if not terms:
+            return queryset.none()
+        rank = Value(0)
+        for term in terms:
+            in_comments = Exists(Comment.objects.filter(post=OuterRef('pk'), text__icontains=term))
+            queryset = queryset.filter(Q(text__icontains=term) | in_comments)
+            rank = rank + Case(When(text__icontains=term, then=Value(2)), default=Value(1))
+        return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+
+def get_engine():
+    engine = get_setting('ENGINE')
+    if engine:
+        return import_string(engine)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchEngine()
+    return SimpleSearchEngine()
+
+
+def update_search_index(post_ids):
+    """
+    Пересчитывает поисковый вектор указанных постов.
+    """
+    return get_engine().update(post_ids)
+
+
+def index_comment(post_id, text):
+    """
+    Добавляет текст нового комментария в поисковый вектор поста.
+    """
+    return get_engine().add_comment(post_id, text)
+
+
+def _run_logged(func, *args):
+    try:
+        return func(*args)
+    except DatabaseError:
+        logger.exception('Не удалось обновить поисковый вектор: %s%r', func.__name__, args)
+        return 0
+
+
+def schedule(func, *args):
+    """
+    Выполняет обновление индекса `func(*args)` после фиксации текущей транзакции.
+    Ошибка обновления логируется и не влияет на запрос.
+    """
+    transaction.on_commit(partial(_run_logged, func, *args))
+
+
+def search_posts(queryset, query):
+    """
+    Возвращает посты из `queryset`, подходящие под `query`, с аннотацией `rank`,
+    отсортированные по убыванию релевантности.
+    """
+    return get_engine().search(queryset, query)
@@ -1,8 +1,19 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+
+from social_network.profiling import ProfiledSerializerMixin
+
+from .export import EXPORT_TYPES
+from .images import ingest_images
 from .models import Comment, Post, PostImage
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели `Comment`.
     """
@@ -13,21 +24,111 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['author', 'text', 'created_at']
 
 
+@extend_schema_field({'type': 'object', 'additionalProperties': {'type': 'string', 'format': 'uri'}})
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Ссылки на уменьшенные копии изображения: {"thumb": url, "medium": url, "large": url}.
+    """
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in (value or {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+
+class LikeActionSerializer(serializers.Serializer):
+    """
+    Одна операция с лайком: поставить (`like`) или убрать (`unlike`).
+    """
+    post = serializers.IntegerField(min_value=1)
+    action = serializers.ChoiceField(choices=['like', 'unlike'])
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    """
+    Пачка операций с лайками текущего пользователя.
+    """
+    actions = LikeActionSerializer(many=True, allow_empty=False, max_length=500)
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    """
+    Параметры поиска постов поблизости: точка и радиус в метрах.
+    """
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(min_value=1, max_value=50000, default=1000)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    """
+    Параметры выгрузки: типы записей, авторы и полуинтервал времени `since <= created_at < until`.
+    """
+    type = serializers.MultipleChoiceField(choices=list(EXPORT_TYPES), required=False)
+    author = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if 'since' in attrs and 'until' in attrs and attrs['since'] >= attrs['until']:
+            raise serializers.ValidationError({'until': 'Должно быть позже since.'})
+        return attrs
+
+
+class AuthorSerializer(serializers.ModelSerializer):
+    """
+    Автор поста (раскрывается по `?expand=author`).
+    """
+    class Meta:
+        model = get_user_model()
+        fields = ['id', 'username']
+
+
+class SparseFieldsMixin:
+    """
+    Оставляет поля, выбранные `?fields=`, и добавляет раскрытые `?expand=`
+    (выбор передаётся в контексте как `field_selection`, см. `posts.fieldsets`).
+    Без выбора сериализатор возвращает поля по умолчанию.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.context.get('field_selection')
+        if selection is None:
+            return fields
+        for name in selection.expand:
+            fields[name] = self.expandable_fields[name](read_only=True)
+        if selection.fields is not None:
+            keep = selection.fields | selection.expand
+            fields = {name: field for name, field in fields.items() if name in keep}
+        return fields
+
+
 class PostImageSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели PostImage.
     """
+    variants = ImageVariantsField()
+
     class Meta:
         model = PostImage
-        fields = ['image']
+        fields = ['image', 'variants']
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(ProfiledSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """
     Базовый сериализатор для модели `Post`.
+    Поле `comments` содержит только последние `POST_COMMENTS_PREVIEW_SIZE` комментариев
+    (сначала новые), полный список — `GET /posts/{id}/comments/`.
+    Поддерживает `?fields=` и `?expand=author` (см. `SparseFieldsMixin`).
     """
-    comments = CommentSerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    expandable_fields = {'author': AuthorSerializer}
+
+    comments = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField(source='variants')
     images = PostImageSerializer(many=True, read_only=True)  # для нескольких image
     location = serializers.SerializerMethodField()
 
@@ -38,37 +139,46 @@ class PostSerializer(serializers.ModelSerializer):
             'id',
             'text',
             'image',
+            'image_variants',
             'created_at',
             'comments',
+            'comments_count',
             'likes_count',
             'images',
             'location',
             'latitude',
-            'longitude'
+            'longitude',
+            'geocoding_status'
         ]
+        read_only_fields = ['likes_count', 'comments_count']
 
-    def get_location(self, obj):
+    @extend_schema_field(CommentSerializer(many=True))
+    def get_comments(self, obj):
         """
-        Возвращает локацию через reverse-геокодирование,
-        используя широту и долготу.
+        Возвращает последние комментарии поста.
+        Для списка они предзагружаются одним запросом в `PostViewSet.get_queryset` (атрибут `comments_preview`).
         """
-        if obj.latitude and obj.longitude:
-            from geopy.geocoders import Nominatim
-            try:
-                geolocator = Nominatim(user_agent='post-reverse-geocoder')
-                location = geolocator.reverse(f'{obj.latitude}, {obj.longitude}')
-                if location:
-                    return location.address
-            except Exception as e:
-                print(f'Ошибка при обратном геокодировании: {e}')
-                return obj.location
-        return obj.location
-
-    def get_likes_count(self, obj):
+        comments = getattr(obj, 'comments_preview', None)
+        if comments is None:
+            comments = obj.comments.order_by('-created_at', '-id')[:settings.POST_COMMENTS_PREVIEW_SIZE]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    def get_location(self, obj):
         """
-        Возвращает количество лайков для текущего поста.
+        Возвращает полный адрес, определённый геокодером при сохранении поста,
+        или адрес, указанный пользователем. Геокодер здесь не вызывается.
         """
-        return obj.likes.count()
+        return obj.address or obj.location
+
+
+class NearbyPostSerializer(PostSerializer):
+    """
+    Пост с расстоянием (в метрах) до точки запроса `GET /posts/nearby/`.
+    """
+    distance = serializers.FloatField(read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ['distance']
 
 
 class PostWriteSerializer(PostSerializer):
@@ -77,16 +187,16 @@ class PostWriteSerializer(PostSerializer):
     """
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
     images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=serializers.FileField(),
         write_only=True,
         required=False
-    )  # для нескольких image
+    )  # для нескольких image; проверка изображений — в ingest_images
     location = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
 
     class Meta:
         model = Post
-        fields = ['author', 'text', 'images', 'location', 'latitude', 'longitude']
-        read_only_fields = ['latitude', 'longitude']
+        fields = ['author', 'text', 'images', 'location', 'latitude', 'longitude', 'geocoding_status']
+        read_only_fields = ['latitude', 'longitude', 'geocoding_status']
 
     def validate_location(self, value):
         """
@@ -96,26 +206,35 @@ class PostWriteSerializer(PostSerializer):
             return None
         return value
 
+    def _ingest_images(self, post, images_data):
+        try:
+            ingest_images(post, images_data)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'images': e.messages})
+
+    @transaction.atomic
     def create(self, validated_data):
         """
         Создание нового поста с возможностью загрузки нескольких изображений.
         """
         images_data = validated_data.pop('images', [])
         post = super().create(validated_data)
-        for image in images_data:
-            PostImage.objects.create(post=post, image=image)
+        self._ingest_images(post, images_data)
         return post
 
     def update(self, obj, validated_data):
         """
         Обновление существующего поста.
+        В БД записываются только изменившиеся поля.
         """
         obj.location = validated_data.get('location', obj.location)
         obj.text = validated_data.get('text', obj.text)
         images_data = validated_data.pop('images', [])
         if images_data:
-            obj.images.all().delete()
-            for image in images_data:
-                PostImage.objects.create(post=obj, image=image)
-        obj.save()
+            with transaction.atomic():
+                obj.images.all().delete()
+                self._ingest_images(obj, images_data)
+        changed = obj.get_dirty_fields()
+        if changed:
+            obj.save(update_fields=changed)
         return obj
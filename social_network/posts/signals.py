@@ -0,0 +1,74 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_post, invalidate_post_list
+from .images import delete_files
+from .models import Comment, Like, Post, PostImage
+from .search import index_comment, schedule, update_search_index
+from .timeline import fan_out
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_cache(sender, instance, created=False, **kwargs):
+    """
+    Сбрасывает кеш ответов при изменении или удалении поста,
+    страницы списка — только при создании и удалении.
+    """
+    invalidate_post(instance.pk)
+    if created or kwargs['signal'] is post_delete:
+        invalidate_post_list()
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=PostImage)
+def invalidate_related_cache(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш ответов поста при изменении его комментариев, лайков и изображений.
+    """
+    invalidate_post(instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """
+    Рассылает новый пост по лентам подписчиков после фиксации транзакции.
+    """
+    if created:
+        transaction.on_commit(partial(fan_out, instance))
+
+
+@receiver(post_save, sender=Post)
+def update_post_search(sender, instance, created, update_fields, **kwargs):
+    """
+    Пересчитывает поисковый вектор нового поста или поста с изменённым текстом
+    после фиксации транзакции.
+    """
+    if created or update_fields is None or 'text' in update_fields:
+        schedule(update_search_index, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def update_comment_search(sender, instance, created=False, **kwargs):
+    """
+    Обновляет поисковый вектор поста после фиксации транзакции: текст нового
+    комментария дописывается к вектору, при изменении или удалении комментария
+    вектор пересчитывается целиком.
+    """
+    if created:
+        schedule(index_comment, instance.post_id, instance.text)
+    else:
+        schedule(update_search_index, [instance.post_id])
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=PostImage)
+def delete_image_files(sender, instance, **kwargs):
+    """
+    Убирает ссылки на файлы изображения и его вариантов после удаления строки
+    (файл удаляется с диска, когда ссылок не осталось, см. `posts.storage`).
+    """
+    delete_files([instance])
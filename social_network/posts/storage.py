@@ -0,0 +1,287 @@
+"""
+Контентно-адресуемое хранилище загружаемых изображений (`STORAGES['default']`).
+
+Файл сохраняется под именем из SHA-256 своего содержимого:
+`content/ab/cd/<sha256>.<расширение>`, независимо от `upload_to` поля. Одинаковые
+загрузки (репосты, один и тот же мем в разных постах) занимают на диске одно место
+и получают один URL. Содержимое по URL никогда не меняется, поэтому его можно
+отдавать с `Cache-Control: immutable` и бессрочно кешировать в CDN.
+
+Запись потоковая: содержимое читается блоками, хешируется и пишется во временный
+файл в скрытом каталоге `content/.tmp` (не раздаётся, см. `social_network.media`),
+затем атомарно переименовывается (`os.replace`) — недописанный файл никогда
+не виден под итоговым именем.
+
+Ссылки считаются в таблице `StoredFile`: каждое `save()` добавляет ссылку,
+каждое `delete()` убирает одну; файл удаляется с диска, когда ссылок не осталось.
+`delete()` внутри транзакции выполняется после её фиксации: при откате удалённые
+строки моделей возвращаются, и ссылки на файлы остаются. Сохранение сначала добавляет
+ссылку и только потом проверяет, есть ли файл на диске, а удаление стирает файл
+в той же транзакции, что и обнуляет счётчик, — поэтому параллельные сохранение
+и удаление одного содержимого не оставляют ссылку без файла.
+
+Для пакетов файлов ссылки учитываются несколькими запросами на весь пакет
+(`save_many`, `delete_many`). Запись в пуле потоков (`posts.images`) разделена:
+`stage()` пишет и хеширует содержимое без обращения к БД, `save_staged()`
+в вызывающем потоке учитывает ссылки и переносит файлы на место.
+
+Файлы, сохранённые до подключения хранилища (без строки в `StoredFile`),
+удаляются при `delete()` сразу.
+
+Файл переносится на место до фиксации транзакции, добавившей ссылку. Если внешняя
+транзакция затем откатывается, на диске остаётся файл без строки, а после
+прерванной записи — временный файл в `.tmp`. Такие файлы убирает `collect_garbage`
+(команда `collect_stored_files`): файлы без строки получают строку с нулём ссылок,
+затем строки с нулём ссылок удаляются вместе с файлами, если файл не менялся
+дольше льготного периода. Строки удаляются под `select_for_update(skip_locked=True)`,
+а `retain()` блокирует свои строки и создаёт заново строку, удалённую сборкой мусора,
+поэтому сборку можно запускать параллельно с загрузками.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import Counter, namedtuple
+from functools import partial
+from itertools import islice
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_NAME_RE = re.compile(r'[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[0-9a-z]+)?')
+
+StagedFile = namedtuple('StagedFile', ['path', 'digest', 'size'])
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    `FileSystemStorage` с именами по хешу содержимого и подсчётом ссылок (см. описание модуля).
+
+    ## Параметры:
+    - `directory`: Каталог внутри `location` для файлов и временных файлов
+    - `chunk_size`: Размер блока при чтении загрузки, байт
+    """
+    def __init__(self, directory='content', chunk_size=CHUNK_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.chunk_size = chunk_size
+
+    def get_available_name(self, name, max_length=None):
+        # имя всё равно заменяется хешем содержимого, совпадение имён — это дедупликация
+        return name
+
+    def content_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f'{self.directory}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+    def is_content_name(self, name):
+        """
+        Имя по хешу содержимого: файл под ним никогда не меняется.
+        """
+        prefix = f'{self.directory}/'
+        return name.startswith(prefix) and CONTENT_NAME_RE.fullmatch(name[len(prefix):]) is not None
+
+    def stage(self, content):
+        """
+        Пишет содержимое во временный файл, вычисляя хеш. К БД не обращается,
+        можно вызывать из потоков пула. Результат передаётся в `save_staged` или `discard`.
+        """
+        temp_dir = self.path(os.path.join(self.directory, '.tmp'))
+        os.makedirs(temp_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            digest, size = hashlib.sha256(), 0
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+                temp.flush()
+                os.fsync(temp.fileno())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return StagedFile(temp_path, digest.hexdigest(), size)
+
+    def save_staged(self, files):
+        """
+        Сохраняет подготовленные `stage()` файлы `[(имя, StagedFile)]`: добавляет ссылки
+        одним пакетом и переносит на место содержимое, которого ещё нет на диске.
+        Возвращает имена файлов в хранилище.
+        """
+        names = [self.content_name(staged.digest, name) for name, staged in files]
+        try:
+            self.retain([(name, staged.size) for name, (_, staged) in zip(names, files)])
+            for name, (_, staged) in zip(names, files):
+                path = self.path(name)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(staged.path, self.file_permissions_mode)
+                    os.replace(staged.path, path)
+        finally:
+            for _, staged in files:
+                self.discard(staged)
+        return names
+
+    def save_many(self, files):
+        """
+        Сохраняет файлы `[(имя, содержимое)]` с одним пакетным учётом ссылок.
+        """
+        staged = []
+        try:
+            for name, content in files:
+                staged.append((name, self.stage(content)))
+        except BaseException:
+            for _, file in staged:
+                self.discard(file)
+            raise
+        return self.save_staged(staged)
+
+    def discard(self, staged):
+        if os.path.exists(staged.path):
+            os.remove(staged.path)
+
+    def _save(self, name, content):
+        return self.save_many([(name, content)])[0]
+
+    def retain(self, files):
+        """
+        Добавляет по ссылке на каждый файл `[(имя, размер)]`.
+        """
+        from .models import StoredFile
+
+        counts = Counter(name for name, size in files)
+        sizes = dict(files)
+        pending = set(counts)
+        with transaction.atomic():
+            while pending:
+                # строки с нулём ссылок удаляет только сборка мусора: сохранение,
+                # вернувшее ссылку, само проверяет, есть ли файл на диске
+                StoredFile.objects.bulk_create(
+                    [StoredFile(name=name, size=sizes[name], refcount=0) for name in pending], ignore_conflicts=True
+                )
+                # заблокированные строки сборка мусора пропускает; строку, которую она
+                # успела удалить, на следующем шаге создаём заново
+                locked = set(
+                    StoredFile.objects.select_for_update().filter(name__in=pending).order_by('name')
+                    .values_list('name', flat=True)
+                )
+                for count, names in _group_by_count({name: counts[name] for name in locked}):
+                    StoredFile.objects.filter(name__in=names).update(refcount=F('refcount') + count)
+                pending -= locked
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        self.delete_many([name])
+
+    def delete_many(self, names):
+        """
+        Убирает по ссылке на каждый файл после фиксации текущей транзакции.
+        """
+        transaction.on_commit(partial(self.release, list(names)))
+
+    def release(self, names):
+        """
+        Убирает по ссылке на каждый файл и удаляет с диска файлы, на которые ссылок не осталось.
+        """
+        from .models import StoredFile
+
+        counts = Counter(names)
+        with transaction.atomic():
+            for count, group in _group_by_count(counts):
+                StoredFile.objects.filter(name__in=group, refcount__gt=0).update(
+                    refcount=Greatest(F('refcount') - count, 0)
+                )
+            # строки заблокированы UPDATE до конца транзакции, параллельное сохранение
+            # того же содержимого дождётся её и запишет файл заново
+            remaining = dict(StoredFile.objects.filter(name__in=counts).values_list('name', 'refcount'))
+            for name in counts:
+                if not remaining.get(name):
+                    super().delete(name)
+
+    def stored_names(self):
+        """
+        Имена файлов по хешу содержимого, лежащих на диске (без временных файлов).
+        """
+        root = self.path(self.directory)
+        for directory, subdirectories, filenames in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if name != '.tmp']
+            for filename in filenames:
+                relative = os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/')
+                name = f'{self.directory}/{relative}'
+                if self.is_content_name(name):
+                    yield name
+
+    def _unchanged_since(self, name, cutoff):
+        try:
+            return os.path.getmtime(self.path(name)) < cutoff
+        except FileNotFoundError:
+            return True
+
+    def collect_garbage(self, grace=3600, batch_size=1000):
+        """
+        Удаляет файлы, на которые нет ссылок (см. описание модуля):
+
+        1. файлам на диске без строки в `StoredFile` добавляет строку с нулём ссылок;
+        2. удаляет строки с нулём ссылок и их файлы, если файл не менялся дольше `grace`
+           секунд или его уже нет; заблокированные строки пропускаются;
+        3. удаляет временные файлы старше `grace` секунд.
+
+        Возвращает счётчики `{'adopted': ..., 'deleted': ..., 'temporary': ...}`.
+        """
+        from .models import StoredFile
+
+        cutoff = time.time() - grace
+        totals = dict.fromkeys(['adopted', 'deleted', 'temporary'], 0)
+
+        names = self.stored_names()
+        while batch := list(islice(names, batch_size)):
+            known = set(StoredFile.objects.filter(name__in=batch).values_list('name', flat=True))
+            orphans = [name for name in batch if name not in known]
+            StoredFile.objects.bulk_create(
+                [StoredFile(name=name, size=self.size(name), refcount=0) for name in orphans], ignore_conflicts=True
+            )
+            totals['adopted'] += len(orphans)
+
+        last = ''
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    StoredFile.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(refcount=0, name__gt=last)
+                    .order_by('name')
+                    .values_list('name', flat=True)[:batch_size]
+                )
+                if not batch:
+                    break
+                last = batch[-1]
+                expired = [name for name in batch if self._unchanged_since(name, cutoff)]
+                StoredFile.objects.filter(name__in=expired).delete()
+                for name in expired:
+                    super().delete(name)
+                totals['deleted'] += len(expired)
+
+        temp_dir = self.path(os.path.join(self.directory, '.tmp'))
+        if os.path.isdir(temp_dir):
+            for entry in os.scandir(temp_dir):
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                    totals['temporary'] += 1
+        return totals
+
+
+def _group_by_count(counts):
+    groups = {}
+    for name, count in counts.items():
+        groups.setdefault(count, []).append(name)
+    return groups.items()
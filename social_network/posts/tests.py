@@ -1,3 +1,1120 @@
-from django.test import TestCase
+import math
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from social_network.db_router import PrimaryReplicaRouter, current_read_database, is_pinned, read_from
+from social_network.lru import MISSING
+
+from . import geo
+from .cache import (
+    LIST_SCOPE,
+    get_cache,
+    get_version,
+    invalidate_post,
+    invalidate_post_list,
+    invalidate_posts,
+    post_scope,
+    post_versions,
+)
+from .fast_serializers import FastPostSerializer
+from .fieldsets import parse_field_selection, post_queryset
+from .geocoding import EMPTY_RESULT, GeocodeResult, GeocodingError, build_geocoder
+from .geocoding_queue import RateLimiter, claim_jobs, process_job, retry_delay, run_worker
+from .images import ingest_images
+from .likes import apply_likes, toggle_like
+from .models import (
+    Comment,
+    GeocodeCacheEntry,
+    GeocodeJob,
+    Like,
+    Post,
+    PostImage,
+    PurgeJob,
+    StoredFile,
+    TimelineEntry,
+)
+from .purge import claim_job, delete_posts, delete_user, purge_post_batch, purge_user_batch
+from .purge import process_job as process_purge_job
+from .purge import run_worker as run_purge_worker
+from .search import SimpleSearchEngine
+from .serializers import PostSerializer
+from .timeline import follow, pull_timeline
+
+
+class FakeGeocoder:
+    """
+    Заглушка бэкенда геокодирования: запоминает вызовы, адреса с `nowhere`
+    не находит, на адресах с `fail` бросает временную ошибку.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if 'fail' in address:
+            raise GeocodingError('timeout')
+        if 'nowhere' in address:
+            return None
+        return GeocodeResult(55.7539, 37.6208, 'Красная площадь, Москва, Россия')
+
+    def reverse(self, latitude, longitude):
+        self.calls.append((latitude, longitude))
+        return GeocodeResult(latitude, longitude, 'Москва, Россия')
+
+
+class GeocodingCacheTests(TestCase):
+    def setUp(self):
+        self.backend = FakeGeocoder()
+        self.geocoder = build_geocoder(self.backend)
+
+    def test_miss_then_memory_hit(self):
+        first = self.geocoder.geocode('Москва')
+        second = self.geocoder.geocode('Москва')
+        self.assertEqual(first, second)
+        self.assertEqual(first.address, 'Красная площадь, Москва, Россия')
+        self.assertEqual(self.backend.calls, ['Москва'])
+        self.assertEqual(self.geocoder.counters['misses'], 1)
+        self.assertEqual(self.geocoder.counters['memory_hits'], 1)
+
+    def test_database_hit_in_new_process(self):
+        self.geocoder.geocode('Москва')
+        other = build_geocoder(self.backend)
+        self.assertEqual(other.geocode('Москва').address, 'Красная площадь, Москва, Россия')
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(other.counters['db_hits'], 1)
+
+    def test_key_is_normalized(self):
+        self.geocoder.geocode('  Москва ,  Россия ')
+        self.geocoder.geocode('москва, россия')
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 1)
+
+    def test_not_found_is_cached_with_negative_ttl(self):
+        self.assertEqual(self.geocoder.geocode('nowhere'), EMPTY_RESULT)
+        self.assertEqual(build_geocoder(self.backend).geocode('nowhere'), EMPTY_RESULT)
+        self.assertEqual(self.backend.calls, ['nowhere'])
+        self.assertEqual(self.geocoder.counters['negative'], 1)
+        entry = GeocodeCacheEntry.objects.get()
+        self.assertIsNone(entry.latitude)
+        self.assertLess(entry.expires_at, timezone.now() + timedelta(seconds=self.geocoder.negative_ttl + 1))
+
+    def test_errors_are_not_cached(self):
+        with self.assertLogs('posts.geocoding', 'WARNING'):
+            self.assertEqual(self.geocoder.geocode('fail'), EMPTY_RESULT)
+            self.assertEqual(self.geocoder.geocode('fail'), EMPTY_RESULT)
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertFalse(GeocodeCacheEntry.objects.exists())
+        with self.assertRaises(GeocodingError):
+            self.geocoder.geocode('fail', raise_errors=True)
+
+    def test_expired_entry_is_refreshed(self):
+        self.geocoder.geocode('Москва')
+        GeocodeCacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        build_geocoder(self.backend).geocode('Москва')
+        self.assertEqual(len(self.backend.calls), 2)
+
+    def test_forward_and_reverse_keys_do_not_collide(self):
+        self.geocoder.reverse(55.7539, 37.6208)
+        self.geocoder.geocode('reverse:55.753900,37.620800')
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertEqual(GeocodeCacheEntry.objects.count(), 2)
+
+    def test_lookup_does_not_call_backend(self):
+        self.assertIs(self.geocoder.lookup('Москва'), MISSING)
+        self.geocoder.geocode('Москва')
+        self.assertEqual(self.geocoder.lookup('Москва').latitude, self.geocoder.geocode('Москва').latitude)
+        self.assertEqual(len(self.backend.calls), 1)
+
+
+class BackfillPostAddressesTests(TestCase):
+    @override_settings(GEOCODING={**settings.GEOCODING, 'BACKEND': 'posts.tests.FakeGeocoder', 'RATE_LIMIT': 100})
+    def test_backend_calls_are_rate_limited(self):
+        author = get_user_model().objects.create_user('author')
+        for latitude in ('55.750000', '55.750000', '56.000000'):
+            post = Post.objects.create(author=author, text='пост')
+            Post.objects.filter(pk=post.pk).update(latitude=latitude, longitude='37.600000')
+
+        with mock.patch.object(RateLimiter, 'acquire', autospec=True) as acquire:
+            call_command('backfill_post_addresses', stdout=StringIO())
+
+        # одинаковые координаты второй раз берутся из кеша и квоту не расходуют
+        self.assertEqual(acquire.call_count, 2)
+        self.assertEqual(acquire.call_args.args[0].rate, 100)
+        self.assertEqual(set(Post.objects.values_list('address', flat=True)), {'Москва, Россия'})
+
+
+@override_settings(GEOCODING={
+    **settings.GEOCODING,
+    'BACKEND': 'posts.tests.FakeGeocoder',
+    'MAX_ATTEMPTS': 2,
+    'RETRY_BACKOFF': 30,
+    'RETRY_BACKOFF_MAX': 60,
+})
+class GeocodeWorkerTests(TestCase):
+    def setUp(self):
+        self.author = get_user_model().objects.create_user('author', password='password')
+        self.geocoder = build_geocoder(FakeGeocoder())
+
+    def create_post(self, location):
+        return Post.objects.create(author=self.author, text='текст', location=location)
+
+    def make_due(self):
+        GeocodeJob.objects.update(run_after=timezone.now())
+
+    def test_post_is_queued_without_network_call(self):
+        post = self.create_post('Москва')
+        self.assertEqual(post.geocoding_status, Post.GeocodingStatus.PENDING)
+        self.assertIsNone(post.latitude)
+        self.assertEqual(GeocodeJob.objects.get(post=post).status, GeocodeJob.Status.PENDING)
+
+    def test_success_fills_post(self):
+        post = self.create_post('Москва')
+        job, = claim_jobs('worker', 10)
+        self.assertEqual(process_job(job, self.geocoder), GeocodeJob.Status.DONE)
+        post.refresh_from_db()
+        self.assertEqual(post.geocoding_status, Post.GeocodingStatus.DONE)
+        self.assertEqual(post.address, 'Красная площадь, Москва, Россия')
+        self.assertIsNotNone(post.geohash)
+
+    def test_failure_is_retried_with_backoff(self):
+        self.create_post('fail')
+        job, = claim_jobs('worker', 10)
+        before = timezone.now()
+        self.assertEqual(process_job(job, self.geocoder), GeocodeJob.Status.PENDING)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.last_error, 'timeout')
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=15))
+        self.assertEqual(claim_jobs('worker', 10), [])
+
+    def test_dead_letter_after_max_attempts(self):
+        post = self.create_post('fail')
+        statuses = []
+        for _ in range(2):
+            self.make_due()
+            job, = claim_jobs('worker', 10)
+            statuses.append(process_job(job, self.geocoder))
+        self.assertEqual(statuses, [GeocodeJob.Status.PENDING, GeocodeJob.Status.DEAD])
+        self.make_due()
+        self.assertEqual(claim_jobs('worker', 10), [])
+        post.refresh_from_db()
+        self.assertEqual(post.geocoding_status, Post.GeocodingStatus.FAILED)
+
+    def test_retry_delay_grows_and_is_capped(self):
+        self.assertLessEqual(retry_delay(1), timedelta(seconds=30))
+        self.assertGreaterEqual(retry_delay(2), timedelta(seconds=30))
+        self.assertLessEqual(retry_delay(10), timedelta(seconds=60))
+
+    def test_stale_job_is_reclaimed(self):
+        self.create_post('Москва')
+        claim_jobs('dead-worker', 10)
+        self.assertEqual(claim_jobs('worker', 10), [])
+        GeocodeJob.objects.update(locked_at=timezone.now() - timedelta(seconds=settings.GEOCODING['VISIBILITY_TIMEOUT'] + 1))
+        job, = claim_jobs('worker', 10)
+        self.assertEqual(job.attempts, 2)
+
+    def test_result_for_changed_location_is_discarded(self):
+        post = self.create_post('Москва')
+        job, = claim_jobs('worker', 10)
+        post.location = 'nowhere'
+        post.save()
+        process_job(job, self.geocoder)
+        post.refresh_from_db()
+        self.assertEqual(post.location, 'nowhere')
+        self.assertIsNone(post.latitude)
+        self.assertEqual(GeocodeJob.objects.get(post=post).status, GeocodeJob.Status.PENDING)
+
+    def test_run_worker_drains_queue(self):
+        self.create_post('Москва')
+        self.create_post('nowhere')
+        self.create_post('fail')
+        totals = run_worker(worker_id='worker', rate=0, once=True, backend=FakeGeocoder())
+        self.assertEqual(totals[GeocodeJob.Status.DONE], 2)
+        self.assertEqual(totals[GeocodeJob.Status.PENDING], 1)
+
+
+class PostResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.author = get_user_model().objects.create_user('author', password='password')
+        self.posts = [Post.objects.create(author=self.author, text=f'пост {i}') for i in range(4)]
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=self.author).key}'}
+
+    def like(self, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/posts/{post.pk}/like/', **self.auth).status_code, 200)
+
+    def test_list_hit_keeps_headers(self):
+        first = self.client.get('/api/posts/?page_size=2')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/?page_size=2')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second['Vary'], first['Vary'])
+        self.assertEqual(second['Allow'], first['Allow'])
+        not_modified = self.client.get('/api/posts/?page_size=2', HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['Vary'], first['Vary'])
+
+    def test_like_invalidates_only_pages_with_the_post(self):
+        self.client.get('/api/posts/?page_size=2')
+        self.like(self.posts[0])
+        with self.assertNumQueries(0):
+            self.client.get('/api/posts/?page_size=2')
+        self.like(self.posts[-1])
+        response = self.client.get('/api/posts/?page_size=2')
+        self.assertEqual(response.json()['results'][0]['likes_count'], 1)
+
+    def test_new_post_invalidates_list(self):
+        self.client.get('/api/posts/?page_size=2')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.author, text='новый')
+        self.assertEqual(self.client.get('/api/posts/?page_size=2').json()['results'][0]['text'], 'новый')
+
+    def test_versions_change_after_commit(self):
+        scope = post_scope(self.posts[0].pk)
+        version = get_version(scope)
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_posts([self.posts[0].pk])
+            invalidate_post_list()
+            self.assertEqual(get_version(scope), version)
+        self.assertEqual(len(callbacks), 2)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_version(scope), version)
+
+    def test_rollback_keeps_versions(self):
+        version = get_version(LIST_SCOPE)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Post.objects.create(author=self.author, text='откат')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(get_version(LIST_SCOPE), version)
+
+    def test_list_entry_keeps_versions_read_before_rows(self):
+        post = self.posts[-1]
+
+        def commit_then_read(post_ids):
+            # изменение фиксируется между чтением идентификаторов страницы и чтением версий
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.filter(pk=post.pk).update(likes_count=1)
+                invalidate_post(post.pk)
+            return post_versions(post_ids)
+
+        with mock.patch('posts.cache.post_versions', side_effect=commit_then_read):
+            first = self.client.get('/api/posts/?page_size=2')
+        self.assertEqual(first.json()['results'][0]['likes_count'], 1)
+        self.assertNotIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/posts/?page_size=2').content, first.content)
+
+    def test_detail_scope_is_normalized(self):
+        post = self.posts[0]
+        self.assertEqual(self.client.get(f'/api/posts/0{post.pk}/').json()['likes_count'], 0)
+        self.like(post)
+        self.assertEqual(self.client.get(f'/api/posts/0{post.pk}/').json()['likes_count'], 1)
+        self.assertEqual(self.client.get('/api/posts/abc/').status_code, 404)
+
+
+class RecordingSearchEngine(SimpleSearchEngine):
+    """
+    `SimpleSearchEngine`, запоминающий обновления индекса.
+    """
+    calls = []
+
+    def update(self, post_ids):
+        self.calls.append(('update', list(post_ids)))
+        return 0
+
+    def add_comment(self, post_id, text):
+        self.calls.append(('add_comment', post_id, text))
+        return 0
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.author = get_user_model().objects.create_user('author', password='password')
+        self.text_match = Post.objects.create(author=self.author, text='закат над морем')
+        self.comment_match = Post.objects.create(author=self.author, text='вечер')
+        Comment.objects.create(author=self.author, post=self.comment_match, text='какой закат')
+        self.other = Post.objects.create(author=self.author, text='горы')
+
+    def search(self, query):
+        response = self.client.get('/api/posts/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.json()['results']]
+
+    def test_text_match_ranks_above_comment_match(self):
+        self.assertEqual(self.search('закат'), [self.text_match.pk, self.comment_match.pk])
+
+    def test_all_terms_are_required(self):
+        self.assertEqual(self.search('закат морем'), [self.text_match.pk])
+        self.assertEqual(self.search('закат вечер'), [self.comment_match.pk])
+        self.assertEqual(self.search('закат горы'), [])
+
+    def test_latin_terms_ignore_case(self):
+        post = Post.objects.create(author=self.author, text='Sunset in Lisbon')
+        self.assertEqual(self.search('LISBON'), [post.pk])
+
+    def test_deleted_posts_are_hidden(self):
+        Post.objects.filter(pk=self.text_match.pk).update(deleted_at=timezone.now())
+        self.assertEqual(self.search('закат'), [self.comment_match.pk])
+
+    def test_empty_query_is_rejected(self):
+        self.assertEqual(self.client.get('/api/posts/search/', {'q': ' '}).status_code, 400)
+
+    @override_settings(SEARCH={**settings.SEARCH, 'ENGINE': 'posts.tests.RecordingSearchEngine'})
+    def test_index_is_updated_after_commit(self):
+        RecordingSearchEngine.calls = []
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            comment = Comment.objects.create(author=self.author, post=self.other, text='снег')
+            self.assertEqual(RecordingSearchEngine.calls, [])
+        self.assertEqual(RecordingSearchEngine.calls, [('add_comment', self.other.pk, 'снег')])
+        self.assertTrue(callbacks)
+        RecordingSearchEngine.calls = []
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.delete()
+        self.assertEqual(RecordingSearchEngine.calls, [('update', [self.other.pk])])
+
+
+@override_settings(DATABASE_ROUTING={**settings.DATABASE_ROUTING, 'REPLICAS': ['replica']})
+class ReplicaRoutingTests(TestCase):
+    """
+    Реплики `replica` в тестовой БД нет: `db_for_read` подменён, он запоминает
+    выбранную базу и читает из `default`.
+    """
+    def setUp(self):
+        get_cache().clear()
+        caches['default'].clear()
+        self.author = get_user_model().objects.create_user('author', password='password')
+        self.post = Post.objects.create(author=self.author, text='пост')
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=self.author).key}'}
+        self.reads = []
+        patcher = mock.patch.object(PrimaryReplicaRouter, 'db_for_read', autospec=True, side_effect=self.record_read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record_read(self, router, model, **hints):
+        self.reads.append(current_read_database())
+        return 'default'
+
+    def get_list(self, **headers):
+        # отметки «прилипания» хранятся в том же кеше, что и ответы, поэтому
+        # промах кеша ответов обеспечивается новым адресом, а не очисткой кеша
+        self.reads = []
+        self.page_size = getattr(self, 'page_size', 0) + 1
+        self.assertEqual(self.client.get(f'/api/posts/?page_size={self.page_size}', **headers).status_code, 200)
+        return self.reads
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertIn('replica', self.get_list())
+        self.assertIn('replica', self.get_list(**self.auth))
+        self.assertIsNone(current_read_database())
+
+    def test_write_pins_user_to_primary(self):
+        self.assertEqual(self.client.post(f'/api/posts/{self.post.pk}/like/', **self.auth).status_code, 200)
+        self.assertTrue(is_pinned(self.author.pk))
+        self.assertNotIn('replica', self.get_list(**self.auth))
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/', **self.auth).json()['likes_count'], 1)
+        self.assertIn('replica', self.get_list())
+
+    def test_failed_write_does_not_pin(self):
+        self.assertEqual(self.client.post('/api/posts/999999/like/', **self.auth).status_code, 404)
+        self.assertFalse(is_pinned(self.author.pk))
+
+    def test_writes_and_migrations_go_to_primary(self):
+        router = PrimaryReplicaRouter()
+        with read_from('replica'):
+            self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+    def test_read_from_resets_context(self):
+        with self.assertRaises(RuntimeError):
+            with read_from('replica'):
+                self.assertEqual(current_read_database(), 'replica')
+                raise RuntimeError
+        self.assertIsNone(current_read_database())
+
+    @override_settings(DATABASE_ROUTING={**settings.DATABASE_ROUTING, 'REPLICAS': []})
+    def test_without_replicas_everything_reads_from_primary(self):
+        self.client.post(f'/api/posts/{self.post.pk}/like/', **self.auth)
+        self.assertFalse(is_pinned(self.author.pk))
+        self.assertNotIn('replica', self.get_list())
+
+
+class ReplicaDatabaseTests(TestCase):
+    """
+    Реплика — отдельный файл SQLite со схемой основной базы, в котором есть пост,
+    которого нет в основной базе: по ответу видно, из какой базы он прочитан.
+    Алиас добавляется после `TestCase.setUpClass`, поэтому реплика не входит
+    в тестовую транзакцию и удаляется вместе с временным каталогом.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': {},
+            'replica': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+            },
+        })['replica']
+        call_command('migrate', database='replica', verbosity=0)
+        get_user_model().objects.using('replica').bulk_create([cls.author])
+        Post.objects.using('replica').bulk_create([Post(author=cls.author, text='из реплики')])
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', password='password')
+        cls.post = Post.objects.create(author=cls.author, text='из основной базы')
+        cls.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=cls.author).key}'}
+
+    def setUp(self):
+        get_cache().clear()
+        settings_override = override_settings(DATABASE_ROUTING={**settings.DATABASE_ROUTING, 'REPLICAS': ['replica']})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def texts(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return [post['text'] for post in response.json()['results']]
+
+    def test_anonymous_reads_replica(self):
+        self.assertEqual(self.texts('/api/posts/'), ['из реплики'])
+        self.assertEqual(self.texts('/api/posts/', **self.auth), ['из реплики'])
+
+    def test_pinned_user_reads_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f'/api/posts/{self.post.pk}/like/', **self.auth).status_code, 200)
+        self.assertEqual(self.texts('/api/posts/', **self.auth), ['из основной базы'])
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/', **self.auth).json()['likes_count'], 1)
+        self.assertEqual(self.texts('/api/posts/'), ['из реплики'])
+
+
+class StoredFileGarbageCollectionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.post = Post.objects.create(author=get_user_model().objects.create_user('author'), text='пост')
+
+    def upload(self, color):
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), color).save(buffer, format='JPEG')
+        image, = ingest_images(self.post, [SimpleUploadedFile('photo.jpg', buffer.getvalue())], build_variants=False)
+        return image.image.name
+
+    def age(self, name):
+        os.utime(default_storage.path(name), (0, 0))
+
+    def test_invalid_image_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            ingest_images(self.post, [SimpleUploadedFile('photo.jpg', b'not an image')])
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_file_orphaned_by_rollback_is_collected_after_grace(self):
+        kept = self.upload('red')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            orphan = self.upload('blue')
+            raise RuntimeError
+        self.assertTrue(default_storage.exists(orphan))
+        self.assertFalse(StoredFile.objects.filter(name=orphan).exists())
+
+        totals = default_storage.collect_garbage(grace=60)
+        self.assertEqual((totals['adopted'], totals['deleted']), (1, 0))
+        self.assertTrue(default_storage.exists(orphan))
+
+        self.age(orphan)
+        self.age(kept)
+        self.assertEqual(default_storage.collect_garbage(grace=60)['deleted'], 1)
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertFalse(StoredFile.objects.filter(name=orphan).exists())
+        self.assertTrue(default_storage.exists(kept))
+        self.assertEqual(StoredFile.objects.get(name=kept).refcount, 1)
+
+    def test_stale_temporary_files_are_removed(self):
+        temp_dir = default_storage.path('content/.tmp')
+        os.makedirs(temp_dir)
+        for name in ('stale', 'fresh'):
+            with open(os.path.join(temp_dir, name), 'wb') as file:
+                file.write(b'x')
+        os.utime(os.path.join(temp_dir, 'stale'), (0, 0))
+        self.assertEqual(default_storage.collect_garbage(grace=60)['temporary'], 1)
+        self.assertEqual(os.listdir(temp_dir), ['fresh'])
+
+
+class ApplyLikesTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user('user')
+        author = User.objects.create_user('author')
+        self.posts = [Post.objects.create(author=author, text=f'пост {i}') for i in range(3)]
+        self.ids = [post.pk for post in self.posts]
+
+    def counts(self):
+        return list(Post.objects.filter(pk__in=self.ids).order_by('pk').values_list('likes_count', flat=True))
+
+    def test_repeated_batches_are_idempotent(self):
+        batch = [(post_id, True) for post_id in self.ids]
+        apply_likes(self.user.pk, batch)
+        results = apply_likes(self.user.pk, batch)
+        self.assertEqual(self.counts(), [1, 1, 1])
+        self.assertEqual([result.likes_count for result in results], [1, 1, 1])
+        unlike = [(post_id, False) for post_id in self.ids]
+        apply_likes(self.user.pk, unlike)
+        apply_likes(self.user.pk, unlike)
+        self.assertEqual(self.counts(), [0, 0, 0])
+        self.assertFalse(Like.objects.exists())
+
+    def test_overlapping_batches_and_toggle(self):
+        first, second, third = self.ids
+        apply_likes(self.user.pk, [(first, True), (second, True)])
+        toggle_like(self.user.pk, second)
+        apply_likes(self.user.pk, [(second, True), (third, True), (first, False)])
+        toggle_like(self.user.pk, third)
+        apply_likes(self.user.pk, [(third, False), (first, False)])
+        self.assertEqual(self.counts(), [0, 1, 0])
+        self.assertEqual(list(Like.objects.values_list('post_id', flat=True)), [second])
+
+    def test_counters_follow_rows_changed_behind_the_batch(self):
+        first, second, _ = self.ids
+        apply_likes(self.user.pk, [(first, True)])
+        # лайк удалён параллельным запросом, счётчик уже уменьшен им
+        Like.objects.filter(post_id=first).delete()
+        Post.objects.filter(pk=first).update(likes_count=0)
+        # лайк поставлен параллельным запросом, счётчик уже увеличен им
+        Like.objects.create(author=self.user, post_id=second)
+        Post.objects.filter(pk=second).update(likes_count=1)
+        apply_likes(self.user.pk, [(first, False), (second, True)])
+        self.assertEqual(self.counts()[:2], [0, 1])
+
+    def test_last_action_wins_and_missing_posts_are_skipped(self):
+        results = apply_likes(self.user.pk, [(self.ids[0], True), (999999, True), (self.ids[0], False)])
+        self.assertEqual(results, [(self.ids[0], False, 0)])
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        User = get_user_model()
+        self.author = User.objects.create_user('author')
+        self.other = User.objects.create_user('other')
+        self.fans = [User.objects.create_user(f'fan{i}') for i in range(5)]
+        self.post = Post.objects.create(author=self.author, text='пост')
+
+    def run_batches(self, purge, object_id, batch_size):
+        batches = []
+        while True:
+            table, count = purge(object_id, batch_size)
+            if table is None:
+                return batches
+            batches.append((table, count))
+
+    def test_delete_posts_hides_immediately(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(delete_posts([self.post.pk, 999999]), [self.post.pk])
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertTrue(PurgeJob.objects.filter(kind=PurgeJob.Kind.POST, object_id=self.post.pk).exists())
+        self.assertEqual(self.client.get('/api/posts/').json()['results'], [])
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/').status_code, 404)
+
+    def test_delete_user_hides_posts_and_deactivates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_user(self.author)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.is_active)
+        self.assertFalse(Post.objects.filter(author=self.author).exists())
+        self.assertTrue(PurgeJob.objects.filter(kind=PurgeJob.Kind.USER, object_id=self.author.pk).exists())
+        self.assertEqual(self.client.get('/api/posts/').json()['results'], [])
+
+    def test_post_batches_respect_batch_size(self):
+        Like.objects.bulk_create([Like(author=fan, post=self.post) for fan in self.fans])
+        Comment.objects.bulk_create([Comment(author=fan, post=self.post, text='ок') for fan in self.fans[:3]])
+        self.assertEqual(self.run_batches(purge_post_batch, self.post.pk, 2), [
+            ('likes', 2), ('likes', 2), ('likes', 1), ('comments', 2), ('comments', 1), ('posts', 1),
+        ])
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+
+    def test_user_purge_decrements_counters_of_other_posts(self):
+        others = [Post.objects.create(author=self.other, text=f'чужой {i}') for i in range(3)]
+        ids = [post.pk for post in others]
+        apply_likes(self.author.pk, [(post_id, True) for post_id in ids])
+        apply_likes(self.fans[0].pk, [(ids[0], True)])
+        Comment.objects.bulk_create([Comment(author=self.author, post_id=post_id, text='ок') for post_id in ids[:2]])
+        Post.objects.filter(pk__in=ids[:2]).update(comments_count=F('comments_count') + 1)
+        Like.objects.create(author=self.fans[1], post=self.post)
+
+        delete_user(self.author)
+        batches = self.run_batches(purge_user_batch, self.author.pk, 2)
+
+        self.assertEqual(batches, [('likes', 1), ('posts', 1), ('likes', 2), ('likes', 1), ('comments', 2), ('users', 1)])
+        counters = Post.objects.filter(pk__in=ids).order_by('pk').values_list('likes_count', 'comments_count')
+        self.assertEqual(list(counters), [(1, 0), (0, 0), (0, 0)])
+        self.assertEqual(list(Like.objects.values_list('author_id', 'post_id')), [(self.fans[0].pk, ids[0])])
+        self.assertFalse(get_user_model().objects.filter(pk=self.author.pk).exists())
+
+    def test_job_resumes_after_interruption(self):
+        Like.objects.bulk_create([Like(author=fan, post=self.post) for fan in self.fans])
+        delete_posts([self.post.pk])
+        job = claim_job('first')
+        stop = threading.Event()
+
+        status = process_purge_job(job, batch_size=2, pause=0, stop=stop, on_progress=lambda *args: stop.set())
+
+        self.assertEqual(status, PurgeJob.Status.PENDING)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.stage, job.progress, job.attempts), (PurgeJob.Status.PENDING, 'likes', {'likes': 2}, 0))
+        self.assertEqual(Like.objects.count(), 3)
+
+        totals = run_purge_worker(worker_id='second', batch_size=2, pause=0, once=True)
+
+        self.assertEqual(totals[PurgeJob.Status.DONE], 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (PurgeJob.Status.DONE, {'likes': 5, 'posts': 1}))
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+
+
+class PostAdminTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.post = Post.objects.create(author=User.objects.create_user('author'), text='пост')
+        Comment.objects.create(author=self.post.author, post=self.post, text='ок')
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.staff.user_permissions.add(Permission.objects.get(codename='delete_post'))
+        self.model_admin = admin.site._registry[Post]
+
+    def perms_needed(self, user):
+        request = RequestFactory().post('/')
+        request.user = user
+        return self.model_admin.get_deleted_objects([self.post], request)[2]
+
+    def test_perms_needed_include_cascaded_models(self):
+        self.assertEqual(self.perms_needed(self.staff), {Comment._meta.verbose_name})
+        superuser = get_user_model().objects.create_superuser('admin')
+        self.assertEqual(self.perms_needed(superuser), set())
+
+    def test_hidden_posts_are_listed(self):
+        delete_posts([self.post.pk])
+        request = RequestFactory().get('/')
+        request.user = self.staff
+        self.assertEqual(list(self.model_admin.get_queryset(request)), [self.post])
+
+
+class MediaServingTests(TestCase):
+    data = b'0123456789'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.path = os.path.join(media_root, 'notes.txt')
+        with open(self.path, 'wb') as file:
+            file.write(self.data)
+
+    def get(self, **headers):
+        return self.client.get('/media/notes.txt', **headers)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def assertRange(self, header, content, content_range):
+        response = self.get(HTTP_RANGE=header)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.content(response), content)
+        self.assertEqual(response['Content-Range'], content_range)
+        self.assertEqual(response['Content-Length'], str(len(content)))
+
+    def assertWholeFile(self, **headers):
+        response = self.get(**headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.data)
+        self.assertFalse(response.has_header('Content-Range'))
+
+    def assertUnsatisfiable(self, header):
+        response = self.get(HTTP_RANGE=header)
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(self.content(response), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+    def test_ranges(self):
+        self.assertRange('bytes=2-4', b'234', 'bytes 2-4/10')
+        self.assertRange('bytes=7-', b'789', 'bytes 7-9/10')
+        self.assertRange('bytes=8-100', b'89', 'bytes 8-9/10')
+        self.assertRange('bytes=-3', b'789', 'bytes 7-9/10')
+        self.assertRange('bytes=-100', self.data, 'bytes 0-9/10')
+
+    def test_unsatisfiable_ranges(self):
+        self.assertUnsatisfiable('bytes=-0')
+        self.assertUnsatisfiable('bytes=10-')
+        self.assertUnsatisfiable('bytes=50-60')
+
+    def test_ignored_ranges_return_whole_file(self):
+        self.assertWholeFile(HTTP_RANGE='bytes=5-3')
+        self.assertWholeFile(HTTP_RANGE='bytes=0-1,4-5')
+        self.assertWholeFile(HTTP_RANGE='lines=1-2')
+
+    def test_if_range(self):
+        response = self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertRange('bytes=2-4', b'234', 'bytes 2-4/10')
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag).status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=last_modified).status_code, 206)
+        self.assertWholeFile(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"other"')
+        self.assertWholeFile(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='Mon, 01 Jan 2001 00:00:00 GMT')
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        # условный запрос проверяется раньше диапазона
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag'], HTTP_RANGE='bytes=-0').status_code, 304)
+
+    @override_settings(MEDIA_SERVING={'OFFLOAD': 'x-accel-redirect'})
+    def test_accel_redirect_passes_ranges_to_proxy(self):
+        response = self.get(HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/notes.txt')
+        self.assertEqual(response.content, b'')
+        self.assertFalse(response.has_header('Content-Range'))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @override_settings(MEDIA_SERVING={'OFFLOAD': 'x-sendfile'})
+    def test_sendfile(self):
+        response = self.get(HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Sendfile'], self.path)
+        self.assertEqual(response.content, b'')
+
+    def test_rejected_requests(self):
+        self.assertEqual(self.client.post('/media/notes.txt').status_code, 405)
+        self.assertEqual(self.client.get('/media/.tmp/notes.txt').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/missing.txt').status_code, 404)
+
+
+def offset_point(latitude, longitude, north, east):
+    """
+    Точка в `north` и `east` метрах от заданной (для небольших расстояний).
+    """
+    meters_per_degree = math.pi * geo.EARTH_RADIUS / 180
+    return (
+        latitude + north / meters_per_degree,
+        longitude + east / (meters_per_degree * math.cos(math.radians(latitude))),
+    )
+
+
+class GeoTests(TestCase):
+    center = (55.7558, 37.6173)
+
+    def test_encode_known_vectors(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geo.encode(-90, -180, 3), '000')
+        self.assertEqual(len(geo.encode(*self.center)), geo.PRECISION)
+
+    def test_cells_cover_circle(self):
+        points = [self.center, (0.0, 179.9999), (0.0, 0.0), (-33.8688, 151.2093), (69.6492, 18.9553), (89.0, 45.0)]
+        for latitude, longitude in points:
+            for radius in (10, 300, 1000, 5000, 50000):
+                cells = geo.cells_for_radius(latitude, longitude, radius)
+                if not cells:
+                    # без префиксов фильтра нет — покрыто всё
+                    continue
+                for bearing in range(0, 360, 15):
+                    north = radius * 0.999 * math.cos(math.radians(bearing))
+                    east = radius * 0.999 * math.sin(math.radians(bearing))
+                    lat, lon = offset_point(latitude, longitude, north, east)
+                    lon = (lon + 180) % 360 - 180
+                    with self.subTest(point=(latitude, longitude), radius=radius, bearing=bearing):
+                        self.assertTrue(any(geo.encode(lat, lon).startswith(cell) for cell in cells))
+
+    def test_huge_radius_disables_prefix_filter(self):
+        self.assertEqual(geo.cells_for_radius(0, 0, 10_000_000), [])
+
+    def test_nearby_filters_by_radius_and_sorts_by_distance(self):
+        author = get_user_model().objects.create_user('author')
+        offsets = {'далеко': (1500, 0), 'рядом': (200, 0), 'дальше': (-600, -600), 'средне': (0, 600)}
+        posts = {}
+        for text, (north, east) in offsets.items():
+            latitude, longitude = offset_point(*self.center, north, east)
+            post = Post.objects.create(author=author, text=text)
+            Post.objects.filter(pk=post.pk).update(
+                latitude=latitude, longitude=longitude, geohash=geo.encode(latitude, longitude),
+            )
+            posts[text] = post.pk
+        Post.objects.create(author=author, text='без координат')
+
+        response = self.client.get('/api/posts/nearby/', {'lat': self.center[0], 'lon': self.center[1], 'radius': 1000})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            [posts['рядом'], posts['средне'], posts['дальше']],
+        )
+
+
+class DirtyFieldsTests(TestCase):
+    def setUp(self):
+        author = get_user_model().objects.create_user('author')
+        self.post = Post.objects.get(pk=Post.objects.create(author=author, text='пост').pk)
+
+    def update_sql(self, post, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            post.save(**kwargs)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertLessEqual(len(updates), 1)
+        return updates[0] if updates else None
+
+    def test_save_without_changes_writes_nothing(self):
+        self.assertEqual(self.post.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            self.post.save()
+
+    def test_save_writes_only_changed_fields(self):
+        Post.objects.filter(pk=self.post.pk).update(likes_count=5)
+        self.post.text = 'новый текст'
+        sql = self.update_sql(self.post)
+        self.assertIn('"text"', sql)
+        self.assertNotIn('"likes_count"', sql)
+        self.assertNotIn('"location"', sql)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.text, self.post.likes_count), ('новый текст', 5))
+
+    def test_deferred_fields_are_left_out(self):
+        post = Post.objects.only('id', 'text').get(pk=self.post.pk)
+        post.text = 'новый текст'
+        with self.assertNumQueries(1):
+            sql = self.update_sql(post)
+        self.assertNotIn('"location"', sql)
+        self.assertNotIn('"variants"', sql)
+        self.assertEqual(post.get_deferred_fields(), {field.attname for field in Post._meta.concrete_fields} - {'id', 'text'})
+
+    def test_location_change_schedules_geocoding(self):
+        self.post.location = 'Москва'
+        self.post.save()
+        self.assertEqual(self.post.geocoding_status, Post.GeocodingStatus.PENDING)
+        self.assertEqual(GeocodeJob.objects.get(post=self.post).status, GeocodeJob.Status.PENDING)
+        self.assertEqual(self.post.get_dirty_fields(), [])
+
+    def test_refresh_from_db_resets_snapshot(self):
+        Post.objects.filter(pk=self.post.pk).update(text='из базы')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.get_dirty_fields(), [])
+        self.post.text = 'локально'
+        self.post.refresh_from_db(fields=['text'])
+        self.assertEqual(self.post.get_dirty_fields(), [])
+        with self.assertNumQueries(0):
+            self.post.save()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.author = get_user_model().objects.create_user('author')
+        self.posts = [Post.objects.create(author=self.author, text=f'пост {i}') for i in range(7)]
+
+    def page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [post['id'] for post in data['results']], data['next'], data['previous']
+
+    def walk(self, on_page=None):
+        ids, url, pages = [], '/api/posts/?page_size=3', 0
+        while url:
+            page, url, _ = self.page(url)
+            ids += page
+            pages += 1
+            if on_page is not None:
+                on_page(pages)
+        return ids
+
+    def expected(self):
+        return [post.pk for post in sorted(self.posts, key=lambda post: (post.created_at, post.pk), reverse=True)]
+
+    def test_inserts_between_pages_do_not_shift_pages(self):
+        expected = self.expected()
+
+        def insert(pages):
+            Post.objects.create(author=self.author, text=f'новый {pages}')
+
+        self.assertEqual(self.walk(insert), expected)
+
+    def test_equal_timestamps_are_ordered_by_id(self):
+        Post.objects.update(created_at=self.posts[0].created_at)
+        expected = sorted((post.pk for post in self.posts), reverse=True)
+
+        def insert(pages):
+            post = Post.objects.create(author=self.author, text=f'новый {pages}')
+            Post.objects.filter(pk=post.pk).update(created_at=self.posts[0].created_at)
+
+        self.assertEqual(self.walk(insert), expected)
+
+    def test_previous_returns_the_same_page(self):
+        first, next_url, previous = self.page('/api/posts/?page_size=3')
+        self.assertIsNone(previous)
+        Post.objects.create(author=self.author, text='новый')
+        second, _, previous = self.page(next_url)
+        self.assertEqual(second, self.expected()[3:6])
+        self.assertEqual(self.page(previous)[0], first)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/posts/?cursor=abc').status_code, 404)
+
+
+@override_settings(FEED={'CELEBRITY_THRESHOLD': 2, 'FANOUT_BATCH_SIZE': 1, 'BACKFILL_SIZE': 50})
+class TimelineTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        User = get_user_model()
+        self.reader = User.objects.create_user('reader')
+        self.author = User.objects.create_user('author')
+        self.celebrity = User.objects.create_user('celebrity')
+        self.stranger = User.objects.create_user('stranger')
+        follow(self.reader, self.author)
+        follow(self.reader, self.celebrity)
+        follow(User.objects.create_user('fan'), self.celebrity)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=self.reader).key}'}
+
+    def publish(self, author, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=author, text=text).pk
+
+    def entries(self):
+        return sorted(TimelineEntry.objects.filter(user=self.reader).values_list('post_id', flat=True))
+
+    def feed(self, url='/api/feed/'):
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_feed_combines_fan_out_and_pull(self):
+        posts = [self.publish(author, f'пост {i}') for i, author in enumerate([self.author, self.celebrity] * 3)]
+        self.publish(self.stranger, 'чужой')
+        regular, celebrity = posts[::2], posts[1::2]
+
+        self.assertEqual(self.entries(), regular)
+        # посты знаменитости — только в ленте автора
+        self.assertEqual(TimelineEntry.objects.filter(post_id__in=celebrity).count(), 3)
+
+        self.assertEqual([post['id'] for post in self.feed()['results']], posts[::-1])
+        self.assertEqual(self.entries(), posts)
+
+        newest = self.publish(self.celebrity, 'новый')
+        self.assertEqual(self.feed()['results'][0]['id'], newest)
+
+    def test_pull_only_before_first_page(self):
+        posts = [self.publish(self.celebrity, f'пост {i}') for i in range(3)]
+        page = self.feed('/api/feed/?page_size=2')
+        self.assertEqual([post['id'] for post in page['results']], posts[:0:-1])
+        newest = self.publish(self.celebrity, 'новый')
+        self.assertEqual([post['id'] for post in self.feed(page['next'])['results']], posts[:1])
+        self.assertEqual(pull_timeline(self.reader), 1)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, post_id=newest).exists())
+        self.assertEqual(pull_timeline(self.reader), 0)
+
+
+class FastSerializerParityTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        author = User.objects.create_user('author')
+        commenter = User.objects.create_user('commenter')
+        with_everything = Post.objects.create(author=author, text='всё сразу')
+        Post.objects.filter(pk=with_everything.pk).update(
+            image='posts/cover.jpg',
+            variants={'thumb': 'posts/cover_thumb.jpg', 'large': 'posts/cover_large.jpg'},
+            location='Москва',
+            address='Красная площадь, Москва, Россия',
+            latitude='55.753930',
+            longitude='37.620795',
+            geocoding_status=Post.GeocodingStatus.DONE,
+            likes_count=7,
+            comments_count=5,
+        )
+        PostImage.objects.bulk_create([
+            PostImage(post=with_everything, image='posts/images/first.jpg', variants={'thumb': 'posts/images/first_thumb.jpg'}),
+            PostImage(post=with_everything, image='posts/images/second.jpg'),
+        ])
+        Comment.objects.bulk_create([
+            Comment(author=commenter, post=with_everything, text=f'комментарий {i}') for i in range(5)
+        ])
+        location_only = Post.objects.create(author=commenter, text='только адрес')
+        Post.objects.filter(pk=location_only.pk).update(
+            location='Нигде', geocoding_status=Post.GeocodingStatus.FAILED,
+        )
+        Post.objects.create(author=author, text='пустой')
+
+    def render_both(self, **params):
+        request = Request(APIRequestFactory().get('/api/posts/', params))
+        selection = parse_field_selection(request.query_params, PostSerializer)
+        context = {'request': request, 'field_selection': selection}
+        ordering = ('-created_at', '-id')
+        queryset = post_queryset(Post.objects.order_by(*ordering), selection)
+        drf = JSONRenderer().render(PostSerializer(queryset, many=True, context=context).data)
+        serializer = FastPostSerializer(context)
+        fast = JSONRenderer().render(serializer.serialize(Post.objects.order_by(*ordering).values(*serializer.columns())))
+        return drf, fast
+
+    def test_fast_serializer_matches_post_serializer(self):
+        selections = [
+            {},
+            {'expand': 'author'},
+            {'fields': 'id,location,latitude,longitude,geocoding_status'},
+            {'fields': 'image,image_variants,images'},
+            {'fields': 'comments,comments_count', 'expand': 'author'},
+            {'fields': 'author'},
+        ]
+        for params in selections:
+            with self.subTest(**params):
+                drf, fast = self.render_both(**params)
+                self.assertEqual(fast, drf)
+        self.assertIn(b'cover_thumb.jpg', self.render_both()[1])
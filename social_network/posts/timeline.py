@@ -0,0 +1,156 @@
+"""
+Домашняя лента: посты авторов, на которых подписан пользователь.
+
+Лента материализована в таблице `TimelineEntry` (fan-out on write): после создания
+поста он рассылается по лентам подписчиков автора пачками по `FEED['FANOUT_BATCH_SIZE']`,
+поэтому чтение ленты — один индексный запрос по `(user, created_at, post)`.
+
+Посты авторов, у которых подписчиков не меньше `FEED['CELEBRITY_THRESHOLD']`,
+не рассылаются — их ленты подписчиков забирают сами при чтении первой страницы
+(`pull_timeline`), начиная с момента `Follow.pulled_at`.
+
+Рассылка выполняется синхронно в `transaction.on_commit` запроса, создавшего пост,
+без отдельной очереди. Поэтому `CELEBRITY_THRESHOLD` ограничивает и задержку ответа:
+рассылка делает не больше `CELEBRITY_THRESHOLD / FANOUT_BATCH_SIZE` вставок
+(по умолчанию 10 пачек по 1000 строк). У авторов с большим числом подписчиков
+посты забираются при чтении (pull). Если порог поднимают, рассылку нужно переносить
+в фоновый обработчик.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from users.models import Follow
+
+from .models import Post, TimelineEntry
+
+DEFAULTS = {
+    'FANOUT_BATCH_SIZE': 1000,
+    'CELEBRITY_THRESHOLD': 10000,
+    'BACKFILL_SIZE': 50,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'FEED', {}).get(name, DEFAULTS[name])
+
+
+def is_celebrity(followers_count):
+    return followers_count >= get_setting('CELEBRITY_THRESHOLD')
+
+
+def _entries(user_ids, post):
+    return [TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at) for user_id in user_ids]
+
+
+def fan_out(post):
+    """
+    Добавляет пост в ленты автора и его подписчиков.
+    Подписчики выбираются пачками по возрастанию `id` (индекс `following, follower`),
+    каждая пачка вставляется одним `bulk_create`. Посты авторов с большим числом
+    подписчиков попадают только в ленту автора. Возвращает количество лент.
+    """
+    TimelineEntry.objects.bulk_create(_entries([post.author_id], post), ignore_conflicts=True)
+    followers_count = get_user_model().objects.values_list('followers_count', flat=True).get(pk=post.author_id)
+    if is_celebrity(followers_count):
+        return 1
+
+    batch_size = get_setting('FANOUT_BATCH_SIZE')
+    followers = Follow.objects.filter(following_id=post.author_id).order_by('follower_id')
+    last_id, total = 0, 1
+    while True:
+        batch = list(followers.filter(follower_id__gt=last_id).values_list('follower_id', flat=True)[:batch_size])
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(_entries(batch, post), ignore_conflicts=True)
+        total += len(batch)
+        last_id = batch[-1]
+    return total
+
+
+def backfill(user, author_id):
+    """
+    Добавляет в ленту `user` последние `BACKFILL_SIZE` постов автора.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by('-created_at', '-id')[:get_setting('BACKFILL_SIZE')]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=post_id, created_at=created_at)
+         for post_id, created_at in posts.values_list('id', 'created_at')],
+        ignore_conflicts=True,
+    )
+
+
+def follow(user, author):
+    """
+    Подписывает `user` на `author` и добавляет последние посты автора в ленту.
+    Возвращает `(создана ли подписка, количество подписчиков автора)`.
+    """
+    User = get_user_model()
+    created = False
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=user, following=author)
+            created = True
+        except IntegrityError:
+            pass
+        if created:
+            User.objects.filter(pk=author.pk).update(followers_count=F('followers_count') + 1)
+            backfill(user, author.pk)
+        followers_count = User.objects.values_list('followers_count', flat=True).get(pk=author.pk)
+    return created, followers_count
+
+
+def unfollow(user, author):
+    """
+    Отписывает `user` от `author` и убирает посты автора из ленты.
+    Возвращает `(была ли подписка, количество подписчиков автора)`.
+    """
+    User = get_user_model()
+    with transaction.atomic():
+        deleted = Follow.objects.filter(follower=user, following=author).delete()[0] > 0
+        if deleted:
+            User.objects.filter(pk=author.pk).update(followers_count=F('followers_count') - 1)
+            TimelineEntry.objects.filter(user=user, post__author=author).delete()
+        followers_count = User.objects.values_list('followers_count', flat=True).get(pk=author.pk)
+    return deleted, followers_count
+
+
+def pull_timeline(user):
+    """
+    Переносит в ленту `user` новые посты авторов с большим числом подписчиков
+    (они не рассылаются при публикации). Для каждой такой подписки берутся посты
+    новее `Follow.pulled_at` (или даты подписки), не больше `BACKFILL_SIZE` на автора.
+    Если таких подписок нет, выполняется один запрос. Возвращает количество перенесённых постов.
+    """
+    follows = list(
+        Follow.objects
+        .filter(follower=user, following__followers_count__gte=get_setting('CELEBRITY_THRESHOLD'))
+        .values_list('id', 'following_id', 'created_at', 'pulled_at')
+    )
+    if not follows:
+        return 0
+
+    condition = Q()
+    for _, author_id, created_at, pulled_at in follows:
+        condition |= Q(author_id=author_id, created_at__gt=pulled_at or created_at)
+    limit = get_setting('BACKFILL_SIZE') * len(follows)
+    posts = list(
+        Post.objects.filter(condition).order_by('-created_at', '-id').values_list('id', 'author_id', 'created_at')[:limit]
+    )
+    if not posts:
+        return 0
+
+    newest = {}
+    for _, author_id, created_at in posts:
+        newest[author_id] = max(created_at, newest.get(author_id, created_at))
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=user, post_id=post_id, created_at=created_at) for post_id, _, created_at in posts],
+            ignore_conflicts=True,
+        )
+        for follow_id, author_id, _, _ in follows:
+            if author_id in newest:
+                Follow.objects.filter(pk=follow_id).update(pulled_at=newest[author_id])
+    return len(posts)
@@ -1,15 +1,57 @@
+import re
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiResponse, extend_schema, extend_schema_view
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.generics import ListAPIView
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from .models import Like, Post, PostImage
+from social_network.db_router import ReplicaReadMixin
+
+from .cache import CachedResponseMixin, invalidate_post, invalidate_posts
+from .export import EXPORT_TYPES, NDJSONRenderer, export_stream, export_until
+from .fast_serializers import FastReadMixin
+from .fieldsets import FIELD_SELECTION_PARAMETERS, FieldSelectionMixin, post_queryset
+from .geo import cells_for_radius, distance_expression
+from .images import ingest_images
+from .likes import apply_likes, toggle_like
+from .models import Comment, Post, PostImage, TimelineEntry
+from .pagination import FeedPagination, KeysetPagination, SearchPagination
 from .permissions import IsOwnerOrReadOnly
-from .serializers import CommentSerializer, PostSerializer, PostWriteSerializer
+from .purge import delete_posts
+from .search import search_posts
+from .serializers import (
+    CommentSerializer,
+    ExportQuerySerializer,
+    LikeBatchSerializer,
+    NearbyPostSerializer,
+    NearbyQuerySerializer,
+    PostSerializer,
+    PostWriteSerializer,
+)
+from .timeline import pull_timeline
+
+ACCEPTS_GZIP_RE = re.compile(r'\bgzip\b')
 
 
-class PostViewSet(ModelViewSet):
+@extend_schema_view(
+    list=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
+    retrieve=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
+    search=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
+    nearby=extend_schema(parameters=FIELD_SELECTION_PARAMETERS),
+)
+class PostViewSet(ReplicaReadMixin, FieldSelectionMixin, CachedResponseMixin, FastReadMixin, ModelViewSet):
     """
     ViewSet для управления постами.
     Позволяет:
@@ -17,20 +59,30 @@ class PostViewSet(ModelViewSet):
     - Создавать, редактировать и удалять свои посты
     - Оставлять комментарии и ставить лайки (только авторизованные пользователи)
 
+    Ответы списка и деталей кешируются с ETag (см. `posts.cache`).
+    GET-запросы постов принимают `?fields=` и `?expand=author` (см. `posts.fieldsets`).
+    Список и детали сериализуются без `PostSerializer` (см. `posts.fast_serializers`).
+    GET-запросы читают из реплики, если она настроена (см. `social_network.db_router`).
+
     ## Эндпоинты:
-    - `GET /posts/` — получить список всех постов
+    - `GET /posts/` — получить список постов (курсорная пагинация, сначала новые)
     - `GET /posts/{id}/` — получить детали поста
     - `POST /posts/` — создать пост (только авторизованные)
     - `PUT/PATCH /posts/{id}/` — редактировать пост (только автор)
-    - `DELETE /posts/{id}/` — удалить пост (только автор)
+    - `DELETE /posts/{id}/` — удалить пост (только автор); пост сразу скрывается,
+      комментарии, лайки и изображения удаляет фоновый воркер (см. `posts.purge`)
 
     ## Вложенные действия:
+    - `GET /posts/{id}/comments/` — получить комментарии поста (курсорная пагинация, сначала новые)
     - `POST /posts/{id}/comment/` — оставить комментарий (только авторизованный)
     - `POST /posts/{id}/like/` — поставить или убрать лайк (только авторизованный)
+    - `POST /posts/likes/` — применить пачку операций с лайками (только авторизованный)
+    - `GET /posts/search/?q=` — полнотекстовый поиск по постам и комментариям
+    - `GET /posts/nearby/?lat=&lon=&radius=` — посты в радиусе от точки, сначала ближайшие
     """
-    queryset = Post.objects.prefetch_related('comments', 'likes', 'images').all()
-    # queryset = Post.objects.prefetch_related('comments', 'likes').all()  # для одного image
+    queryset = Post.objects.all()
     permission_classes = []
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         """
@@ -38,8 +90,12 @@ class PostViewSet(ModelViewSet):
         """
         if self.action in ['create', 'update', 'partial_update']:
             return PostWriteSerializer
-        elif self.action == 'comment':
+        elif self.action in ['comment', 'comments']:
             return CommentSerializer
+        elif self.action == 'likes':
+            return LikeBatchSerializer
+        elif self.action == 'nearby':
+            return NearbyPostSerializer
         return PostSerializer
 
     def get_permissions(self):
@@ -52,6 +108,58 @@ class PostViewSet(ModelViewSet):
             return [IsAuthenticated()]
         return super().get_permissions()
 
+    @action(detail=True, methods=['get'], url_path='comments')
+    def comments(self, request, pk=None):
+        """
+        Возвращает комментарии поста постранично, сначала новые.
+        """
+        post = self.get_object()
+        page = self.paginate_queryset(Comment.objects.filter(post=post))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='search', pagination_class=SearchPagination)
+    def search(self, request):
+        """
+        Полнотекстовый поиск по тексту постов и комментариев (`?q=`),
+        сначала наиболее релевантные (см. `posts.search`).
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Укажите поисковый запрос'})
+        queryset = search_posts(post_queryset(Post.objects.all(), self.get_field_selection()), query)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='nearby', pagination_class=SearchPagination)
+    def nearby(self, request):
+        """
+        Возвращает посты в радиусе `radius` метров от точки (`lat`, `lon`), сначала ближайшие.
+        Кандидаты отбираются по префиксам геохеша (индекс `Post.geohash`) в ячейке точки
+        и соседних, затем фильтруются и сортируются по точному расстоянию (гаверсинус).
+        """
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        lat, lon, radius = (params.validated_data[name] for name in ('lat', 'lon', 'radius'))
+
+        queryset = post_queryset(Post.objects.filter(geohash__isnull=False), self.get_field_selection())
+        cells = cells_for_radius(lat, lon, radius)
+        if cells:
+            condition = Q()
+            for cell in cells:
+                condition |= Q(geohash__startswith=cell)
+            queryset = queryset.filter(condition)
+        queryset = (
+            queryset
+            .annotate(distance=distance_expression(lat, lon))
+            .filter(distance__lte=radius)
+            .order_by('distance', 'id')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post'], url_path='comment', permission_classes=[IsAuthenticated])
     def comment(self, request, pk=None):
         """
@@ -61,7 +169,9 @@ class PostViewSet(ModelViewSet):
         post = self.get_object()
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(author=request.user, post=post)
+        with transaction.atomic():
+            serializer.save(author=request.user, post=post)
+            Post.objects.filter(pk=post.pk).update(comments_count=F('comments_count') + 1)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], url_path='like', permission_classes=[IsAuthenticated])
@@ -70,26 +180,52 @@ class PostViewSet(ModelViewSet):
         Ставит или убирает лайк на посте.
         Если пользователь уже лайкнул пост — лайк будет удалён (unlike).
         Иначе — добавлен.
+        Переключение и обновление счётчика выполняются одним атомарным запросом (см. `toggle_like`).
         """
-        post = self.get_object()
-        user = request.user
-        like_obj, created = Like.objects.get_or_create(author=user, post=post)
-        if not created:
-            like_obj.delete()
-            return Response({"status": "unliked"}, status=status.HTTP_200_OK)
-        return Response({"status": "liked"}, status=status.HTTP_200_OK)
+        try:
+            result = toggle_like(request.user.pk, int(pk))
+        except (ValueError, Post.DoesNotExist):
+            raise NotFound
+        invalidate_post(result.post_id)
+        return Response(
+            {"status": "liked" if result.liked else "unliked", "likes_count": result.likes_count},
+            status=status.HTTP_200_OK
+        )
 
+    @action(detail=False, methods=['post'], url_path='likes', permission_classes=[IsAuthenticated])
+    def likes(self, request):
+        """
+        Применяет пачку операций с лайками текущего пользователя
+        (например, действия, накопленные клиентом офлайн).
+        Операции идемпотентны: `like` ставит лайк, `unlike` убирает;
+        для повторяющегося поста учитывается последняя операция.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        actions = [(item['post'], item['action'] == 'like') for item in serializer.validated_data['actions']]
+        results = apply_likes(request.user.pk, actions)
+        found = {result.post_id for result in results}
+        invalidate_posts(found)
+        return Response({
+            "results": [
+                {"post": result.post_id, "status": "liked" if result.liked else "unliked", "likes_count": result.likes_count}
+                for result in results
+            ],
+            "not_found": sorted({post_id for post_id, _ in actions} - found),
+        }, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post', 'delete'], url_path='images', permission_classes=[IsOwnerOrReadOnly])
     def add_images(self, request, pk=None):
         """
-        POST: Добавляет новые изображения к посту.
+        POST: Добавляет новые изображения к посту (пакетно, см. `ingest_images`).
         DELETE: Удаляет все изображения у поста.
         """
         if request.method == 'POST':
-            images_data = request.FILES.getlist('images')
-            for image in images_data:
-                PostImage.objects.create(post=self.get_object(), image=image)
+            post = self.get_object()
+            try:
+                ingest_images(post, request.FILES.getlist('images'))
+            except DjangoValidationError as e:
+                raise ValidationError({'images': e.messages})
             return Response({"status": "Изображения добавлены"}, status=status.HTTP_201_CREATED)
 
         elif request.method == 'DELETE':
@@ -110,13 +246,89 @@ class PostViewSet(ModelViewSet):
         image.delete()
         return Response({"status": "Изображение удалено"}, status=status.HTTP_204_NO_CONTENT)
 
+    def perform_destroy(self, instance):
+        delete_posts([instance.pk])
+
     def get_queryset(self):
         """
-        Возвращает QuerySet постов в зависимости от аутентификации пользователя.
-        Аноним: все посты доступны только на чтение.
-        Авторизованный: может редактировать/удалять только свои посты.
+        Возвращает QuerySet постов в зависимости от действия.
+        Для списка и деталей загружаются только колонки и связи, нужные запрошенным
+        полям (см. `post_queryset`). Остальным действиям нужен только сам пост.
         """
-        user = self.request.user
-        if user.is_authenticated:
-            return Post.objects.prefetch_related('comments', 'likes')
-        return Post.objects.prefetch_related('comments', 'likes').all()
+        if self.action not in ['list', 'retrieve']:
+            return Post.objects.all()
+        return post_queryset(Post.objects.all(), self.get_field_selection())
+
+
+@extend_schema_view(get=extend_schema(parameters=FIELD_SELECTION_PARAMETERS))
+class FeedView(FieldSelectionMixin, ListAPIView):
+    """
+    Домашняя лента текущего пользователя: его посты и посты авторов,
+    на которых он подписан, сначала новые (курсорная пагинация).
+
+    Страница читается одним индексным запросом к материализованной ленте
+    (`TimelineEntry`, см. `posts.timeline`); записи удалённых постов, ещё не убранные
+    воркером `posts.purge`, пропускаются. Перед первой страницей в ленту
+    переносятся новые посты авторов с большим числом подписчиков.
+
+    ## Эндпоинты:
+    - `GET /feed/` — получить ленту (только авторизованный)
+    """
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        return post_queryset(
+            TimelineEntry.objects.filter(user=self.request.user, post__deleted_at__isnull=True).select_related('post'),
+            self.get_field_selection(),
+            prefix='post__',
+            required=('created_at',),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            pull_timeline(request.user)
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer([entry.post for entry in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class ExportView(APIView):
+    """
+    Потоковая выгрузка постов, комментариев и лайков в NDJSON (см. `posts.export`).
+    Память сервера не зависит от объёма выгрузки. Если клиент принимает gzip
+    (`Accept-Encoding`), поток сжимается. В заголовке `X-Export-Until` — верхняя
+    граница времени выгрузки: её можно передать как `since` следующего запуска.
+
+    ## Эндпоинты:
+    - `GET /export/?type=&author=&since=&until=` — выгрузка (только администратор)
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [JSONRenderer, NDJSONRenderer]
+
+    @extend_schema(
+        parameters=[ExportQuerySerializer],
+        responses={(200, 'application/x-ndjson'): OpenApiResponse(OpenApiTypes.STR, description='Записи NDJSON')},
+    )
+    def get(self, request):
+        serializer = ExportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        until = export_until(params.get('until'))
+        use_gzip = bool(ACCEPTS_GZIP_RE.search(request.headers.get('Accept-Encoding', '')))
+        response = StreamingHttpResponse(
+            export_stream(
+                gzip=use_gzip,
+                types=params.get('type') or set(EXPORT_TYPES),
+                authors=params.get('author'),
+                since=params.get('since'),
+                until=until,
+            ),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['X-Export-Until'] = until.isoformat()
+        return response
@@ -0,0 +1,125 @@
+"""
+Чтение из реплик PostgreSQL с «чтением своих записей».
+
+`PrimaryReplicaRouter` (настройка `DATABASE_ROUTERS`) направляет все записи в `default`,
+а чтения — в базу, выбранную для текущего запроса (контекстная переменная). По умолчанию
+это тоже `default`; реплику выбирают только безопасные запросы (GET, HEAD, OPTIONS)
+представлений с `ReplicaReadMixin` (`PostViewSet`), случайно из `DATABASE_ROUTING['REPLICAS']`.
+
+Реплика отстаёт от основной базы, поэтому после успешного изменяющего запроса
+пользователь на `DATABASE_ROUTING['REPLICA_LAG']` секунд «прилипает» к основной базе
+(`pin_to_primary`): свой пост, комментарий или лайк он увидит сразу. Отметки хранятся
+в кеше `DATABASE_ROUTING['CACHE_ALIAS']` — для нескольких процессов нужен общий бэкенд.
+
+Без реплик в настройках маршрутизатор ничего не меняет.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+DEFAULTS = {
+    'REPLICAS': [],
+    'REPLICA_LAG': 5,
+    'CACHE_ALIAS': 'default',
+    'KEY_PREFIX': 'db-primary',
+}
+
+_read_database = ContextVar('read_database', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'DATABASE_ROUTING', {}).get(name, DEFAULTS[name])
+
+
+def current_read_database():
+    """
+    Реплика, из которой читает текущий запрос, или `None` — основная база.
+    """
+    return _read_database.get()
+
+
+def _pin_key(user_id):
+    return f'{get_setting("KEY_PREFIX")}:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """
+    Направляет чтения пользователя в основную базу на время отставания реплик.
+    """
+    if get_setting('REPLICAS'):
+        caches[get_setting('CACHE_ALIAS')].set(_pin_key(user_id), 1, get_setting('REPLICA_LAG'))
+
+
+def is_pinned(user_id):
+    return caches[get_setting('CACHE_ALIAS')].get(_pin_key(user_id)) is not None
+
+
+def choose_replica(user):
+    """
+    Случайная реплика или `None`, если реплик нет или пользователь недавно что-то изменил.
+    """
+    replicas = get_setting('REPLICAS')
+    if not replicas or (user.is_authenticated and is_pinned(user.pk)):
+        return None
+    return random.choice(replicas)
+
+
+@contextmanager
+def read_from(alias):
+    """
+    Чтения внутри блока идут в `alias` (`None` — основная база).
+    """
+    token = _read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_database.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Записи — всегда в `default` (в том числе для объектов, прочитанных из реплики),
+    чтения — в базу текущего запроса. Миграции применяются только к основной базе.
+    """
+    def db_for_read(self, model, **hints):
+        return _read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_setting('REPLICAS')
+
+
+class ReplicaReadMixin:
+    """
+    Примесь к APIView: безопасные запросы читают из реплики (после аутентификации,
+    чтобы учесть «прилипание» пользователя), успешные изменяющие — прилепляют
+    пользователя к основной базе. Должна стоять левее примесей, читающих данные
+    в `finalize_response`.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        # в потоке WSGI контекст общий для всех запросов — значение сбрасывается в конце каждого
+        with read_from(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            _read_database.set(choose_replica(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and user and user.is_authenticated:
+            pin_to_primary(user.pk)
+        return response
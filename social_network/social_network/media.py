@@ -0,0 +1,176 @@
+"""
+Раздача загруженных файлов (`MEDIA_URL`) в продакшене.
+
+Django проверяет путь, отвечает на условные запросы (`ETag`/`Last-Modified` → 304)
+и выставляет `Cache-Control`: файлы контентно-адресуемого хранилища (`posts.storage`)
+не меняются и кешируются на год с `immutable`, остальные — на `MEDIA_SERVING['MAX_AGE']`.
+
+Передачу содержимого лучше отдать фронтовому прокси (`MEDIA_SERVING['OFFLOAD']`):
+
+- `x-accel-redirect` — nginx, нужна internal-location, указывающая на `MEDIA_ROOT`:
+  `location /protected-media/ { internal; alias /path/to/media/; }`;
+- `x-sendfile` — Apache (mod_xsendfile), lighttpd.
+
+С прокси Django проверяет путь и условные заголовки и возвращает только заголовки ответа;
+запросы диапазонов (`Range`, `If-Range`) тоже передаются прокси, и он сам отвечает
+206 или 416 — Django файл не читает.
+
+Без прокси файл отдаёт `FileResponse`: WSGI-сервер с `wsgi.file_wrapper` (gunicorn,
+uWSGI) передаёт его через `os.sendfile` без копирования в Python. Запрос одного
+диапазона (`Range: bytes=…`, с учётом `If-Range`) получает 206 и только нужные байты;
+несколько диапазонов в одном запросе не поддерживаются — отдаётся весь файл.
+
+ETag формируется как у nginx (`"<mtime>-<размер>"` в hex), поэтому совпадает
+при отдаче и через Django, и через прокси.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.urls import re_path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+DEFAULTS = {
+    'OFFLOAD': None,
+    'ACCEL_LOCATION': '/protected-media/',
+    'MAX_AGE': 60 * 60,
+    'IMMUTABLE_MAX_AGE': 60 * 60 * 24 * 365,
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+UNSATISFIABLE = object()
+
+
+def get_setting(name):
+    return getattr(settings, 'MEDIA_SERVING', {}).get(name, DEFAULTS[name])
+
+
+def parse_range(header, size):
+    """
+    Диапазон из заголовка `Range` как `(начало, конец)` включительно,
+    `UNSATISFIABLE` — если он за пределами файла, `None` — отдать файл целиком
+    (заголовка нет, несколько диапазонов или неверный синтаксис).
+    """
+    match = RANGE_RE.fullmatch(header.strip()) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # последние `end` байт
+        length = int(end)
+        return (max(size - length, 0), size - 1) if length and size else UNSATISFIABLE
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        return UNSATISFIABLE
+    return (start, end) if start <= end else None
+
+
+def if_range_matches(request, etag, last_modified):
+    header = request.headers.get('If-Range')
+    if not header:
+        return True
+    if header.startswith(('"', 'W/')):
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+
+def read_range(path, start, length, chunk_size):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def cache_control(name):
+    is_content_name = getattr(default_storage, 'is_content_name', None)
+    if is_content_name is not None and is_content_name(name):
+        return f'public, max-age={get_setting("IMMUTABLE_MAX_AGE")}, immutable'
+    return f'public, max-age={get_setting("MAX_AGE")}'
+
+
+def serve_media(request, path):
+    """
+    Отдаёт файл `MEDIA_ROOT/<path>` (см. описание модуля). С `MEDIA_SERVING['OFFLOAD']`
+    любые запросы, включая запросы диапазонов, после проверки передаются прокси.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    # скрытые каталоги — временные файлы хранилища
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404
+    try:
+        full_path = default_storage.path(path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+
+    last_modified = int(info.st_mtime)
+    etag = quote_etag(f'{last_modified:x}-{info.st_size:x}')
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    response = HttpResponse(content_type=content_type, headers=headers)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+    if conditional is not response:
+        return conditional
+
+    # передача через прокси — до разбора Range: диапазоны (206/416) прокси обрабатывает сам
+    offload = get_setting('OFFLOAD')
+    if offload == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = get_setting('ACCEL_LOCATION') + quote(path)
+        return response
+    if offload == 'x-sendfile':
+        response['X-Sendfile'] = full_path
+        return response
+    if request.method == 'HEAD':
+        response['Content-Length'] = info.st_size
+        return response
+
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers.get('Range'), info.st_size)
+    if byte_range is UNSATISFIABLE:
+        return HttpResponse(status=416, headers={'Content-Range': f'bytes */{info.st_size}'})
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            read_range(full_path, start, length, get_setting('CHUNK_SIZE')),
+            status=206,
+            content_type=content_type,
+            headers=headers,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{info.st_size}'
+        response['Content-Length'] = length
+        return response
+    return FileResponse(open(full_path, 'rb'), content_type=content_type, headers=headers)
+
+
+def media_urlpatterns():
+    """
+    Маршрут раздачи `MEDIA_URL` — подключается и без `DEBUG`, в отличие от
+    `django.conf.urls.static`; пусто, если `MEDIA_URL` указывает на другой хост (CDN).
+    """
+    prefix = settings.MEDIA_URL
+    if not prefix or urlsplit(prefix).netloc:
+        return []
+    return [re_path(rf'^{re.escape(prefix.lstrip("/"))}(?P<path>.+)$', serve_media, name='media')]
@@ -0,0 +1,141 @@
+"""
+Профилирование запросов: число SQL-запросов, время в БД, сериализации и рендеринга.
+
+Для доли запросов `REQUEST_PROFILING['SAMPLE_RATE']` middleware:
+
+- добавляет заголовок `Server-Timing` (`db`, `serialize`, `render`, `total`),
+  который показывают инструменты разработчика браузера, — только в режиме `DEBUG`
+  и в ответах администраторам (`is_staff`), чтобы не раскрывать клиентам
+  время работы БД и число запросов;
+- пишет строку JSON в логгер `social_network.requests` (уровень INFO);
+- ищет формы SQL-запросов, повторённые не меньше `N_PLUS_ONE_THRESHOLD` раз
+  (вероятные N+1), и пишет их в лог с уровнем WARNING.
+
+Остальные запросы обрабатываются без замеров, поэтому при небольшой доле
+middleware можно оставлять включённым в продакшене.
+"""
+import json
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .profiling import RequestProfile
+
+logger = logging.getLogger('social_network.requests')
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.05,
+    'SERVER_TIMING': True,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'REQUEST_PROFILING', {}).get(name, DEFAULTS[name])
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestProfilingMiddleware:
+    """
+    Замеряет выбранные запросы (см. описание модуля). Должен стоять первым в `MIDDLEWARE`,
+    чтобы учитывать запросы к БД остальных middleware. Работает и в синхронном,
+    и в асинхронном режиме, поэтому не заставляет ASGI выполнять запросы в потоке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = self.sample(request)
+        if profile is None:
+            return self.get_response(request)
+        with self.instrument(profile):
+            response = self.get_response(request)
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        profile = self.sample(request)
+        if profile is None:
+            return await self.get_response(request)
+        # соединения контекстные, поэтому обёртки действуют и в потоках sync_to_async этого запроса
+        with self.instrument(profile):
+            response = await self.get_response(request)
+        self.report(request, response, profile)
+        return response
+
+    def sample(self, request):
+        """
+        Возвращает `RequestProfile`, если запрос попал в выборку, иначе `None`.
+        """
+        sample_rate = get_setting('SAMPLE_RATE')
+        if sample_rate <= 0 or random.random() >= sample_rate:
+            return None
+        request.profile = RequestProfile()
+        return request.profile
+
+    @contextmanager
+    def instrument(self, profile):
+        with ExitStack() as stack:
+            stack.enter_context(profile.activate())
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            yield
+
+    def process_template_response(self, request, response):
+        """
+        Засекает рендеринг ответа DRF (он выполняется после всех `process_template_response`).
+        """
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            profile.start('render')
+            response.add_post_render_callback(lambda rendered: profile.stop('render'))
+        return response
+
+    def show_server_timing(self, request):
+        """
+        Отдавать ли замеры клиенту: `SERVER_TIMING` включён, и это режим отладки
+        или запрос администратора.
+        """
+        if not get_setting('SERVER_TIMING'):
+            return False
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    def report(self, request, response, profile):
+        total = profile.elapsed()
+        repeated = profile.repeated_queries(get_setting('N_PLUS_ONE_THRESHOLD'))
+        if self.show_server_timing(request):
+            metrics = [f'db;dur={_ms(profile.db_time)};desc="{profile.queries} queries"']
+            metrics += [f'{name};dur={_ms(seconds)}' for name, seconds in sorted(profile.sections.items())]
+            metrics.append(f'total;dur={_ms(total)}')
+            response.headers['Server-Timing'] = ', '.join(metrics)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': _ms(total),
+            'queries': profile.queries,
+            'db_ms': _ms(profile.db_time),
+            **{f'{name}_ms': _ms(seconds) for name, seconds in sorted(profile.sections.items())},
+        }
+        if repeated:
+            record['n_plus_one'] = [{'sql': shape, 'count': count} for shape, count in repeated]
+            logger.warning(json.dumps(record, ensure_ascii=False), extra={'profile': record})
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False), extra={'profile': record})
@@ -0,0 +1,141 @@
+"""
+Замеры одного запроса: SQL-запросы, время в БД и время отдельных этапов (сериализация, рендеринг).
+
+`RequestProfilingMiddleware` (см. `social_network.middleware`) создаёт `RequestProfile`
+для выбранных запросов и делает его текущим (`current_profile()`); код приложения
+отмечает этапы через `section(name)`, `RequestProfile.start`/`stop` или `ProfiledSerializerMixin`.
+Если запрос не профилируется, `current_profile()` возвращает `None`, и замеры не выполняются.
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('request_profile', default=None)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?|\$\d+|NULL)\s*,?)+\)', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Форма запроса: литералы, числа и списки `IN (...)` заменены, пробелы схлопнуты.
+    Запросы, отличающиеся только параметрами, получают одну форму.
+    """
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def current_profile():
+    return _current.get()
+
+
+@contextmanager
+def section(name):
+    """
+    Этап `name` текущего профиля запроса; без профиля ничего не делает.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    with profile.section(name):
+        yield
+
+
+class RequestProfile:
+    """
+    Замеры одного запроса.
+
+    ## Поля:
+    - `queries`: Количество SQL-запросов
+    - `db_time`: Суммарное время выполнения SQL, секунды
+    - `sections`: Время этапов `{name: секунды}` без учёта SQL внутри этапа
+    - `statements`: Счётчик текстов SQL-запросов (для поиска N+1)
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = Counter()
+        self.statements = Counter()
+        self._depth = Counter()
+        self._open = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Обёртка для `connection.execute_wrapper`.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def start(self, name):
+        """
+        Начинает этап `name`. Вложенные этапы с тем же именем не учитываются повторно.
+        """
+        self._depth[name] += 1
+        if self._depth[name] == 1:
+            self._open[name] = (time.perf_counter(), self.db_time)
+
+    def stop(self, name):
+        """
+        Завершает этап `name`; время SQL внутри этапа вычитается.
+        """
+        self._depth[name] -= 1
+        if self._depth[name] == 0:
+            started, db_time = self._open.pop(name)
+            self.sections[name] += time.perf_counter() - started - (self.db_time - db_time)
+
+    @contextmanager
+    def section(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def repeated_queries(self, threshold):
+        """
+        Формы запросов, выполненных не меньше `threshold` раз: [(форма, количество)], частые первыми.
+        """
+        shapes = Counter()
+        for sql, count in self.statements.items():
+            shapes[normalize_sql(sql)] += count
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+class ProfiledSerializerMixin:
+    """
+    Примесь к сериализатору DRF: время `to_representation` учитывается в этапе `serialize`
+    текущего профиля запроса.
+    """
+    def to_representation(self, instance):
+        profile = _current.get()
+        if profile is None:
+            return super().to_representation(instance)
+        profile.start('serialize')
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.stop('serialize')
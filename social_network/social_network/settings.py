@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_network.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -87,8 +88,36 @@ DATABASES = {
         'USER': 'postgres',
         'PASSWORD': '1',
         'HOST': 'localhost',
-        'PORT': 5432
-    }
+        'PORT': 5432,
+        # постоянные соединения: одно на поток, переоткрывается через 60 с простоя
+        # или если перестало отвечать. Под ASGI (асинхронные представления) ставьте 0
+        # и пул на стороне PgBouncer (transaction pooling)
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # реплика только для чтения (потоковая репликация PostgreSQL), добавьте её алиас
+    # в DATABASE_ROUTING['REPLICAS']:
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'netology_diplom',
+    #     'USER': 'postgres',
+    #     'PASSWORD': '1',
+    #     'HOST': 'replica.local',
+    #     'PORT': 5432,
+    #     'CONN_MAX_AGE': 60,
+    #     'CONN_HEALTH_CHECKS': True,
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+# Чтения GET-запросов PostViewSet — из реплик, записи — в default (см. social_network/db_router.py)
+DATABASE_ROUTERS = ['social_network.db_router.PrimaryReplicaRouter']
+
+DATABASE_ROUTING = {
+    'REPLICAS': [],  # алиасы из DATABASES; пусто — всё читается из default
+    'REPLICA_LAG': 5,  # секунды; столько после своей записи пользователь читает из default
+    'CACHE_ALIAS': 'default',  # отметки «прилипания»; для нескольких процессов — общий бэкенд
+    'KEY_PREFIX': 'db-primary',
 }
 
 
@@ -132,6 +161,26 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Раздача MEDIA_URL (см. social_network/media.py)
+MEDIA_SERVING = {
+    'OFFLOAD': None,  # None — отдаёт Django; 'x-accel-redirect' — nginx; 'x-sendfile' — Apache, lighttpd
+    'ACCEL_LOCATION': '/protected-media/',  # internal-location nginx с alias на MEDIA_ROOT
+    'MAX_AGE': 60 * 60,  # секунды; для файлов вне контентно-адресуемого каталога
+    'IMMUTABLE_MAX_AGE': 60 * 60 * 24 * 365,  # файлы под хешем содержимого
+}
+
+# Загрузки хранятся под хешем содержимого с подсчётом ссылок (см. posts/storage.py):
+# одинаковые файлы не дублируются, URL неизменяемы
+STORAGES = {
+    'default': {
+        'BACKEND': 'posts.storage.ContentAddressedStorage',
+        'OPTIONS': {'directory': 'content'},
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -139,13 +188,112 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'posts.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Кеш аутентификации по токену (см. users/authentication.py), статистика — GET /api/stats/
+TOKEN_AUTH = {
+    'CACHE_SIZE': 10000,  # токенов в LRU-кеше процесса
+    'TTL': 60,  # секунды; столько запись может жить в процессе после отзыва токена в другом процессе
+    'SHARED_CACHE': None,  # алиас из CACHES для общего уровня (Redis, Memcached) или None
+    'SHARED_TTL': 300,  # секунды
+    'KEY_PREFIX': 'auth-token',
+}
+
+# Профилирование запросов (см. social_network/middleware.py): заголовок Server-Timing,
+# строка JSON в логгере social_network.requests, предупреждения о вероятных N+1
+REQUEST_PROFILING = {
+    'SAMPLE_RATE': 0.05,  # доля профилируемых запросов; 1.0 — все (локальная отладка), 0 — отключить
+    'SERVER_TIMING': True,  # заголовок только при DEBUG и для is_staff; False — не отдавать никому
+    'N_PLUS_ONE_THRESHOLD': 5,  # столько одинаковых по форме запросов за запрос — вероятный N+1
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Кеш ответов списка и деталей постов (см. posts/cache.py).
+# Для нескольких процессов нужен общий бэкенд в CACHES (Redis, Memcached, файловый кеш)
+POSTS_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 300,  # секунды
+    'KEY_PREFIX': 'posts',
+}
+
+# Уменьшенные копии загружаемых изображений (см. posts/images.py)
+IMAGE_VARIANTS = {
+    'SIZES': {'thumb': 160, 'medium': 640, 'large': 1280},  # максимальная сторона, px
+    'FORMAT': 'WEBP',  # WEBP или JPEG
+    'QUALITY': {'thumb': 70, 'medium': 80, 'large': 85},
+    'WORKERS': 2,  # процессов в пуле; 0 — обработка в текущем процессе
+    'ON_UPLOAD': True,  # False — только командой generate_image_variants
+}
+
+# Домашняя лента GET /api/feed/ (см. posts/timeline.py)
+FEED = {
+    'FANOUT_BATCH_SIZE': 1000,  # подписчиков на один INSERT при рассылке поста
+    'CELEBRITY_THRESHOLD': 10000,  # с этого числа подписчиков посты не рассылаются, а забираются при чтении; ограничивает синхронную рассылку в on_commit
+    'BACKFILL_SIZE': 50,  # последних постов автора добавляется в ленту при подписке
+}
+
+# Полнотекстовый поиск GET /api/posts/search/ (см. posts/search.py)
+SEARCH = {
+    'ENGINE': None,  # None — PostgresSearchEngine на PostgreSQL, иначе SimpleSearchEngine
+    'CONFIG': 'russian',  # конфигурация текстового поиска PostgreSQL
+    'MAX_TERMS': 10,  # слов запроса для SimpleSearchEngine
+    'MAX_DOCUMENT_LENGTH': 200000,  # символов комментариев в поисковом векторе поста (предел tsvector — 1 МБ)
+}
+
+# Сколько последних комментариев встраивается в пост, остальные — GET /api/posts/{id}/comments/
+POST_COMMENTS_PREVIEW_SIZE = 3
+
+# Список и детали постов сериализуются напрямую из values() (см. posts/fast_serializers.py);
+# False — через PostSerializer. Ответы одинаковые, сравнение: python manage.py benchmark_serializers
+POST_FAST_SERIALIZATION = True
+
+# Асинхронные GET /api/posts/, GET /api/posts/{id}/, лайк и комментарий (см. posts/async_views.py).
+# Включать только при запуске под ASGI (uvicorn social_network.asgi:application);
+# сравнение с синхронными представлениями: python manage.py benchmark_async
+POST_ASYNC_VIEWS = False
+
+# Геокодирование адресов постов (см. posts/geocoding.py)
+GEOCODING = {
+    'BACKEND': 'posts.geocoding.NominatimGeocoder',
+    'USER_AGENT': 'post-geocoder',
+    'TIMEOUT': 5,
+    'CACHE_SIZE': 1024,  # записей в LRU-кеше процесса
+    'CACHE_TTL': 60 * 60 * 24 * 30,  # найденные адреса, секунды
+    'NEGATIVE_CACHE_TTL': 60 * 60 * 24,  # ненайденные адреса, секунды
+    # фоновый воркер: python manage.py geocode_worker
+    'RATE_LIMIT': 1.0,  # запросов к геокодеру в секунду на процесс
+    'MAX_ATTEMPTS': 5,  # после стольких ошибок задача переходит в статус dead
+    'RETRY_BACKOFF': 30,  # задержка перед повтором, удваивается с каждой попыткой
+    'RETRY_BACKOFF_MAX': 60 * 60,
+    'VISIBILITY_TIMEOUT': 5 * 60,  # через сколько секунд задача зависшего воркера снова доступна
+}
+
+# Фоновое удаление постов и пользователей: python manage.py purge_worker (см. posts.purge)
+PURGE = {
+    'BATCH_SIZE': 1000,  # строк в одной транзакции
+    'BATCH_PAUSE': 0.05,  # пауза между пачками, секунды (даёт репликам догнать основную базу)
+    'VISIBILITY_TIMEOUT': 5 * 60,
+    'MAX_ATTEMPTS': 5,
+    'RETRY_DELAY': 60,  # задержка перед повтором после ошибки, секунды
+}
+
+# Выгрузка NDJSON: GET /api/export/, python manage.py export_ndjson (см. posts/export.py)
+EXPORT = {
+    'SAFETY_MARGIN': 60,  # секунд: until не позже now - SAFETY_MARGIN, чтобы не пропустить незафиксированные записи
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Social API',
     'DESCRIPTION': 'API для соцсети с постами, комментариями и лайками',
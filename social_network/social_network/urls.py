@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
-from posts.views import PostViewSet
+from posts.async_views import async_urlpatterns
+from posts.views import ExportView, FeedView, PostViewSet
 from rest_framework.routers import DefaultRouter
+from social_network.media import media_urlpatterns
+from social_network.views import StatsView
+from users.views import UserViewSet
 
 from drf_spectacular.views import (
     SpectacularAPIView,
@@ -14,11 +17,21 @@ from drf_spectacular.views import (
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
+router.register(r'users', UserViewSet, basename='user')
+
+# асинхронные версии горячих эндпоинтов постов для ASGI (см. posts/async_views.py)
+async_posts = [path('api/', include(async_urlpatterns))] if settings.POST_ASYNC_VIEWS else []
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    *async_posts,
+    path('api/feed/', FeedView.as_view(), name='feed'),
+    path('api/stats/', StatsView.as_view(), name='stats'),
+    path('api/export/', ExportView.as_view(), name='export'),
     path('api/',include(router.urls)),
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # загруженные файлы с условными GET, Range и передачей через прокси (см. social_network/media.py)
+    *media_urlpatterns(),
+]
@@ -0,0 +1,25 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from posts.geocoding import get_geocoder
+from users.authentication import get_token_cache
+
+
+class StatsView(APIView):
+    """
+    Статистика кешей текущего процесса (для подбора размеров кешей).
+
+    ## Эндпоинты:
+    - `GET /stats/` — счётчики попаданий и промахов (только администратор)
+    """
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response({
+            'token_auth': get_token_cache().stats(),
+            'geocoding': get_geocoder().stats(),
+        })
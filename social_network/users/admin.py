@@ -1,16 +1,26 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+
+from posts.admin import PurgeOnDeleteMixin
+from posts.purge import delete_user
+
 from .forms import CustomUserChangeFrom, CustomUserCreationForm
+from .models import Follow
 
 
 CustomUser = get_user_model()
 
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(PurgeOnDeleteMixin, UserAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeFrom
     model = CustomUserChangeFrom
     list_display = ['username', 'email']
 
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            delete_user(user)
+
 
 admin.site.register(CustomUser, CustomUserAdmin)
+admin.site.register(Follow)
@@ -0,0 +1,176 @@
+"""
+Аутентификация по токену с кешированием (замена `rest_framework.authentication.TokenAuthentication`).
+
+Стандартный класс на каждый запрос выполняет запрос `Token` JOIN `User`.
+`CachedTokenAuthentication` хранит результат в двух уровнях:
+
+- LRU-кеш в памяти процесса (`TOKEN_AUTH['CACHE_SIZE']`, `TOKEN_AUTH['TTL']`);
+- необязательный общий кеш Django (`TOKEN_AUTH['SHARED_CACHE']` — алиас из `CACHES`).
+
+Ключи кеша — хеш токена, а не сам токен. Записи сбрасываются при удалении
+или перевыпуске токена и при сохранении пользователя с изменённым `is_active`,
+см. `users.signals`; другие изменения пользователя (имя, `is_staff`) видны
+после истечения записи (`TTL`, в общем кеше — `SHARED_TTL`). Изменения через
+`QuerySet.update()` сигналов не вызывают и кеш не сбрасывают.
+
+Сброс затрагивает общий кеш и локальный уровень своего процесса. Локальные уровни
+других процессов не уведомляются: в них отозванный токен (и деактивированный
+пользователь) продолжает действовать, пока не истечёт их `TTL` (по умолчанию 60 секунд).
+"""
+import copy
+import hashlib
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from social_network.lru import MISSING, LRUCache
+
+DEFAULTS = {
+    'CACHE_SIZE': 10000,
+    'TTL': 60,
+    'SHARED_CACHE': None,
+    'SHARED_TTL': 300,
+    'KEY_PREFIX': 'auth-token',
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_AUTH', {}).get(name, DEFAULTS[name])
+
+
+class TokenCache:
+    """
+    Двухуровневый кеш `ключ токена → (пользователь, токен)`.
+
+    ## Счётчики:
+    - `memory`: Статистика LRU-кеша процесса
+    - `shared_hits`: Ответ из общего кеша
+    - `shared_misses`: Нет ни в одном кеше, запрос к БД
+    """
+    def __init__(self, cache_size, ttl, shared_cache=None, shared_ttl=None, key_prefix='auth-token'):
+        self.memory = LRUCache(maxsize=cache_size, ttl=ttl)
+        self.shared = caches[shared_cache] if shared_cache else None
+        self.shared_ttl = shared_ttl
+        self.key_prefix = key_prefix
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(['shared_hits', 'shared_misses'], 0)
+
+    def _incr(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _key(self, token_key):
+        return f'{self.key_prefix}:{hashlib.sha256(token_key.encode()).hexdigest()}'
+
+    def get(self, token_key):
+        key = self._key(token_key)
+        value = self.memory.get(key)
+        if value is not MISSING or self.shared is None:
+            return value
+        value = self.shared.get(key, MISSING)
+        if value is MISSING:
+            self._incr('shared_misses')
+            return value
+        self._incr('shared_hits')
+        self.memory.set(key, value)
+        return value
+
+    def get_local(self, token_key):
+        """
+        Только уровень процесса (без обращения к общему кешу).
+        """
+        return self.memory.get(self._key(token_key))
+
+    def set(self, token_key, value):
+        key = self._key(token_key)
+        self.memory.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.shared_ttl)
+
+    def delete(self, *token_keys):
+        keys = [self._key(token_key) for token_key in token_keys]
+        for key in keys:
+            self.memory.delete(key)
+        if self.shared is not None and keys:
+            self.shared.delete_many(keys)
+
+    def stats(self):
+        return {**self.counters, 'memory': self.memory.stats(), 'shared': self.shared is not None}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Возвращает общий для процесса экземпляр `TokenCache`.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(
+                    cache_size=get_setting('CACHE_SIZE'),
+                    ttl=get_setting('TTL'),
+                    shared_cache=get_setting('SHARED_CACHE'),
+                    shared_ttl=get_setting('SHARED_TTL'),
+                    key_prefix=get_setting('KEY_PREFIX'),
+                )
+    return _cache
+
+
+def invalidate_tokens(*token_keys):
+    get_token_cache().delete(*token_keys)
+
+
+@receiver(setting_changed)
+def reset_token_cache(*, setting, **kwargs):
+    """
+    Сбрасывает кеш токенов при изменении настроек (например, в `override_settings`).
+    """
+    global _cache
+    if setting in ('TOKEN_AUTH', 'CACHES'):
+        _cache = None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    `TokenAuthentication`, которая обращается к БД только при промахе кеша.
+    Каждый запрос получает собственную копию пользователя и токена.
+    """
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        value = cache.get(key)
+        if value is MISSING:
+            value = super().authenticate_credentials(key)
+            cache.set(key, value)
+        return self._copy(value)
+
+    async def aauthenticate(self, request):
+        """
+        `authenticate` для асинхронных представлений: при попадании в кеш процесса
+        выполняется без перехода в поток, иначе — `authenticate` через `sync_to_async`.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 2:
+            try:
+                value = get_token_cache().get_local(auth[1].decode())
+            except UnicodeError:
+                value = MISSING
+            if value is not MISSING:
+                return self._copy(value)
+        return await sync_to_async(self.authenticate)(request)
+
+    @staticmethod
+    def _copy(value):
+        user, token = copy.copy(value[0]), copy.copy(value[1])
+        token.user = user
+        return user, token
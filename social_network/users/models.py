@@ -1,6 +1,53 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils.translation import gettext_lazy as _
 
 
 class CustomUser(AbstractUser):
-    pass
+    """
+    Пользователь.
+
+    ## Поля:
+    - `followers_count`: Количество подписчиков (денормализованный счётчик)
+    """
+    followers_count = models.PositiveIntegerField(default=0, verbose_name=_('Количество подписчиков'))
+
+
+class Follow(models.Model):
+    """
+    Подписка одного пользователя на другого.
+
+    ## Поля:
+    - `follower`: Кто подписался
+    - `following`: На кого подписался
+    - `created_at`: Дата подписки
+    - `pulled_at`: До какого момента посты автора перенесены в ленту подписчика
+      при чтении (только для авторов с большим числом подписчиков, см. `posts.timeline`)
+
+    ## Ограничения:
+    - Подписаться на пользователя можно только один раз
+    - Нельзя подписаться на себя
+    """
+    follower = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='following', verbose_name=_('Подписчик')
+    )
+    following = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='followers', verbose_name=_('Автор')
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Дата подписки'))
+    pulled_at = models.DateTimeField(blank=True, null=True, verbose_name=_('Лента дополнена до'))
+
+    class Meta:
+        verbose_name = _('Подписка')
+        verbose_name_plural = _('Подписки')
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='unique_follow'),
+            models.CheckConstraint(check=~models.Q(follower=models.F('following')), name='follow_not_self'),
+        ]
+        indexes = [
+            # Обход подписчиков автора пачками при рассылке поста по лентам
+            models.Index(fields=['following', 'follower'], name='follow_following_follower_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower} → {self.following}'
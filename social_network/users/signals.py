@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """
+    Сбрасывает кеш аутентификации при удалении или перевыпуске токена.
+    """
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_init, sender=get_user_model())
+def remember_is_active(sender, instance, **kwargs):
+    """
+    Запоминает загруженное значение `is_active` для `invalidate_user_tokens` (без запроса к БД).
+    """
+    if 'is_active' not in instance.get_deferred_fields():
+        instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Сбрасывает кеш аутентификации при деактивации или активации пользователя.
+    Остальные сохранения пользователя токены не запрашивают; изменения других полей
+    (имя, `is_staff`) попадают в кеш, когда запись в нём истекает. Удаление пользователя
+    удаляет его токены каскадом, и их сбрасывает `invalidate_deleted_token`.
+    """
+    if created or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    if getattr(instance, '_loaded_is_active', None) == instance.is_active:
+        return
+    instance._loaded_is_active = instance.is_active
+    invalidate_tokens(*Token.objects.filter(user=instance).values_list('key', flat=True))
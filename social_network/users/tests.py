@@ -1,3 +1,57 @@
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
 
-# Create your tests here.
+from social_network.lru import MISSING
+
+from .authentication import get_token_cache
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user', password='password')
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self):
+        return self.client.get('/api/posts/', HTTP_AUTHORIZATION=f'Token {self.token.key}').status_code
+
+    def assertCached(self):
+        self.assertEqual(self.get(), 200)
+        self.assertIsNot(get_token_cache().get_local(self.token.key), MISSING)
+        with self.assertNumQueries(0):
+            get_token_cache().get(self.token.key)
+
+    def test_deleted_token_stops_working(self):
+        self.assertCached()
+        self.token.delete()
+        self.assertEqual(self.get(), 401)
+
+    def test_deactivated_user_stops_working(self):
+        self.assertCached()
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.get(), 401)
+
+    def test_reactivated_user_works_again(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(), 401)
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.is_active = True
+        user.save()
+        self.assertEqual(self.get(), 200)
+
+    def test_deleted_user_stops_working(self):
+        self.assertCached()
+        self.user.delete()
+        self.assertEqual(self.get(), 401)
+
+    def test_other_saves_do_not_query_tokens(self):
+        self.assertCached()
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.first_name = 'Имя'
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(1):
+            user.save(update_fields=['first_name'])
+        self.assertEqual(self.get(), 200)
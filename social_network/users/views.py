@@ -1,3 +1,43 @@
-from django.shortcuts import render
+from django.contrib.auth import get_user_model
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
 
-# Create your views here.
+from posts.timeline import follow, unfollow
+
+
+class UserViewSet(GenericViewSet):
+    """
+    ViewSet для подписок на пользователей.
+
+    ## Вложенные действия:
+    - `POST /users/{id}/follow/` — подписаться на пользователя (только авторизованный)
+    - `DELETE /users/{id}/follow/` — отписаться (только авторизованный)
+    """
+    queryset = get_user_model().objects.filter(is_active=True)
+    permission_classes = [IsAuthenticated]
+    serializer_class = None
+
+    @extend_schema(request=None, responses={200: OpenApiTypes.OBJECT, 201: OpenApiTypes.OBJECT, 204: None})
+    @action(detail=True, methods=['post', 'delete'], url_path='follow')
+    def follow(self, request, pk=None):
+        """
+        POST: Подписывает текущего пользователя на автора, последние посты автора попадают в ленту.
+        DELETE: Отписывает, посты автора убираются из ленты.
+        """
+        author = self.get_object()
+        if author.pk == request.user.pk:
+            raise ValidationError({"detail": "Нельзя подписаться на себя"})
+        if request.method == 'POST':
+            created, followers_count = follow(request.user, author)
+            return Response(
+                {"status": "followed", "followers_count": followers_count},
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            )
+        unfollow(request.user, author)
+        return Response(status=status.HTTP_204_NO_CONTENT)